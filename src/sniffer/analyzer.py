@@ -0,0 +1,448 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: analyzer
+
+:Synopsis:
+    Single-pass EML analysis: each package's metadata is fetched and parsed
+    once and every selected sniffer is run over the same parsed document.
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+import functools
+import multiprocessing
+from typing import Dict, List, Tuple
+
+import daiquiri
+from lxml import etree
+import requests
+
+from sniffer.config import Config
+from sniffer import eml, eml_cache, metrics, pasta_async, pasta_client
+from sniffer import profiling, rate_limit, tracing
+import sniffer.last_date as last_date
+from sniffer.model.state_db import StateDB
+from sniffer.package.package_pool import PackagePool
+from sniffer.pipeline import ordered_map
+
+logger = daiquiri.getLogger(__name__)
+
+EXCLUDED_SCOPES = ("ecotrends", "lter-landsat", "lter-landsat-ledaps")
+
+# Sniffer instances created in analysis processes, by class
+_instances = dict()
+
+
+class Sniffer:
+    """
+    Base class of an analysis run over package metadata. A sniffer is
+    instantiated in the writer process, where open, persist and finish are
+    called, and in each analysis process, where only analyze is called;
+    __init__ must therefore not acquire resources such as database sessions.
+    """
+
+    # Unique name of the sniffer
+    name = None
+    # Key identifying the sniffer's checkpoint
+    checkpoint = None
+    # True if analyze only reads the parts of the EML kept by eml.skeleton;
+    # the full document tree is only built if a selected sniffer needs it
+    streaming = False
+
+    @property
+    def checkpoint_path(self) -> str:
+        # Date file of the checkpoint before it moved to the state table;
+        # read once to carry the checkpoint over
+        attribute = f"{self.checkpoint.upper()}_DATE"
+        default = f"{self.checkpoint}_date.txt"
+        return Config.PATH + getattr(Config, attribute, default)
+
+    def open(self):
+        """
+        Acquire resources needed by persist and finish.
+        """
+        pass
+
+    def open_state(self) -> StateDB:
+        """
+        Open the store of the sniffer's checkpoint; called after open. The
+        analyzer commits the store after each persist, so a store sharing
+        the session that persist writes with commits the checkpoint and the
+        results atomically. The default is the standalone STATE_DB.
+
+        :return:
+            StateDB
+        """
+        return StateDB(Config.PATH + Config.STATE_DB)
+
+    def analyze(self, pid: str, tree: etree._Element):
+        """
+        Analyze the metadata of a package. Called in an analysis process, so
+        the result must be picklable.
+
+        :param pid: Package identifier
+        :param tree: Parsed EML document (its skeleton for streaming
+            sniffers) or None if the metadata is not accessible
+        :return:
+            Analysis result passed to persist
+        """
+        raise NotImplementedError
+
+    def persist(self, results: List[Tuple]) -> int:
+        """
+        Write a batch of analysis results. Results of packages that were
+        persisted before (after a rewind) should be replaced. The write
+        should be left uncommitted if it shares the session of open_state.
+
+        :param results: List of (pid, result) tuples in date created order
+        :return:
+            Count of persisted resources
+        """
+        raise NotImplementedError
+
+    def finish(self):
+        """
+        Called once after all packages have been analyzed.
+        """
+        pass
+
+
+BACKENDS = ("threads", "async")
+
+# Metadata of a package that PASTA+ answers with a permanent client error
+# (e.g. 404 for a deleted package); the package is not analyzed, but the
+# checkpoints move past it
+Skipped = namedtuple("Skipped", ["status_code"])
+
+
+def metadata_url(pid: str) -> str:
+    scope, identifier, revision = pid.split(".")
+    return (
+        Config.METADATA_URL.replace("<SCOPE>", scope)
+        .replace("<IDENTIFIER>", identifier)
+        .replace("<REVISION>", revision)
+    )
+
+
+def fetch(pid: str) -> Tuple:
+    return eml_cache.fetch(pid, metadata_url(pid), raw=True)
+
+
+def _metadata(pid: str, status_code: int, content: bytes) -> bytes:
+    # Transient errors (5xx, 429) are still failing after the client's
+    # retries and abort the run, leaving the package to the next run
+    tracing.annotate(status_code=status_code)
+    if status_code == requests.codes.ok:
+        return content
+    elif status_code == requests.codes.unauthorized:
+        return None
+    elif 400 <= status_code < 500 and (
+        status_code != requests.codes.too_many_requests
+    ):
+        return Skipped(status_code)
+    else:
+        msg = f"Error accessing {pid} metadata - response code: {status_code}"
+        raise ConnectionError(msg)
+
+
+def _fetch(package: Tuple) -> bytes:
+    pid, date_created, sniffers, trace = package
+    with tracing.use(trace), tracing.span("pasta_metadata", pid=pid):
+        return _metadata(pid, *fetch(pid))
+
+
+async def _fetch_async(client, package: Tuple) -> bytes:
+    pid, date_created, sniffers, trace = package
+    with tracing.use(trace), tracing.span("pasta_metadata", pid=pid):
+        status_code, content = await eml_cache.fetch_async(
+            client, pid, metadata_url(pid), raw=True
+        )
+        return _metadata(pid, status_code, content)
+
+
+def _analyze(fetched: Tuple) -> Tuple:
+    # Returns the results by sniffer name, and the metrics recorded and the
+    # spans finished by this analysis process since its last result
+    (pid, date_created, sniffers, trace), metadata = fetched
+    with tracing.use(trace):
+        results = _analyze_package(pid, sniffers, metadata)
+    return results, metrics.drain(), tracing.drain()
+
+
+def _analyze_package(pid: str, sniffers: Tuple, metadata: bytes) -> Dict:
+    if isinstance(metadata, Skipped):
+        return dict()
+    if metadata is None:
+        tree = None
+    else:
+        if isinstance(metadata, str):
+            metadata = metadata.encode("utf-8")
+        if all(cls.streaming for cls in sniffers):
+            mode = "skeleton"
+        else:
+            mode = "tree"
+        with metrics.timer(metrics.EML_PARSE, mode=mode):
+            with tracing.span("parse", mode=mode, bytes=len(metadata)):
+                if mode == "skeleton":
+                    tree = eml.skeleton(metadata)
+                else:
+                    tree = etree.fromstring(metadata)
+    results = dict()
+    for cls in sniffers:
+        if cls not in _instances:
+            _instances[cls] = cls()
+        with metrics.timer(metrics.ANALYZE, sniffer=cls.name):
+            with tracing.span("analyze", sniffer=cls.name):
+                results[cls.name] = _instances[cls].analyze(pid, tree)
+    return results
+
+
+class Analyzer:
+    def __init__(self, sniffers: List[Sniffer]):
+        names = [sniffer.name for sniffer in sniffers]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate sniffer names: {names}")
+        self._sniffers = sniffers
+        self._package_pool = PackagePool()
+        self._states = dict()
+        # Root spans of the traces of packages in the pipeline, by pid
+        self._traces = dict()
+
+    def run(
+        self,
+        workers: int = None,
+        processes: int = None,
+        backend: str = "threads",
+        rewind: datetime = None,
+        dry_run: bool = False,
+    ) -> Dict:
+        """
+        Run the sniffers over all packages past their checkpoints.
+
+        Package metadata is fetched once by a pool of threads (or, with the
+        async backend, by an asyncio client on its own event loop), parsed and
+        analyzed by each sniffer in a pool of processes, and persisted by
+        this (single) writer in (date created, pid) order, WRITE_BATCH
+        packages per transaction. Each sniffer's checkpoint is a (date
+        created, pid) cursor committed with each batch of its results, so an
+        interrupted run resumes after the last committed package.
+
+        :param workers: Number of concurrent metadata fetches
+        :param processes: Number of metadata analysis processes
+        :param backend: Metadata fetch backend, "threads" (a thread pool
+            using the shared PASTA+ client) or "async" (an asyncio client)
+        :param rewind: Move the checkpoints back to this date created before
+            running
+        :param dry_run: Analyze packages without persisting results or moving
+            checkpoints
+        :return:
+            Dictionary of sniffer name to count of persisted resources, or
+            of analyzed packages for a dry run
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown fetch backend: {backend}")
+        if workers is None:
+            if backend == "async":
+                workers = Config.ASYNC_CONCURRENCY
+            else:
+                workers = Config.FETCH_WORKERS
+        if processes is None:
+            processes = Config.PARSE_WORKERS
+
+        for sniffer in self._sniffers:
+            sniffer.open()
+        self._states = {
+            sniffer.name: sniffer.open_state() for sniffer in self._sniffers
+        }
+        cursors = {
+            sniffer.name: self._cursor(sniffer, rewind, dry_run)
+            for sniffer in self._sniffers
+        }
+        counts = {sniffer.name: 0 for sniffer in self._sniffers}
+        batches = {sniffer.name: list() for sniffer in self._sniffers}
+        # Trace contexts of the packages of each batch
+        links = {sniffer.name: list() for sniffer in self._sniffers}
+        checkpoints = dict()
+        batched = 0
+
+        # Analysis processes are spawned rather than forked since the fetch
+        # threads are already running when the process pool starts
+        context = multiprocessing.get_context("spawn")
+        initializer, initargs = profiling.initializer()
+        fetcher, fetch_fn = self._fetcher(backend, workers)
+        self._traces = dict()
+        try:
+            with fetcher, ProcessPoolExecutor(
+                max_workers=processes,
+                mp_context=context,
+                initializer=initializer,
+                initargs=initargs,
+            ) as analyzer:
+                packages = self._packages(cursors)
+                fetched = ordered_map(
+                    fetcher, fetch_fn, packages, window=workers * 4
+                )
+                analyzed = ordered_map(
+                    analyzer, _analyze, fetched, window=processes * 4
+                )
+                for (package, metadata), analysis in analyzed:
+                    results, snapshot, spans = analysis
+                    pid, date_created, sniffers, trace = package
+                    logger.info(f"Analyzing {pid}")
+                    metrics.merge(snapshot)
+                    tracing.merge(spans)
+                    self._end_trace(pid)
+                    if isinstance(metadata, Skipped):
+                        msg = (
+                            f"Ignoring {pid}: status code is "
+                            f"{metadata.status_code}"
+                        )
+                        logger.warning(msg)
+                        for cls in sniffers:
+                            checkpoints[cls.name] = (date_created, pid)
+                    for name, result in results.items():
+                        batches[name].append((pid, result))
+                        links[name].append(trace)
+                        checkpoints[name] = (date_created, pid)
+                        metrics.inc(metrics.PACKAGES, sniffer=name)
+                    batched += 1
+                    if batched >= Config.WRITE_BATCH:
+                        self._persist(
+                            batches, links, checkpoints, counts, dry_run
+                        )
+                        batched = 0
+                        for host, stats in rate_limit.stats().items():
+                            logger.info(f"Rate limiter {host}: {stats}")
+
+            self._persist(batches, links, checkpoints, counts, dry_run)
+        finally:
+            # Traces of packages still in the pipeline when a run fails
+            for pid in list(self._traces):
+                self._end_trace(pid, interrupted=True)
+            tracing.flush()
+        if not dry_run:
+            for sniffer in self._sniffers:
+                sniffer.finish()
+        return counts
+
+    def _cursor(self, sniffer: Sniffer, rewind: datetime, dry_run: bool):
+        state = self._states[sniffer.name]
+        if rewind is not None:
+            cursor = (rewind, "")
+            if not dry_run:
+                state.set(sniffer.checkpoint, *cursor)
+            logger.info(f"Rewinding {sniffer.name} sniffer to {rewind}")
+            return cursor
+        cursor = state.get(sniffer.checkpoint)
+        if cursor is None:
+            # Carry over the checkpoint of the former date file, which
+            # covered every package created on or before its date
+            from_date = last_date.read(sniffer.checkpoint_path)
+            cursor = (from_date + timedelta(microseconds=1), "")
+        logger.info(f"Resuming {sniffer.name} sniffer after {cursor}")
+        return cursor
+
+    @staticmethod
+    def _fetcher(backend: str, workers: int) -> Tuple:
+        # Executor and function fetching the metadata of a package
+        if backend == "async":
+            fetcher = pasta_async.AsyncFetcher(concurrency=workers)
+            return fetcher, functools.partial(_fetch_async, fetcher.client)
+        pasta_client.get_client().resize(workers)
+        return ThreadPoolExecutor(max_workers=workers), _fetch
+
+    def _packages(self, cursors: Dict):
+        # Packages past the earliest checkpoint, each tagged with the
+        # sniffers whose checkpoint it is past
+        if len(cursors) == 0:
+            return
+        from_date, from_pid = min(cursors.values())
+        packages = self._package_pool.iter_packages(
+            from_date=from_date, from_pid=from_pid
+        )
+        for package in packages:
+            pid = package.pid.strip()
+            if pid.split(".")[0] in EXCLUDED_SCOPES:
+                continue
+            sniffers = tuple(
+                type(sniffer)
+                for sniffer in self._sniffers
+                if (package.date_created, pid) > cursors[sniffer.name]
+            )
+            if len(sniffers) > 0:
+                trace = self._trace(pid, package.date_created, sniffers)
+                yield pid, package.date_created, sniffers, trace
+
+    def _trace(self, pid: str, date_created: datetime, sniffers: Tuple):
+        # Start the trace of a package; returns its context passed along
+        # with the package to fetch threads and analysis processes
+        root = tracing.start_trace(
+            "package",
+            pid=pid,
+            date_created=date_created.isoformat(),
+            sniffers=[cls.name for cls in sniffers],
+        )
+        if root is None:
+            return None
+        self._traces[pid] = root
+        return root.context
+
+    def _end_trace(self, pid: str, **attributes):
+        root = self._traces.pop(pid, None)
+        if root is not None:
+            root.set(**attributes)
+            root.end()
+
+    def _persist(
+        self,
+        batches: Dict,
+        links: Dict,
+        checkpoints: Dict,
+        counts: Dict,
+        dry_run: bool,
+    ):
+        for sniffer in self._sniffers:
+            name = sniffer.name
+            if name not in checkpoints:
+                continue
+            date_created, pid = checkpoints[name]
+            if dry_run:
+                counts[name] += len(batches[name])
+                msg = (
+                    f"Dry run: {name} sniffer would persist "
+                    f"{len(batches[name])} packages through {pid}"
+                )
+                logger.info(msg)
+            else:
+                state = self._states[name]
+                # The batch is traced on its own, linked to the traces of
+                # its packages
+                packages = [trace for trace in links[name] if trace]
+                span = tracing.trace(
+                    "persist",
+                    links=packages,
+                    sniffer=name,
+                    packages=len(batches[name]),
+                )
+                try:
+                    with metrics.timer(metrics.PERSIST, sniffer=name), span:
+                        counts[name] += sniffer.persist(batches[name])
+                        state.set(
+                            sniffer.checkpoint, date_created, pid, commit=False
+                        )
+                        state.commit()
+                except Exception:
+                    state.rollback()
+                    raise
+            batches[name] = list()
+            links[name] = list()
+            del checkpoints[name]
+        tracing.flush()
@@ -0,0 +1,431 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: benchmark
+
+:Synopsis:
+    Benchmarks of the sniff pipeline stages over generated EML corpora and
+    synthetic PASTA+ registries (see sniffer.emulator). Each case runs in a
+    fresh process so that its peak RSS is its own; results are written as
+    JSON, tagged with the git commit, for comparison across commits.
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import json
+import logging
+import multiprocessing
+import os
+from pathlib import Path
+import platform
+import resource
+import subprocess
+import time
+from typing import Callable, Dict, List, Tuple
+
+import click
+import daiquiri
+
+from sniffer.config import Config
+from sniffer.embargo.embargo_pool import EmbargoSniffer, Package
+from sniffer.emulator.emulate import configure
+from sniffer.emulator import pasta_db
+from sniffer.model.embargo_db import EmbargoDB
+from sniffer.model.offline_db import OfflineDB
+from sniffer.offline.offline_pool import offline_parse
+from sniffer.package.package_pool import PackagePool
+
+logger = daiquiri.getLogger(__name__)
+
+# Stage name to the kind of its case size
+STAGES = {
+    "registry": "packages",
+    "ephemeral": "packages",
+    "offline_parse": "entities",
+    "embargo_classify": "entities",
+    "offline_insert": "rows",
+    "embargo_insert": "rows",
+}
+REGISTRY_BATCH = 1000
+
+help_stage = (
+    "Benchmark the named stage (repeatable; default all): "
+    f"{', '.join(STAGES)}."
+)
+help_entities = "Entities per EML document of parse cases (repeatable)."
+help_packages = (
+    "Packages of the synthetic registries (repeatable; default 10000, "
+    "100000 and 1000000). Registries are generated once per size in the "
+    "work directory; the 1M registry takes about ten minutes and 3 GB."
+)
+help_rows = "Rows inserted by local database cases (repeatable)."
+help_min_time = "Minimum measured time of repeated cases, in seconds."
+help_work = "Directory of generated registries and scratch databases."
+help_output = "JSON file the results are written to."
+help_threshold = "Ratio change reported as a regression or improvement."
+CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
+
+
+def _measure(fn: Callable, min_time: float) -> Tuple:
+    # Repeat fn, which returns its count of operations, until min_time has
+    # elapsed
+    ops = 0
+    start = time.perf_counter()
+    while True:
+        ops += fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return ops, elapsed
+
+
+def _corpus(entities: int) -> bytes:
+    return pasta_db.eml_document(
+        "edi.1.1",
+        entities,
+        entity_rules=[pasta_db.DENY],
+        offline=True,
+    )
+
+
+def _registry_path(work: Path, packages: int) -> Path:
+    return work / f"registry-{packages}.sqlite"
+
+
+def _registry(work: Path, packages: int) -> Path:
+    # Registries are generated once per size, before the cases using them
+    # are spawned, and reused across runs
+    db = _registry_path(work, packages)
+    if not db.exists():
+        logger.info(f"Generating a registry of {packages} packages")
+        partial = db.with_suffix(".partial")
+        partial.unlink(missing_ok=True)
+        pasta_db.generate(str(partial), packages=packages, eml=False)
+        partial.rename(db)
+    return db
+
+
+def _scratch(work: Path, name: str) -> str:
+    # Path of an empty local database in the scratch directory
+    path = work / "scratch" / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for suffix in ("", "-wal", "-shm"):
+        Path(str(path) + suffix).unlink(missing_ok=True)
+    return str(path)
+
+
+def bench_registry(work: Path, packages: int, min_time: float) -> Tuple:
+    """
+    Page the synthetic registry into an empty package database with
+    PackagePool.add_new_packages.
+    """
+    configure(db=str(_registry_path(work, packages)))
+    _scratch(work, Config.PACKAGE_DB)
+    package_pool = PackagePool()
+    count = 0
+    start = time.perf_counter()
+    while True:
+        c = package_pool.add_new_packages(limit=REGISTRY_BATCH)
+        if c == 0:
+            break
+        count += c
+    return count, time.perf_counter() - start
+
+
+def bench_ephemeral(work: Path, packages: int, min_time: float) -> Tuple:
+    """
+    Scan the explicit embargoes of the synthetic registry for resources
+    missing from an empty embargo database.
+    """
+    configure(db=str(_registry_path(work, packages)))
+    _scratch(work, Config.EMBARGO_DB)
+    sniffer = EmbargoSniffer()
+    sniffer.open()
+
+    def add():
+        return sniffer._add_ephemeral_resources()
+
+    return _measure(add, min_time)
+
+
+def bench_offline_parse(work: Path, entities: int, min_time: float) -> Tuple:
+    """
+    Parse an EML document and list its offline resources.
+    """
+    eml = _corpus(entities)
+
+    def parse():
+        offline_parse(eml)
+        return 1
+
+    return _measure(parse, min_time)
+
+
+def bench_embargo_classify(
+    work: Path, entities: int, min_time: float
+) -> Tuple:
+    """
+    Parse an EML document and classify its embargoed resources.
+    """
+    eml = _corpus(entities)
+
+    def classify():
+        Package("edi.1.1", metadata=eml).embargoed_resources
+        return 1
+
+    return _measure(classify, min_time)
+
+
+def bench_offline_insert(work: Path, rows: int, min_time: float) -> Tuple:
+    """
+    Insert offline resources, WRITE_BATCH per transaction, into an empty
+    offline database.
+    """
+    o_db = OfflineDB(_scratch(work, Config.OFFLINE_DB))
+    resources = [
+        (f"edi.{i}.1", f"entity_{i}.csv", "tape") for i in range(rows)
+    ]
+    start = time.perf_counter()
+    for i in range(0, rows, Config.WRITE_BATCH):
+        o_db.insert_many(resources[i:i + Config.WRITE_BATCH])
+    return rows, time.perf_counter() - start
+
+
+def bench_embargo_insert(work: Path, rows: int, min_time: float) -> Tuple:
+    """
+    Insert embargoed resources, WRITE_BATCH per transaction, into an empty
+    embargo database.
+    """
+    e_db = EmbargoDB(_scratch(work, Config.EMBARGO_DB))
+    resources = [
+        (
+            pasta_db.entity_url(Config.PASTA_URL, f"edi.{i}.1", 0),
+            f"edi.{i}.1",
+            Config.EXPLICIT,
+            False,
+        )
+        for i in range(rows)
+    ]
+    start = time.perf_counter()
+    for i in range(0, rows, Config.WRITE_BATCH):
+        e_db.insert_many(resources[i:i + Config.WRITE_BATCH])
+    return rows, time.perf_counter() - start
+
+
+BENCHMARKS = {
+    "registry": bench_registry,
+    "ephemeral": bench_ephemeral,
+    "offline_parse": bench_offline_parse,
+    "embargo_classify": bench_embargo_classify,
+    "offline_insert": bench_offline_insert,
+    "embargo_insert": bench_embargo_insert,
+}
+
+
+def _run_case(stage: str, size: int, work: str, min_time: float) -> Dict:
+    # Runs in a spawned process; local databases are created in the scratch
+    # directory of work
+    daiquiri.setup(level=logging.WARNING, outputs=("stderr",))
+    Config.PATH = str(Path(work) / "scratch") + "/"
+    Config.EML_CACHE = None
+    ops, seconds = BENCHMARKS[stage](Path(work), size, min_time)
+    # ru_maxrss is in kilobytes on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return {
+        "stage": stage,
+        STAGES[stage]: size,
+        "ops": ops,
+        "seconds": seconds,
+        "ops_per_sec": ops / seconds if seconds > 0 else None,
+        "peak_rss": peak_rss,
+    }
+
+
+def commit() -> str:
+    """
+    :return:
+        Git commit of the working tree, suffixed with "-dirty" if it has
+        uncommitted changes, or None outside a git work tree
+    """
+    cwd = os.path.dirname(os.path.realpath(__file__))
+    try:
+        head = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=cwd, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=cwd, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return head + "-dirty" if status else head
+
+
+def run(
+    stages: List[str],
+    entities: List[int],
+    packages: List[int],
+    rows: List[int],
+    work: str,
+    min_time: float = 1.0,
+) -> Dict:
+    """
+    Run the benchmark cases of the selected stages, each in a fresh process.
+
+    :param stages: Stage names
+    :param entities: Entities per EML document of parse cases
+    :param packages: Packages in the synthetic registry of query cases
+    :param rows: Rows inserted by local database cases
+    :param work: Directory of generated registries and scratch databases
+    :param min_time: Minimum measured time of repeated cases, in seconds
+    :return:
+        Run description with a list of case results
+    """
+    sizes = {"entities": entities, "packages": packages, "rows": rows}
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if len(unknown) > 0:
+        raise ValueError(f"Unknown benchmark stages: {', '.join(unknown)}")
+    Path(work).mkdir(parents=True, exist_ok=True)
+    results = list()
+    # Registries are generated (or found) here so that generation is not
+    # part of the time and peak RSS of the cases
+    if any(STAGES[stage] == "packages" for stage in stages):
+        for size in sorted(set(packages)):
+            _registry(Path(work), size)
+    context = multiprocessing.get_context("spawn")
+    for stage in stages:
+        for size in sizes[STAGES[stage]]:
+            with ProcessPoolExecutor(1, mp_context=context) as executor:
+                result = executor.submit(
+                    _run_case, stage, size, work, min_time
+                ).result()
+            msg = (
+                f"{stage} ({STAGES[stage]}={size}): "
+                f"{result['ops_per_sec']:.1f} ops/s, "
+                f"peak RSS {result['peak_rss'] / 2 ** 20:.1f} MiB"
+            )
+            logger.info(msg)
+            results.append(result)
+    return {
+        "commit": commit(),
+        "date": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def compare(base: Dict, head: Dict) -> List:
+    """
+    Pair the cases of two runs.
+
+    :param base: Run of the baseline
+    :param head: Run compared to the baseline
+    :return:
+        List of (stage, size, base ops/s, head ops/s, ratio) tuples, ratio
+        being head over base throughput
+    """
+    def key(result):
+        stage = result["stage"]
+        return stage, result[STAGES[stage]]
+
+    base_results = {key(result): result for result in base["results"]}
+    pairs = list()
+    for result in head["results"]:
+        k = key(result)
+        if k not in base_results:
+            continue
+        base_rate = base_results[k]["ops_per_sec"]
+        head_rate = result["ops_per_sec"]
+        ratio = head_rate / base_rate if base_rate else None
+        pairs.append((k[0], k[1], base_rate, head_rate, ratio))
+    return pairs
+
+
+@click.group(context_settings=CONTEXT_SETTINGS)
+def main():
+    daiquiri.setup(level=logging.INFO, outputs=("stdout",))
+
+
+@main.command("run")
+@click.option("-s", "--stage", "stages", multiple=True, help=help_stage)
+@click.option(
+    "-e", "--entities", multiple=True, type=int,
+    default=(1, 10, 100, 1000, 5000), help=help_entities,
+)
+@click.option(
+    "-p", "--packages", multiple=True, type=int,
+    default=(10000, 100000, 1000000), help=help_packages,
+)
+@click.option(
+    "-r", "--rows", multiple=True, type=int, default=(10000,),
+    help=help_rows,
+)
+@click.option("-t", "--min-time", default=1.0, help=help_min_time)
+@click.option(
+    "-d", "--work", default=Config.PATH + "benchmark", help=help_work
+)
+@click.option("-o", "--output", default="benchmark.json", help=help_output)
+def run_command(
+    stages: tuple,
+    entities: tuple,
+    packages: tuple,
+    rows: tuple,
+    min_time: float,
+    work: str,
+    output: str,
+):
+    """
+    Run benchmarks and write their results to OUTPUT.
+    """
+    stages = list(stages) if len(stages) > 0 else list(STAGES)
+    try:
+        report = run(stages, entities, packages, rows, work, min_time)
+    except ValueError as e:
+        logger.error(e)
+        return 1
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Results of commit {report['commit']} written to {output}")
+    return 0
+
+
+@main.command("compare")
+@click.argument("base")
+@click.argument("head")
+@click.option("--threshold", default=0.1, help=help_threshold)
+def compare_command(base: str, head: str, threshold: float):
+    """
+    Compare the throughput of the cases of two results files.
+    """
+    with open(base) as f:
+        base_report = json.load(f)
+    with open(head) as f:
+        head_report = json.load(f)
+    print(f"{base_report['commit']} -> {head_report['commit']}")
+    for stage, size, base_rate, head_rate, ratio in compare(
+        base_report, head_report
+    ):
+        if ratio is None:
+            print(f"{stage:<18}{size:>9}  no baseline throughput")
+            continue
+        flag = ""
+        if ratio < 1 - threshold:
+            flag = "  regression"
+        elif ratio > 1 + threshold:
+            flag = "  improvement"
+        print(
+            f"{stage:<18}{size:>9}{base_rate:>14.1f}{head_rate:>14.1f}"
+            f"{ratio:>8.2f}x{flag}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: access
+
+:Synopsis:
+    Single-pass evaluation of EML <access> elements into a compact summary
+    of the rules relevant to embargo classification.
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+import threading
+from typing import NamedTuple
+
+from lxml import etree
+
+
+GRANTS = frozenset(("read", "write", "all", "changePermission"))
+
+# Bound on the number of distinct access blocks remembered
+MAX_RULES = 4096
+
+_RULES = etree.XPath("allow|deny")
+_PRINCIPALS = etree.XPath("principal/text()")
+_PERMISSIONS = etree.XPath("permission/text()")
+
+_memo = dict()
+_memo_lock = threading.Lock()
+
+
+class AccessRules(NamedTuple):
+    # A deny rule takes read permission away from the public
+    deny_public_read: bool = False
+    # An allow rule grants the public any permission
+    allow_public: bool = False
+    # An allow rule grants authenticated users any permission
+    allow_authenticated: bool = False
+    # The public or authenticated users are granted more than read
+    over_privileged: bool = False
+
+
+NO_ACCESS = AccessRules()
+
+
+def evaluate(access: etree._Element) -> AccessRules:
+    """
+    Summarize an <access> element. Identical access blocks, which are
+    typically repeated across every distribution of a package, are
+    evaluated once.
+
+    :param access: Access element or None
+    :return:
+        AccessRules
+    """
+    if access is None:
+        return NO_ACCESS
+    key = etree.tostring(access, with_tail=False)
+    rules = _memo.get(key)
+    if rules is None:
+        rules = _evaluate(access)
+        with _memo_lock:
+            if len(_memo) >= MAX_RULES:
+                _memo.clear()
+            _memo[key] = rules
+    return rules
+
+
+def _evaluate(access: etree._Element) -> AccessRules:
+    deny_public_read = False
+    allow_public = False
+    allow_authenticated = False
+    over_privileged = False
+    for rule in _RULES(access):
+        principals = {p.strip() for p in _PRINCIPALS(rule)}
+        public = "public" in principals
+        authenticated = "authenticated" in principals
+        if not (public or authenticated):
+            continue
+        permissions = {p.strip() for p in _PERMISSIONS(rule)}
+        if rule.tag == "deny":
+            if public and "read" in permissions:
+                deny_public_read = True
+        else:
+            granted = permissions & GRANTS
+            if granted:
+                allow_public = allow_public or public
+                allow_authenticated = allow_authenticated or authenticated
+                if granted != {"read"}:
+                    over_privileged = True
+    return AccessRules(
+        deny_public_read, allow_public, allow_authenticated, over_privileged
+    )
@@ -12,49 +12,52 @@
 :Created:
     7/31/20
 """
-from datetime import datetime
-from pathlib import Path
 from typing import List, Tuple, Set
 
 import daiquiri
 from lxml import etree
 import requests
-from sqlalchemy.exc import IntegrityError
 
+from sniffer.analyzer import Analyzer, Sniffer
 from sniffer.config import Config
-import sniffer.last_date as last_date
-from sniffer.model.embargo_db import EmbargoDB, Ephemeral
+from sniffer.embargo import access
+from sniffer import eml as eml_parser
+from sniffer import eml_cache
+from sniffer.model.embargo_db import EmbargoDB
+from sniffer.model.state_db import StateDB
 from sniffer.model import pasta_data_package_manager_db
-from sniffer.package.package_pool import PackagePool
+from sniffer import tracing
 
 
 logger = daiquiri.getLogger(__name__)
 
-SQL_EXPLICIT = (
-    "SELECT resource_id FROM datapackagemanager.access_matrix WHERE "
-    "principal='public' AND access_type='deny' AND permission='read' "
-    "AND (resource_id NOT LIKE '%%/ecotrends/%%' AND resource_id NOT LIKE "
-    "'%%/lter-landsat/%%' AND resource_id NOT LIKE "
-    "'%%/lter-landsat-ledaps/%%') AND resource_id LIKE '%%/%%data/eml/%%'"
-)
-
 SQL_AUTHENTICATED = (
     "SELECT resource_id FROM datapackagemanager.access_matrix WHERE "
     "principal='authenticated' AND access_type='allow' AND permission='read' "
-    "AND (resource_id NOT LIKE '%%/ecotrends/%%' AND resource_id NOT LIKE "
-    "'%%/lter-landsat/%%' AND resource_id NOT LIKE "
-    "'%%/lter-landsat-ledaps/%%') AND resource_id LIKE '%%/%%data/eml/%%'"
+    "AND (resource_id NOT LIKE '%/ecotrends/%' AND resource_id NOT LIKE "
+    "'%/lter-landsat/%' AND resource_id NOT LIKE "
+    "'%/lter-landsat-ledaps/%') AND resource_id LIKE '%/%data/eml/%'"
 )
 
-SQL_RESOURCE_CREATE_DATE = (
-    "SELECT datapackagemanager.resource_registry.date_created "
-    "FROM datapackagemanager.resource_registry WHERE "
-    "resource_id='<RID>'"
+SQL_EXPLICIT_CREATE_DATE = (
+    "SELECT DISTINCT datapackagemanager.access_matrix.resource_id, "
+    "datapackagemanager.resource_registry.date_created FROM "
+    "datapackagemanager.access_matrix JOIN "
+    "datapackagemanager.resource_registry ON "
+    "datapackagemanager.access_matrix.resource_id="
+    "datapackagemanager.resource_registry.resource_id WHERE "
+    "principal='public' AND access_type='deny' AND permission='read' "
+    "AND (datapackagemanager.access_matrix.resource_id NOT LIKE "
+    "'%/ecotrends/%' AND datapackagemanager.access_matrix.resource_id "
+    "NOT LIKE '%/lter-landsat/%' AND "
+    "datapackagemanager.access_matrix.resource_id NOT LIKE "
+    "'%/lter-landsat-ledaps/%') AND "
+    "datapackagemanager.access_matrix.resource_id LIKE '%/%data/eml/%'"
 )
 
 SQL_ENTITY_LIST = (
     "SELECT datapackagemanager.resource_registry.resource_id FROM "
-    "datapackagemanager.resource_registry WHERE package_id='<PID>' "
+    "datapackagemanager.resource_registry WHERE package_id=:pid "
     "AND resource_type='data'"
 )
 
@@ -66,20 +69,53 @@ SQL_NEWEST_PIDS = (
 )
 
 
-def newest_pids() -> Set:
+SQL_NEWEST_SERIES_PIDS = (
+    "SELECT scope, identifier, CONCAT(scope, '.', identifier, '.', "
+    "MAX(revision)) FROM datapackagemanager.resource_registry WHERE "
+    "scope IN :scopes AND identifier IN :identifiers "
+    "GROUP BY scope, identifier"
+)
+
+# Distributions of data entities that are accessible online
+DISTRIBUTIONS = etree.XPath("dataset//physical/distribution[online/url]")
+
+
+def newest_pids(series: Set = None) -> Set:
+    """
+    Return the package identifiers of the newest revision of each package
+    series.
+
+    :param series: Set of (scope, identifier) tuples to restrict the result
+        to; all series when None
+    :return:
+        Set of package identifiers
+    """
     newest = set()
-    pids = pasta_data_package_manager_db.query(SQL_NEWEST_PIDS)
-    for pid in pids:
-        newest.add(pid[0])
+    if series is None:
+        pids = pasta_data_package_manager_db.query(SQL_NEWEST_PIDS)
+        for pid in pids:
+            newest.add(pid[0])
+    else:
+        series = sorted(series)
+        for i in range(0, len(series), 500):
+            chunk = set(series[i:i + 500])
+            params = {
+                "scopes": {s for s, identifier in chunk},
+                "identifiers": {int(identifier) for s, identifier in chunk},
+            }
+            pids = pasta_data_package_manager_db.query(
+                SQL_NEWEST_SERIES_PIDS, params
+            )
+            for scope, identifier, pid in pids:
+                if (scope, str(identifier)) in chunk:
+                    newest.add(pid)
     return newest
 
 
 def pid_from_resource(resource: str) -> str:
-    metadata = "https://pasta.lternet.edu/package/metadata/eml/"
-    data = "https://pasta.lternet.edu/package/data/eml/"
-    _ = resource.replace(metadata, "")
-    _ = _.replace(data, "")
-    _ = _.split("/")
+    # Resource identifiers are <PASTA_URL>(metadata|data)/eml/<scope>/
+    # <identifier>/<revision>[/<entity>], whichever host issued them
+    _ = resource.split("/eml/", 1)[-1].split("/")
     pid = f"{_[0]}.{_[1]}.{_[2]}"
     return pid
 
@@ -87,76 +123,111 @@ def pid_from_resource(resource: str) -> str:
 def pasta_metadata(pid: str) -> str:
     scope, identifier, revision = pid.split(".")
     url = f"{Config.PASTA_URL}metadata/eml/{scope}/{identifier}/{revision}"
-    dn = Config.DN
-    pw = Config.PASSWORD
-    r = requests.get(url, auth=(dn, pw))
-    if r.status_code == requests.codes.ok:
-        eml = r.text
-    elif r.status_code == requests.codes.unauthorized:
+    with tracing.span("pasta_metadata", pid=pid):
+        status_code, text = eml_cache.fetch(pid, url)
+        tracing.annotate(status_code=status_code)
+    if status_code == requests.codes.ok:
+        eml = text
+    elif status_code == requests.codes.unauthorized:
         eml = None
     else:
         msg = (
-            f"Error accessing {pid} metadata - response code: {r.status_code}"
+            f"Error accessing {pid} metadata - response code: {status_code}"
         )
         raise ConnectionError(msg)
     return eml
 
 
-class EmbargoPool:
-    def __init__(self):
+def inaccessible_resources(pid: str) -> List:
+    """
+    Embargoed resources of a package whose metadata cannot be read; the
+    metadata and all data entities of the package are considered explicitly
+    embargoed.
+
+    :param pid: Package identifier
+    :return:
+        List of (rid, pid, type, auth) tuples
+    """
+    scope, identifier, revision = pid.split(".")
+    metadata_resource = (
+        Config.METADATA_URL.replace("<SCOPE>", scope)
+        .replace("<IDENTIFIER>", identifier)
+        .replace("<REVISION>", revision)
+    )
+    resources = [(metadata_resource, pid, Config.EXPLICIT, False)]
+    with tracing.span("SQL_ENTITY_LIST", pid=pid):
+        entities = pasta_data_package_manager_db.query(
+            SQL_ENTITY_LIST, {"pid": pid}
+        )
+        for resource in entities:
+            resources.append((resource[0], pid, Config.EXPLICIT, False))
+    return resources
+
+
+class EmbargoSniffer(Sniffer):
+    name = "embargo"
+    checkpoint = "embargo"
+    streaming = True
+
+    def open(self):
         db_path = Config.PATH + Config.EMBARGO_DB
         self._e_db = EmbargoDB(db_path)
-        self._package_pool = PackagePool()
 
-    def add_new_embargoed_resources(self) -> int:
+    def open_state(self) -> StateDB:
+        return StateDB(session=self._e_db.session)
+
+    def analyze(self, pid: str, tree: etree._Element) -> List:
+        if tree is None:
+            return None
+        return Package(pid, tree=tree).embargoed_resources
+
+    def persist(self, results: List) -> int:
+        batch = list()
+        series = set()
+        for pid, resources in results:
+            msg = f"Testing package for embargo(s): {pid}"
+            logger.info(msg)
+            if resources is None:
+                msg = f"Failed to access package metadata: {pid}"
+                logger.warning(msg)
+                resources = inaccessible_resources(pid)
+            scope, identifier, revision = pid.split(".")
+            series.add((scope, identifier))
+            batch += resources
+        self._e_db.delete_pids([pid for pid, r in results], commit=False)
+        self._e_db.insert_many(batch, commit=False)
+        # Series are marked dirty in the transaction of their resources and
+        # checkpoint, so a run that fails before finish leaves them to the
+        # next run's finish
+        self._e_db.insert_dirty_series(series, commit=False)
+        return len(batch)
+
+    def finish(self):
+        self._update_newest(self._e_db.get_dirty_series())
+        self._add_ephemeral_resources()
+
+    def _update_newest(self, series: Set) -> int:
         """
-        Add embargoed PASTA+ resources to the Embargo Database
+        Maintain the embargoed resources of the newest package revisions.
+        Only the package series touched by newly tested packages are
+        recomputed; the table is rebuilt from scratch when it is empty.
 
+        :param series: Set of (scope, identifier) tuples of the dirty series,
+            i.e. those of packages persisted since the last update
         :return:
-            Count of embargoed resources
+            Count of newest resources inserted
         """
-
-        embargo_date_path = Config.PATH + Config.EMBARGO_DATE
-        from_date = last_date.read(embargo_date_path)
-        packages = self._package_pool.get_all_packages(from_date=from_date)
-        count = 0
-        for package in packages:
-            pid = package.pid.strip()
-            scope, identifier, revision = pid.split(".")
-            if scope not in (
-                "ecotrends",
-                "lter-landsat",
-                "lter-landsat-ledaps",
-            ):
-                msg = f"Testing package for embargo(s): {pid}"
-                logger.info(msg)
-                p = Package(pid)
-                count += p.count_embargoed_resources
-                for resource in p.embargoed_resources:
-                    self._e_db.insert(
-                        rid=resource[0],
-                        pid=resource[1],
-                        type=resource[2],
-                        auth=resource[3],
-                    )
-                last_date.write(embargo_date_path, package.date_created)
-
-        self._e_db.delete_all_newest()
-        n_pids = newest_pids()
-        embargoed_pids = self._e_db.get_distinct_pids()
-        for embargoed_pid in embargoed_pids:
-            if embargoed_pid[0] in n_pids:
-                embargoed_resources = self._e_db.get_by_pid(embargoed_pid[0])
-                for embargoed_resource in embargoed_resources:
-                    self._e_db.insert_newest(
-                        rid=embargoed_resource.rid,
-                        pid=embargoed_resource.pid,
-                        type=embargoed_resource.type,
-                        auth=embargoed_resource.auth
-                    )
-
-        self._add_ephemeral_resources()
-
+        if self._e_db.get_newest_count() == 0:
+            embargoed_pids = {
+                pid[0] for pid in self._e_db.get_distinct_pids()
+            }
+            newest = newest_pids() & embargoed_pids
+            count = self._e_db.update_newest(newest)
+        elif len(series) > 0:
+            newest = newest_pids(series)
+            count = self._e_db.update_newest(newest, series=series)
+        else:
+            count = 0
         return count
 
     def _add_ephemeral_resources(self) -> int:
@@ -168,33 +239,61 @@ class EmbargoPool:
         :return:
             Count of identified resources
         """
-        count = 0
         self._e_db.delete_all_ephemeral()
 
-        embargoed_resources = pasta_data_package_manager_db.query(SQL_EXPLICIT)
-        for embargoed_resource in embargoed_resources:
-            resource = self._e_db.get_by_rid(embargoed_resource[0])
-            if resource is None:
-                sql = SQL_RESOURCE_CREATE_DATE.replace(
-                    "<RID>",
-                    embargoed_resource[0]
-                )
-                dt = pasta_data_package_manager_db.query(sql)[0][0]
-                pid = pid_from_resource(embargoed_resource[0])
-                self._e_db.insert_ephemeral(
-                    rid=embargoed_resource[0],
-                    pid=pid,
-                    dt=dt
-                )
-                count += 1
-                msg = f"Adding ephemeral embargo for: {embargoed_resource[0]}"
+        rids = self._e_db.get_all_rids()
+        embargoed_resources = pasta_data_package_manager_db.query(
+            SQL_EXPLICIT_CREATE_DATE
+        )
+        ephemerals = list()
+        for rid, dt in embargoed_resources:
+            if rid not in rids:
+                ephemerals.append((rid, pid_from_resource(rid), dt))
+                msg = f"Adding ephemeral embargo for: {rid}"
                 logger.info(msg)
+                rids.add(rid)
+        count = self._e_db.insert_ephemeral_many(ephemerals)
 
         return count
 
 
+class EmbargoPool:
+    def __init__(self):
+        self._sniffer = EmbargoSniffer()
+
+    def add_new_embargoed_resources(
+        self,
+        workers: int = None,
+        processes: int = None,
+        backend: str = "threads",
+    ) -> int:
+        """
+        Add embargoed PASTA+ resources to the Embargo Database
+
+        Packages flow through a staged pipeline: metadata is fetched by a
+        pool of threads, parsed and classified by a pool of processes, and
+        written to the Embargo Database by a single writer. Packages are
+        written in (date created, pid) order and the embargo checkpoint is
+        committed with each transaction of WRITE_BATCH packages, so it only
+        moves past packages that have been completely processed.
+
+        :param workers: Number of concurrent metadata fetches
+        :param processes: Number of metadata classification processes
+        :param backend: Metadata fetch backend, "threads" or "async"
+        :return:
+            Count of embargoed resources
+        """
+        analyzer = Analyzer([self._sniffer])
+        counts = analyzer.run(
+            workers=workers, processes=processes, backend=backend
+        )
+        return counts[self._sniffer.name]
+
+
 class Package:
-    def __init__(self, pid: str):
+    def __init__(
+        self, pid: str, metadata: str = None, tree: etree._Element = None
+    ):
         self._embargoed_resources = list()
         self._pid = pid
         scope, identifier, revision = self._pid.split(".")
@@ -203,31 +302,16 @@ class Package:
             .replace("<IDENTIFIER>", identifier)
             .replace("<REVISION>", revision)
         )
-        metadata = pasta_metadata(self._pid)
-        if metadata is None:
+        if metadata is None and tree is None:
+            metadata = pasta_metadata(self._pid)
+        if metadata is None and tree is None:
             msg = f"Failed to access package metadata: {pid}"
             logger.warning(msg)
-            self._embargoed_resources.append(
-                (
-                    metadata_resource,
-                    self._pid,
-                    Config.EXPLICIT,
-                    False
-                )
-            )
-            sql = SQL_ENTITY_LIST.replace("<PID>", self._pid)
-            resources = pasta_data_package_manager_db.query(sql)
-            for resource in resources:
-                self._embargoed_resources.append(
-                    (
-                        resource[0],
-                        self._pid,
-                        Config.EXPLICIT,
-                        False
-                    )
-                )
+            self._embargoed_resources += inaccessible_resources(self._pid)
         else:
-            self._eml = etree.fromstring(metadata.encode("utf-8"))
+            if tree is None:
+                tree = eml_parser.skeleton(metadata)
+            self._eml = tree
             self._package_embargo_type = None
             self._package_embargo_type, allows_auth = self._package_embargo()
             if self._package_embargo_type is not None:
@@ -239,7 +323,8 @@ class Package:
                         allows_auth
                     )
                 )
-            self._embargoed_resources += self._entity_embargoes()
+            with tracing.span("_entity_embargoes", pid=pid):
+                self._embargoed_resources += self._entity_embargoes()
 
     @property
     def embargoed_resources(self) -> List:
@@ -249,113 +334,46 @@ class Package:
     def count_embargoed_resources(self) -> int:
         return len(self._embargoed_resources)
 
-    def _allows_authenticated(self, access) -> bool:
-        allow_authenticated = False
-        if access is not None:
-            allows = access.findall("./allow")
-            for allow in allows:
-                principals = allow.findall("./principal")
-                for principal in principals:
-                    if principal.text.strip() == "authenticated":
-                        permissions = allow.findall("./permission")
-                        for permission in permissions:
-                            if permission.text.strip() in (
-                                "read",
-                                "write",
-                                "all",
-                                "changePermission",
-                            ):
-                                allow_authenticated = True
-                                if permission.text.strip() != "read":
-                                    pid = self._eml.get("packageId")
-                                    msg = (
-                                        "Authenticated permission too high for "
-                                        f"package: {pid}"
-                                    )
-                                    logger.warning(msg)
-        return allow_authenticated
+    def _classify(self, rules: access.AccessRules) -> Tuple:
+        """
+        Classify a resource from the rules of its access element and those
+        of the package.
+
+        :param rules: Access rules of the resource
+        :return:
+            (embargo_type, allows_auth) tuple; embargo_type is None if the
+            resource is public
+        """
+        if rules.over_privileged:
+            pid = self._eml.get("packageId")
+            msg = f"Permission too high for package: {pid}"
+            logger.warning(msg)
+        if (
+            self._package_embargo_type == Config.EXPLICIT
+            or rules.deny_public_read
+        ):
+            embargo_type = Config.EXPLICIT
+        # An access element without a public allow rule implicitly denies
+        # the public; NO_ACCESS stands for a missing access element
+        elif self._package_embargo_type == Config.IMPLICIT or (
+            rules is not access.NO_ACCESS and not rules.allow_public
+        ):
+            embargo_type = Config.IMPLICIT
+        else:
+            return None, None
+        return embargo_type, rules.allow_authenticated
 
     def _entity_embargoes(self) -> List:
         entity_resources = list()
-        phys = self._eml.findall("./dataset//physical")
-        for p in phys:
-            distributions = p.findall("./distribution")
-            for distribution in distributions:
-                url = distribution.find("./online/url")
-                if url is not None:
-                    embargo_type = None
-                    access = distribution.find("./access")
-                    if self._is_explicitly_denied(access):
-                        embargo_type = Config.EXPLICIT
-                    elif self._is_implicitly_denied(access):
-                        embargo_type = Config.IMPLICIT
-                    if embargo_type is not None:
-                        allows_auth = self._allows_authenticated(access)
-                        entity_resources.append(
-                            (
-                                url.text.strip(),
-                                self._pid,
-                                embargo_type,
-                                allows_auth,
-                            )
-                        )
+        for distribution in DISTRIBUTIONS(self._eml):
+            rules = access.evaluate(distribution.find("access"))
+            embargo_type, allows_auth = self._classify(rules)
+            if embargo_type is not None:
+                url = distribution.find("online/url")
+                entity_resources.append(
+                    (url.text.strip(), self._pid, embargo_type, allows_auth)
+                )
         return entity_resources
 
-    def _is_explicitly_denied(self, access) -> bool:
-        if self._package_embargo_type == Config.EXPLICIT:
-            is_denied = True
-        else:
-            is_denied = False
-            if access is not None:
-                denies = access.findall("./deny")
-                for deny in denies:
-                    principals = deny.findall("./principal")
-                    for principal in principals:
-                        if principal.text.strip() == "public":
-                            permissions = deny.findall("./permission")
-                            for permission in permissions:
-                                if permission.text.strip() == "read":
-                                    is_denied = True
-        return is_denied
-
-    def _is_implicitly_denied(self, access) -> bool:
-        if self._package_embargo_type == Config.IMPLICIT:
-            is_denied = True
-        else:
-            is_denied = False
-            if access is not None:
-                is_denied = True
-                allows = access.findall("./allow")
-                for allow in allows:
-                    principals = allow.findall("./principal")
-                    for principal in principals:
-                        if principal.text.strip() == "public":
-                            permissions = allow.findall("./permission")
-                            for permission in permissions:
-                                if permission.text.strip() in (
-                                    "read",
-                                    "write",
-                                    "all",
-                                    "changePermission",
-                                ):
-                                    is_denied = False
-                                    if permission.text.strip() != "read":
-                                        pid = self._eml.get("packageId")
-                                        msg = (
-                                            "Authenticated permission too high "
-                                            f"for package: {pid}"
-                                        )
-                                        logger.warning(msg)
-        return is_denied
-
     def _package_embargo(self) -> Tuple:
-        embargo_type = None
-        allows_auth = None
-        access = self._eml.find("./access")
-        if self._is_explicitly_denied(access):
-            embargo_type = Config.EXPLICIT
-        elif self._is_implicitly_denied(access):
-            embargo_type = Config.IMPLICIT
-        if embargo_type is not None:
-            allows_auth = self._allows_authenticated(access)
-        return embargo_type, allows_auth
+        return self._classify(access.evaluate(self._eml.find("access")))
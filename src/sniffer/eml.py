@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: eml
+
+:Synopsis:
+    Streaming parse of EML documents into a skeleton tree holding only the
+    parts read by the bundled sniffers: the package access rules and, for
+    each data entity, its object name and distributions.
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+import copy
+from io import BytesIO
+from typing import Union
+
+from lxml import etree
+
+
+# Distribution children kept in the skeleton
+DISTRIBUTION_KEEP = ("online", "offline", "access")
+
+
+def _local(tag) -> str:
+    # Comments and processing instructions have a non-string tag
+    return etree.QName(tag).localname if isinstance(tag, str) else ""
+
+
+def _prune_physical(physical: etree._Element) -> etree._Element:
+    pruned = etree.Element("physical")
+    object_name = physical.find(".//objectName")
+    if object_name is not None:
+        pruned.append(copy.deepcopy(object_name))
+    for distribution in physical.iterfind("./distribution"):
+        d = etree.SubElement(pruned, "distribution")
+        for child in distribution:
+            if _local(child.tag) in DISTRIBUTION_KEEP:
+                d.append(copy.deepcopy(child))
+    return pruned
+
+
+def skeleton(source: Union[bytes, str]) -> etree._Element:
+    """
+    Parse an EML document with iterparse into a skeleton tree of the form
+
+        <eml packageId="..."><access/><dataset><physical/>...</dataset></eml>
+
+    where each physical element keeps only its objectName and its
+    distributions' online, offline and access children. Each top level and
+    dataset subtree is cleared as soon as it has been read, so memory use is
+    bounded by the largest single entity rather than the whole document.
+
+    :param source: EML document, preferably the raw response bytes
+    :return:
+        Root element of the skeleton tree
+    """
+    if isinstance(source, str):
+        source = source.encode("utf-8")
+    events = etree.iterparse(BytesIO(source), events=("start", "end"))
+    root = None
+    dataset = None
+    eml = None
+    for event, elem in events:
+        if event == "start":
+            if root is None:
+                root = elem
+                eml = etree.Element(elem.tag, attrib=elem.attrib)
+                dataset = etree.SubElement(eml, "dataset")
+            continue
+        parent = elem.getparent()
+        if parent is None:
+            break
+        tag = _local(elem.tag)
+        if tag == "physical" and _in_dataset(elem, root):
+            dataset.append(_prune_physical(elem))
+            elem.clear()
+        elif parent is root:
+            if tag == "access":
+                eml.insert(0, copy.deepcopy(elem))
+            _release(elem)
+        elif _local(parent.tag) == "dataset" and parent.getparent() is root:
+            _release(elem)
+    return eml
+
+
+def _in_dataset(elem: etree._Element, root: etree._Element) -> bool:
+    for ancestor in elem.iterancestors():
+        if ancestor.getparent() is root:
+            return _local(ancestor.tag) == "dataset"
+    return False
+
+
+def _release(elem: etree._Element):
+    # Free a completely read subtree along with its preceding siblings
+    elem.clear()
+    parent = elem.getparent()
+    while elem.getprevious() is not None:
+        del parent[0]
@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: eml_cache
+
+:Synopsis:
+    Content-addressed, size-bounded local cache of PASTA+ EML metadata
+    documents keyed by package identifier (scope.identifier.revision).
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+import asyncio
+from datetime import datetime, timedelta
+import gzip
+import hashlib
+import os
+from pathlib import Path
+import tempfile
+import threading
+from typing import Tuple
+
+import daiquiri
+import requests
+from sqlalchemy import Column, DateTime, Integer, String, func
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+from sniffer.config import Config
+from sniffer import metrics, tracing
+from sniffer.model.engine import create_sqlite_engine
+from sniffer import pasta_client
+
+logger = daiquiri.getLogger(__name__)
+Base = declarative_base()
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+class CacheEntry(Base):
+    __tablename__ = "entries"
+
+    pid = Column(String(), primary_key=True)
+    digest = Column(String(), nullable=False, index=True)
+    size = Column(Integer(), nullable=False)
+    encoding = Column(String(), nullable=True)
+    etag = Column(String(), nullable=True)
+    last_modified = Column(String(), nullable=True)
+    date_accessed = Column(DateTime(), nullable=False, index=True)
+    date_validated = Column(DateTime(), nullable=False)
+
+
+class EMLCache:
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = None,
+        compress: bool = True,
+        revalidate_after: int = None,
+    ):
+        """
+        :param path: Cache directory
+        :param max_bytes: Size bound of cached documents; unbounded if None
+        :param compress: Store documents gzip compressed
+        :param revalidate_after: Seconds after which a cached document is
+            revalidated against PASTA+; never revalidated if None
+        """
+        self._path = Path(path)
+        self._path.mkdir(parents=True, exist_ok=True)
+        self._max_bytes = max_bytes
+        self._compress = compress
+        self._revalidate_after = revalidate_after
+        self._lock = threading.Lock()
+        # The session is shared by the fetch threads; access is serialized by
+        # the cache lock, but its connection may be used by another thread
+        # than the one that opened it
+        engine = create_sqlite_engine(
+            str(self._path / "index.sqlite"),
+            connect_args={"check_same_thread": False},
+        )
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine, expire_on_commit=False)
+        self.session = Session()
+
+    def lookup(self, pid: str) -> Tuple:
+        """
+        Look up a cached document and mark it as recently used.
+
+        :param pid: Package identifier
+        :return:
+            (content, entry) tuple or (None, None) if the document is not
+            cached
+        """
+        with self._lock:
+            entry = self.session.get(CacheEntry, pid)
+            if entry is None:
+                return None, None
+            file_path = self._file_path(entry.digest)
+            if not file_path.exists():
+                self.session.delete(entry)
+                self.session.commit()
+                return None, None
+            entry.date_accessed = datetime.now()
+            self.session.commit()
+        opener = gzip.open if self._compress else open
+        try:
+            with opener(file_path, "rb") as f:
+                content = f.read()
+        except FileNotFoundError:
+            # Evicted by another thread since the lookup
+            return None, None
+        return content, entry
+
+    def is_stale(self, entry: CacheEntry) -> bool:
+        if self._revalidate_after is None:
+            return False
+        age = datetime.now() - entry.date_validated
+        return age > timedelta(seconds=self._revalidate_after)
+
+    def put(
+        self,
+        pid: str,
+        content: bytes,
+        encoding: str = None,
+        etag: str = None,
+        last_modified: str = None,
+    ):
+        """
+        Add or replace a cached document.
+
+        :param pid: Package identifier
+        :param content: Document bytes as returned by PASTA+
+        :param encoding: Character encoding of content
+        :param etag: ETag response header
+        :param last_modified: Last-Modified response header
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        file_path = self._file_path(digest)
+        if not file_path.exists():
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=file_path.parent)
+            with os.fdopen(fd, "wb") as f:
+                if self._compress:
+                    f.write(gzip.compress(content))
+                else:
+                    f.write(content)
+            os.replace(tmp, file_path)
+        now = datetime.now()
+        with self._lock:
+            entry = self.session.get(CacheEntry, pid)
+            if entry is None:
+                entry = CacheEntry(pid=pid)
+                self.session.add(entry)
+            elif entry.digest != digest:
+                self._unlink_unreferenced(entry.digest, pid)
+            entry.digest = digest
+            entry.size = len(content)
+            entry.encoding = encoding
+            entry.etag = etag
+            entry.last_modified = last_modified
+            entry.date_accessed = now
+            entry.date_validated = now
+            self.session.commit()
+            self._evict()
+
+    def touch(self, pid: str):
+        """
+        Mark a cached document as successfully revalidated.
+
+        :param pid: Package identifier
+        """
+        with self._lock:
+            entry = self.session.get(CacheEntry, pid)
+            if entry is not None:
+                entry.date_validated = datetime.now()
+                self.session.commit()
+
+    def delete(self, pid: str):
+        with self._lock:
+            entry = self.session.get(CacheEntry, pid)
+            if entry is not None:
+                self.session.delete(entry)
+                self._unlink_unreferenced(entry.digest, pid)
+                self.session.commit()
+
+    @property
+    def size(self) -> int:
+        with self._lock:
+            return self._size()
+
+    def _size(self) -> int:
+        size = self.session.query(func.sum(CacheEntry.size)).scalar()
+        return 0 if size is None else size
+
+    def _evict(self):
+        # Remove least recently used documents until the cache is within
+        # its size bound
+        if self._max_bytes is None:
+            return
+        size = self._size()
+        if size <= self._max_bytes:
+            return
+        entries = (
+            self.session.query(CacheEntry)
+            .order_by(CacheEntry.date_accessed.asc())
+            .all()
+        )
+        for entry in entries:
+            if size <= self._max_bytes:
+                break
+            size -= entry.size
+            self.session.delete(entry)
+            self._unlink_unreferenced(entry.digest, entry.pid)
+            logger.debug(f"Evicting cached metadata: {entry.pid}")
+        self.session.commit()
+
+    def _file_path(self, digest: str) -> Path:
+        suffix = ".xml.gz" if self._compress else ".xml"
+        return self._path / digest[:2] / (digest + suffix)
+
+    def _unlink_unreferenced(self, digest: str, pid: str):
+        # Documents are shared by identical content; only remove the file
+        # if no other entry refers to it
+        references = (
+            self.session.query(CacheEntry)
+            .filter(CacheEntry.digest == digest, CacheEntry.pid != pid)
+            .count()
+        )
+        if references == 0:
+            self._file_path(digest).unlink(missing_ok=True)
+
+
+def get_cache() -> EMLCache:
+    """
+    Return the shared EML cache, creating it on first use, or None if the
+    cache is disabled (EML_CACHE is None).
+
+    :return:
+        EMLCache
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None and Config.EML_CACHE is not None:
+            _cache = EMLCache(
+                Config.PATH + Config.EML_CACHE,
+                max_bytes=Config.EML_CACHE_SIZE,
+                compress=Config.EML_CACHE_COMPRESS,
+                revalidate_after=Config.EML_CACHE_REVALIDATE,
+            )
+    return _cache
+
+
+def fetch(pid: str, url: str, raw: bool = False, **kwargs) -> Tuple:
+    """
+    Get a PASTA+ EML document through the shared cache. A fresh cache hit
+    does not touch the network; a stale hit is revalidated with a
+    conditional request using the stored ETag and Last-Modified headers.
+
+    :param pid: Package identifier
+    :param url: Metadata URL of the package
+    :param raw: Return the document bytes rather than the decoded text
+    :param kwargs: Keyword arguments passed to PastaClient.get
+    :return:
+        (status_code, text) tuple, or (status_code, content) if raw
+    """
+    headers = dict(kwargs.pop("headers", dict()))
+    hit, content, entry = _lookup(pid, raw, headers)
+    if hit:
+        return requests.codes.ok, content
+    r = pasta_client.get_client().get(url, headers=headers, **kwargs)
+    return _complete(pid, raw, content, entry, r)
+
+
+async def fetch_async(client, pid: str, url: str, raw: bool = False) -> Tuple:
+    """
+    Coroutine version of fetch for the asyncio backend.
+
+    :param client: pasta_async.AsyncPastaClient
+    :param pid: Package identifier
+    :param url: Metadata URL of the package
+    :param raw: Return the document bytes rather than the decoded text
+    :return:
+        (status_code, text) tuple, or (status_code, content) if raw
+    """
+    # Cache lookups and updates (SQLite queries and gzip file I/O) block,
+    # so they run in the default executor rather than on the event loop
+    headers = dict()
+    hit, content, entry = await asyncio.to_thread(_lookup, pid, raw, headers)
+    if hit:
+        return requests.codes.ok, content
+    r = await client.get(url, headers=headers)
+    return await asyncio.to_thread(_complete, pid, raw, content, entry, r)
+
+
+def _lookup(pid: str, raw: bool, headers: dict) -> Tuple:
+    # Returns (hit, content, entry); adds conditional request headers to
+    # headers for a stale hit
+    cache = get_cache()
+    if cache is None:
+        return False, None, None
+    content, entry = cache.lookup(pid)
+    if entry is None:
+        metrics.inc(metrics.EML_CACHE, result="miss")
+        tracing.annotate(cache="miss")
+        return False, None, None
+    if not raw:
+        content = content.decode(entry.encoding or "utf-8", errors="replace")
+    if not cache.is_stale(entry):
+        metrics.inc(metrics.EML_CACHE, result="hit")
+        tracing.annotate(cache="hit")
+        return True, content, entry
+    metrics.inc(metrics.EML_CACHE, result="stale")
+    tracing.annotate(cache="stale")
+    if entry.etag is not None:
+        headers["If-None-Match"] = entry.etag
+    if entry.last_modified is not None:
+        headers["If-Modified-Since"] = entry.last_modified
+    return False, content, entry
+
+
+def _complete(pid: str, raw: bool, content, entry, r) -> Tuple:
+    # Update the cache from a requests or httpx response
+    cache = get_cache()
+    if cache is None:
+        return r.status_code, r.content if raw else r.text
+    if r.status_code == requests.codes.not_modified and entry is not None:
+        metrics.inc(metrics.EML_CACHE, result="revalidated")
+        tracing.annotate(cache="revalidated")
+        cache.touch(pid)
+        return requests.codes.ok, content
+    if r.status_code == requests.codes.ok:
+        cache.put(
+            pid,
+            r.content,
+            encoding=r.encoding,
+            etag=r.headers.get("ETag"),
+            last_modified=r.headers.get("Last-Modified"),
+        )
+    elif entry is not None and r.status_code in (
+        requests.codes.unauthorized,
+        requests.codes.forbidden,
+        requests.codes.not_found,
+    ):
+        # Access to the document has changed since it was cached
+        cache.delete(pid)
+    return r.status_code, r.content if raw else r.text
@@ -0,0 +1,16 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: __init__
+
+:Synopsis:
+    Local stand-in for PASTA+: a SQLite fake of the datapackagemanager
+    schema and an HTTP server for its metadata and login endpoints.
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: emulate
+
+:Synopsis:
+    Command line interface of the PASTA+ emulator, and the helper that points
+    the sniffer configuration at a running emulator.
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+from functools import partial
+import logging
+import os
+import time
+
+import click
+import daiquiri
+
+from sniffer.config import Config
+from sniffer.emulator import pasta_db
+from sniffer.emulator.server import EmulatorServer
+from sniffer.model import pasta_data_package_manager_db
+from sniffer import pasta_client
+
+logger = daiquiri.getLogger(__name__)
+
+help_db = "Path of the emulator database."
+help_packages = "Number of synthetic packages to add."
+help_entities = "Maximum number of data entities per package."
+help_attributes = "Number of attributes per data entity."
+help_embargo_rate = "Share of embargoed packages."
+help_offline_rate = "Share of packages with an offline entity."
+help_inaccessible_rate = "Share of packages whose metadata is denied."
+help_base_url = "PASTA+ package URL of resource identifiers."
+help_seed = "Random seed."
+help_eml = "Directory of recorded EML documents (*.xml) to serve."
+help_host = "Interface to listen on."
+help_port = "Port to listen on."
+help_latency = "Mean response latency in seconds."
+help_error_rate = "Share of requests answered with 500 or 503."
+CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
+
+
+def configure(url: str = None, db: str = None):
+    """
+    Point the PASTA+ settings of this process at an emulator: requests go to
+    the emulator server and database queries to its SQLite fake, whose
+    engine factory is installed in pasta_data_package_manager_db. Shared
+    engines and clients are reset so the settings take effect.
+
+    :param url: PASTA+ package URL of the emulator server; requests are not
+        redirected if None
+    :param db: Path of the emulator database; queries are not redirected if
+        None
+    """
+    if url is not None:
+        Config.PASTA_URL = url
+        Config.METADATA_URL = (
+            url + "metadata/eml/<SCOPE>/<IDENTIFIER>/<REVISION>"
+        )
+        Config.RESOURCE_URL = url + "eml/<SCOPE>/<IDENTIFIER>/<REVISION>"
+        pasta_client.close()
+    if db is not None:
+        pasta_data_package_manager_db.set_engine_factory(
+            partial(pasta_db.create_engine, os.path.abspath(db))
+        )
+
+
+@click.group(context_settings=CONTEXT_SETTINGS)
+def main():
+    daiquiri.setup(level=logging.INFO, outputs=("stdout",))
+
+
+@main.command()
+@click.argument("db")
+@click.option("-p", "--packages", default=1000, help=help_packages)
+@click.option("-e", "--entities", default=5, help=help_entities)
+@click.option("-a", "--attributes", default=20, help=help_attributes)
+@click.option("--embargo-rate", default=0.1, help=help_embargo_rate)
+@click.option("--offline-rate", default=0.05, help=help_offline_rate)
+@click.option("--inaccessible-rate", default=0.01, help=help_inaccessible_rate)
+@click.option("-u", "--base-url", default=None, help=help_base_url)
+@click.option("--seed", default=0, help=help_seed)
+@click.option("--eml", default=None, help=help_eml)
+def generate(
+    db: str,
+    packages: int,
+    entities: int,
+    attributes: int,
+    embargo_rate: float,
+    offline_rate: float,
+    inaccessible_rate: float,
+    base_url: str,
+    seed: int,
+    eml: str,
+):
+    """
+    Add synthetic packages to the emulator database DB.
+    """
+    count = pasta_db.generate(
+        db,
+        packages=packages,
+        entities=entities,
+        attributes=attributes,
+        embargo_rate=embargo_rate,
+        offline_rate=offline_rate,
+        inaccessible_rate=inaccessible_rate,
+        base_url=base_url,
+        seed=seed,
+    )
+    logger.info(f"Packages generated: {count}")
+    if eml is not None:
+        count = pasta_db.load_eml(db, eml)
+        logger.info(f"EML documents loaded: {count}")
+    return 0
+
+
+@main.command()
+@click.argument("db")
+@click.option("-H", "--host", default="127.0.0.1", help=help_host)
+@click.option("-p", "--port", default=8080, help=help_port)
+@click.option("-l", "--latency", default=0.0, help=help_latency)
+@click.option("-r", "--error-rate", default=0.0, help=help_error_rate)
+@click.option("--seed", default=None, type=int, help=help_seed)
+def serve(
+    db: str,
+    host: str,
+    port: int,
+    latency: float,
+    error_rate: float,
+    seed: int,
+):
+    """
+    Serve the emulator database DB until interrupted.
+    """
+    with EmulatorServer(db, host, port, latency, error_rate, seed) as server:
+        msg = (
+            f"Serving {db} at {server.url}; point the sniffer at it with "
+            f"sniffer.emulator.emulate.configure(\"{server.url}\", "
+            f"\"{os.path.abspath(db)}\")"
+        )
+        logger.info(msg)
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    main()
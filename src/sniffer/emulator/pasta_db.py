@@ -0,0 +1,459 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: pasta_db
+
+:Synopsis:
+    SQLite fake of the PASTA+ datapackagemanager schema (resource_registry
+    and access_matrix), with a table of the EML documents served by the
+    emulator. The database is filled with synthetic packages by generate or
+    with recorded EML documents by load_eml.
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+from datetime import datetime, timedelta
+import hashlib
+from pathlib import Path
+import random
+import re
+import sqlite3
+from typing import Tuple
+from xml.sax.saxutils import escape
+
+import daiquiri
+from lxml import etree
+import sqlalchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from sniffer.config import Config
+
+logger = daiquiri.getLogger(__name__)
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS resource_registry ("
+    "resource_id TEXT PRIMARY KEY, resource_type TEXT NOT NULL, "
+    "package_id TEXT NOT NULL COLLATE en_US, scope TEXT NOT NULL, "
+    "identifier INTEGER NOT NULL, revision INTEGER NOT NULL, "
+    "date_created TIMESTAMP NOT NULL, date_deactivated TIMESTAMP, doi TEXT)",
+    "CREATE INDEX IF NOT EXISTS ix_resource_registry_package_id "
+    "ON resource_registry (package_id)",
+    "CREATE INDEX IF NOT EXISTS ix_resource_registry_date_created "
+    "ON resource_registry (date_created, package_id)",
+    "CREATE TABLE IF NOT EXISTS access_matrix ("
+    "resource_id TEXT NOT NULL, principal TEXT NOT NULL, "
+    "access_type TEXT NOT NULL, permission TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_access_matrix_resource_id "
+    "ON access_matrix (resource_id)",
+    "CREATE TABLE IF NOT EXISTS eml ("
+    "package_id TEXT PRIMARY KEY, document BLOB NOT NULL, "
+    "etag TEXT NOT NULL, accessible INTEGER NOT NULL)",
+)
+
+# (access_type, principal, permission) rules
+PUBLIC = ("allow", "public", "read")
+DENY = ("deny", "public", "read")
+AUTHENTICATED = ("allow", "authenticated", "read")
+
+SCOPES = ("edi", "knb-lter-and", "knb-lter-hbr", "knb-lter-nin", "ecotrends")
+
+EML_TEMPLATE = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<eml:eml xmlns:eml="https://eml.ecoinformatics.org/eml-2.2.0" '
+    'packageId="{pid}" system="https://pasta.edirepository.org">'
+    "{access}<dataset><title>Synthetic package {pid}</title>"
+    "{entities}</dataset></eml:eml>"
+)
+
+ENTITY_TEMPLATE = (
+    "<dataTable><entityName>{name}</entityName><physical>"
+    "<objectName>{name}.csv</objectName><size>{size}</size>"
+    "<distribution>{offline}<online><url>{url}</url></online>{access}"
+    "</distribution></physical><attributeList>{attributes}</attributeList>"
+    "</dataTable>"
+)
+
+
+def locale_collation(a: str, b: str) -> int:
+    # Approximates the en_US.UTF-8 collation of the PASTA+ database: letters
+    # and digits are compared first, ignoring case and punctuation, so that
+    # e.g. "knba.1.1" sorts before "knb-lter-and.1.1" unlike in byte order
+    def key(s: str) -> Tuple:
+        return re.sub(r"[^0-9a-z]", "", s.lower()), s.lower(), s
+
+    ka, kb = key(a), key(b)
+    return (ka > kb) - (ka < kb)
+
+
+def byte_collation(a: str, b: str) -> int:
+    # The "C" collation of PostgreSQL: byte (code point) order
+    return (a > b) - (a < b)
+
+
+def register_collations(connection: sqlite3.Connection):
+    """
+    Register the collations used by the fake database and its queries on a
+    connection; package_id columns compare in the emulated en_US collation.
+
+    :param connection: sqlite3 connection
+    """
+    connection.create_collation("en_US", locale_collation)
+    connection.create_collation("C", byte_collation)
+
+
+def connect(db: str) -> sqlite3.Connection:
+    """
+    Open the fake database, creating its tables if needed.
+
+    :param db: Path to the SQLite database file
+    :return:
+        sqlite3 connection returning TIMESTAMP columns as datetime
+    """
+    connection = sqlite3.connect(db, detect_types=sqlite3.PARSE_DECLTYPES)
+    register_collations(connection)
+    for statement in SCHEMA:
+        connection.execute(statement)
+    return connection
+
+
+def create_engine(db: str) -> Engine:
+    """
+    Create an engine of the fake database for the shared PASTA+ database
+    engine (see pasta_data_package_manager_db.set_engine_factory). The fake
+    database is attached under the name of the PASTA+ schema so that the
+    production SQL runs unchanged; SQLite lacks CONCAT, which is registered
+    as a function, and the PostgreSQL collations.
+
+    :param db: Path to the SQLite database file
+    :return:
+        SQLAlchemy engine
+    """
+    engine = sqlalchemy.create_engine(
+        "sqlite:///" + db,
+        connect_args={
+            "detect_types": sqlite3.PARSE_DECLTYPES,
+            "check_same_thread": False,
+        },
+    )
+
+    @event.listens_for(engine, "connect")
+    def attach(dbapi_connection, connection_record):
+        dbapi_connection.create_function("CONCAT", -1, _concat)
+        register_collations(dbapi_connection)
+        path = db.replace("'", "''")
+        dbapi_connection.execute(
+            f"ATTACH DATABASE '{path}' AS datapackagemanager"
+        )
+
+    return engine
+
+
+def _concat(*args) -> str:
+    return "".join("" if arg is None else str(arg) for arg in args)
+
+
+def access_element(rules) -> str:
+    """
+    :param rules: Iterable of (access_type, principal, permission) tuples
+    :return:
+        EML access element
+    """
+    elements = "".join(
+        f"<{access_type}><principal>{principal}</principal>"
+        f"<permission>{permission}</permission></{access_type}>"
+        for access_type, principal, permission in rules
+    )
+    return (
+        '<access authSystem="https://pasta.edirepository.org/'
+        f'authentication" order="allowFirst">{elements}</access>'
+    )
+
+
+def generate(
+    db: str,
+    packages: int = 1000,
+    entities: int = 5,
+    attributes: int = 20,
+    embargo_rate: float = 0.1,
+    offline_rate: float = 0.05,
+    inaccessible_rate: float = 0.01,
+    base_url: str = None,
+    start: datetime = None,
+    seed: int = 0,
+    eml: bool = True,
+) -> int:
+    """
+    Add synthetic packages to the fake database. Packages are revisions of
+    series in a handful of scopes, created an hour apart (every tenth
+    shares the date of its predecessor), each with up to entities data
+    tables. A share of them is embargoed, either as a whole (public read
+    denied at the package level) or for one entity, has an offline
+    distribution, or has metadata that cannot be read at all.
+
+    :param db: Path to the SQLite database file
+    :param packages: Number of packages to add
+    :param entities: Maximum number of data entities per package
+    :param attributes: Number of attributes per data entity
+    :param embargo_rate: Share of embargoed packages
+    :param offline_rate: Share of packages with an offline entity
+    :param inaccessible_rate: Share of packages whose metadata is denied
+    :param base_url: PASTA+ package URL of resource identifiers; defaults to
+        PASTA_URL
+    :param start: Date created of the first package; defaults to START_DATE
+    :param seed: Random seed
+    :param eml: Store the EML documents to serve; registry-only databases
+        are much smaller when only registry queries are exercised
+    :return:
+        Count of packages added
+    """
+    if base_url is None:
+        base_url = Config.PASTA_URL
+    if start is None:
+        start = Config.START_DATE
+    rng = random.Random(seed)
+    connection = connect(db)
+    series = dict()
+    date_created = start
+    with connection:
+        for i in range(packages):
+            scope = SCOPES[i % len(SCOPES)]
+            if len(series) == 0 or rng.random() < 0.7:
+                identifier = len(series) + 1
+                series[identifier] = 0
+            else:
+                identifier = rng.choice(list(series))
+            series[identifier] += 1
+            revision = series[identifier]
+            if i % 10 != 9:
+                date_created += timedelta(hours=1)
+            _add_package(
+                connection,
+                rng,
+                (scope, identifier, revision),
+                date_created,
+                rng.randint(1, entities),
+                attributes,
+                embargo_rate,
+                offline_rate,
+                inaccessible_rate,
+                base_url,
+                eml,
+            )
+    connection.close()
+    return packages
+
+
+def entity_url(base_url: str, pid: str, n: int) -> str:
+    """
+    :param base_url: PASTA+ package URL
+    :param pid: Package identifier
+    :param n: Entity number
+    :return:
+        Data resource identifier of the package's nth entity
+    """
+    scope, identifier, revision = pid.split(".")
+    entity_id = hashlib.md5(f"{pid}/{n}".encode("utf-8")).hexdigest()
+    return f"{base_url}data/eml/{scope}/{identifier}/{revision}/{entity_id}"
+
+
+def eml_document(
+    pid: str,
+    entities: int,
+    attributes: int = 20,
+    package_rules=(PUBLIC,),
+    entity_rules=None,
+    offline: bool = False,
+    base_url: str = None,
+    rng: random.Random = None,
+) -> bytes:
+    """
+    Synthetic EML document.
+
+    :param pid: Package identifier
+    :param entities: Number of data tables
+    :param attributes: Number of attributes per data table
+    :param package_rules: Rules of the package access element
+    :param entity_rules: Rules of an access element of the first entity;
+        no entity access element if None
+    :param offline: Give the last entity an offline distribution
+    :param base_url: PASTA+ package URL of entity URLs; defaults to
+        PASTA_URL
+    :param rng: Random source of entity sizes
+    :return:
+        UTF-8 encoded document
+    """
+    if base_url is None:
+        base_url = Config.PASTA_URL
+    if rng is None:
+        rng = random.Random(0)
+    attribute_list = "".join(
+        f"<attribute><attributeName>a{a}</attributeName>"
+        "<attributeDefinition>Synthetic attribute"
+        "</attributeDefinition></attribute>"
+        for a in range(attributes)
+    )
+    entity_elements = list()
+    for n in range(entities):
+        entity_elements.append(
+            ENTITY_TEMPLATE.format(
+                name=f"entity_{n}",
+                size=rng.randint(1, 10 ** 9),
+                offline=(
+                    "<offline><mediumName>tape</mediumName></offline>"
+                    if offline and n == entities - 1
+                    else ""
+                ),
+                url=escape(entity_url(base_url, pid, n)),
+                access=(
+                    access_element(entity_rules)
+                    if entity_rules is not None and n == 0
+                    else ""
+                ),
+                attributes=attribute_list,
+            )
+        )
+    return EML_TEMPLATE.format(
+        pid=pid,
+        access=access_element(package_rules),
+        entities="".join(entity_elements),
+    ).encode("utf-8")
+
+
+def _add_package(
+    connection: sqlite3.Connection,
+    rng: random.Random,
+    package: Tuple,
+    date_created: datetime,
+    entities: int,
+    attributes: int,
+    embargo_rate: float,
+    offline_rate: float,
+    inaccessible_rate: float,
+    base_url: str,
+    eml: bool,
+):
+    scope, identifier, revision = package
+    pid = f"{scope}.{identifier}.{revision}"
+    path = f"eml/{scope}/{identifier}/{revision}"
+
+    draw = rng.random()
+    inaccessible = draw < inaccessible_rate
+    package_embargo = inaccessible or draw < inaccessible_rate + (
+        embargo_rate / 2
+    )
+    entity_embargo = not package_embargo and draw < (
+        inaccessible_rate + embargo_rate
+    )
+    allows_authenticated = rng.random() < 0.5
+    offline = rng.random() < offline_rate
+
+    package_rules = [DENY if package_embargo else PUBLIC]
+    if package_embargo and allows_authenticated:
+        package_rules.append(AUTHENTICATED)
+    entity_rules = None
+    if entity_embargo:
+        entity_rules = [DENY]
+        if allows_authenticated:
+            entity_rules.append(AUTHENTICATED)
+    registry = [
+        (f"{base_url}{path}", "dataPackage", package_rules),
+        (f"{base_url}metadata/{path}", "metadata", package_rules),
+    ]
+    for n in range(entities):
+        rules = entity_rules if entity_rules is not None and n == 0 else (
+            package_rules
+        )
+        registry.append((entity_url(base_url, pid, n), "data", rules))
+
+    document = None
+    if eml:
+        document = eml_document(
+            pid,
+            entities,
+            attributes,
+            package_rules=package_rules,
+            entity_rules=entity_rules,
+            offline=offline,
+            base_url=base_url,
+            rng=rng,
+        )
+    digest = hashlib.md5(document or pid.encode("utf-8")).hexdigest()
+    doi = f"doi:10.0000/emulator/{digest}"
+    for resource_id, resource_type, rules in registry:
+        connection.execute(
+            "INSERT OR REPLACE INTO resource_registry VALUES "
+            "(?, ?, ?, ?, ?, ?, ?, NULL, ?)",
+            (
+                resource_id,
+                resource_type,
+                pid,
+                scope,
+                identifier,
+                revision,
+                date_created,
+                doi if resource_type == "dataPackage" else None,
+            ),
+        )
+        connection.executemany(
+            "INSERT INTO access_matrix VALUES (?, ?, ?, ?)",
+            [
+                (resource_id, principal, access_type, permission)
+                for access_type, principal, permission in rules
+            ],
+        )
+    if eml:
+        _add_eml(connection, pid, document, not inaccessible)
+
+
+def _add_eml(
+    connection: sqlite3.Connection, pid: str, document: bytes, accessible
+):
+    etag = '"' + hashlib.sha256(document).hexdigest()[:32] + '"'
+    connection.execute(
+        "INSERT OR REPLACE INTO eml VALUES (?, ?, ?, ?)",
+        (pid, document, etag, int(accessible)),
+    )
+
+
+def load_eml(db: str, path: str) -> int:
+    """
+    Serve recorded EML documents: each <path>/*.xml file replaces the
+    document of the package named by its packageId attribute.
+
+    :param db: Path to the SQLite database file
+    :param path: Directory of recorded EML documents
+    :return:
+        Count of loaded documents
+    """
+    connection = connect(db)
+    count = 0
+    with connection:
+        for file_path in sorted(Path(path).glob("*.xml")):
+            document = file_path.read_bytes()
+            pid = etree.fromstring(document).get("packageId")
+            if pid is None:
+                logger.warning(f"Ignoring {file_path}: no packageId")
+                continue
+            _add_eml(connection, pid, document, True)
+            count += 1
+    connection.close()
+    return count
+
+
+def get_eml(connection: sqlite3.Connection, pid: str) -> Tuple:
+    """
+    :param connection: Connection to the fake database
+    :param pid: Package identifier
+    :return:
+        (document, etag, accessible) tuple or None if the package is unknown
+    """
+    row = connection.execute(
+        "SELECT document, etag, accessible FROM eml WHERE package_id=?",
+        (pid,),
+    ).fetchone()
+    return None if row is None else (row[0], row[1], bool(row[2]))
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: server
+
+:Synopsis:
+    HTTP stand-in for the PASTA+ login and EML metadata endpoints, serving
+    documents from the emulator database with configurable latency and
+    error rates.
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+import base64
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import random
+import re
+import threading
+import time
+
+import daiquiri
+
+from sniffer.emulator import pasta_db
+
+logger = daiquiri.getLogger(__name__)
+
+METADATA_PATH = re.compile(
+    r"^/package/metadata/eml/([^/]+)/(\d+)/(\d+)/?$"
+)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        if server.latency > 0:
+            time.sleep(server.rng.expovariate(1.0 / server.latency))
+        if server.rng.random() < server.error_rate:
+            if server.rng.random() < 0.5:
+                self._respond(503, headers={"Retry-After": "0"})
+            else:
+                self._respond(500)
+            return
+
+        path = self.path.split("?")[0]
+        if path in ("/package", "/package/"):
+            self._login()
+            return
+        match = METADATA_PATH.match(path)
+        if match is None:
+            self._respond(404)
+        elif not self._authenticated():
+            self._respond(401)
+        else:
+            self._metadata(".".join(match.groups()))
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _login(self):
+        authorization = self.headers.get("Authorization", "")
+        if not authorization.startswith("Basic "):
+            self._respond(401)
+            return
+        user = base64.b64decode(authorization[6:]).decode("utf-8")
+        token = base64.b64encode(
+            f"{user.split(':')[0]}*{time.time()}".encode("utf-8")
+        ).decode("ascii")
+        self._respond(200, headers={"Set-Cookie": f"auth-token={token}"})
+
+    def _authenticated(self) -> bool:
+        cookie = self.headers.get("Cookie", "")
+        authorization = self.headers.get("Authorization", "")
+        return "auth-token=" in cookie or authorization.startswith("Basic ")
+
+    def _metadata(self, pid: str):
+        eml = pasta_db.get_eml(self.server.connection(), pid)
+        if eml is None:
+            self._respond(404)
+            return
+        document, etag, accessible = eml
+        if not accessible:
+            self._respond(401)
+        elif self.headers.get("If-None-Match") == etag:
+            self._respond(304, headers={"ETag": etag})
+        else:
+            self._respond(
+                200,
+                document,
+                headers={
+                    "Content-Type": "application/xml; charset=UTF-8",
+                    "ETag": etag,
+                },
+            )
+
+    def _respond(self, status: int, body: bytes = b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or dict()).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class EmulatorServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        db: str,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = None,
+    ):
+        """
+        :param db: Path to the emulator database
+        :param host: Interface to listen on
+        :param port: Port to listen on; 0 picks a free port
+        :param latency: Mean response latency in seconds (exponentially
+            distributed)
+        :param error_rate: Share of requests answered with 500 or 503
+        :param seed: Random seed of latency and errors
+        """
+        super().__init__((host, port), Handler)
+        self.db = db
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self._local = threading.local()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """
+        PASTA+ package URL of the server, the emulator's PASTA_URL.
+        """
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/package/"
+
+    def connection(self):
+        # One database connection per request thread
+        if not hasattr(self._local, "connection"):
+            self._local.connection = pasta_db.connect(self.db)
+        return self._local.connection
+
+    def start(self):
+        """
+        Serve requests in a background thread.
+        """
+        self._thread = threading.Thread(
+            target=self.serve_forever, name="pasta-emulator", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -4,18 +4,24 @@
 """:Mod: lock
 
 :Synopsis:
-    Create a simple file-based mutex lock.
- 
+    File-based mutex lock held with flock(2). The kernel releases the lock
+    when the holding process exits, so a crashed run cannot leave a lock
+    behind; the holder's PID, host and acquisition time are recorded in the
+    lock file for diagnostics and to report unclean exits.
+
 :Author:
     servilla
 
 :Created:
     3/31/17
 """
-import logging
-import string
-import random
+from datetime import datetime
+import fcntl
 import os
+from pathlib import Path
+import random
+import socket
+import string
 
 import daiquiri
 
@@ -33,22 +39,111 @@ class Lock(object):
             self._file_name = random_str(10) + ".lock"
         else:
             self._file_name = file_name
-
-    def acquire(self):
-        fp = open(self._file_name, "wb")
-        fp.close()
+        self._fd = None
+
+    def acquire(self) -> bool:
+        """
+        Try to acquire the lock without blocking.
+
+        :return:
+            True if the lock was acquired, False if another process holds it
+        """
+        if self._fd is not None:
+            return True
+        fd = os.open(self._file_name, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        stale = self._read(fd)
+        if stale:
+            msg = (
+                f"Lock file {self._file_name} was not released by its "
+                f"previous holder: {stale}"
+            )
+            logger.warning(msg)
+        holder = (
+            f"pid={os.getpid()} host={socket.gethostname()} "
+            f"acquired={datetime.now().isoformat()}"
+        )
+        os.ftruncate(fd, 0)
+        os.pwrite(fd, holder.encode("utf-8"), 0)
+        os.fsync(fd)
+        self._fd = fd
+        return True
 
     def release(self):
-        os.remove(self._file_name)
+        if self._fd is None:
+            return
+        # The file is emptied rather than removed: removing it would let
+        # another process lock an unlinked inode while a third creates a
+        # new file
+        os.ftruncate(self._fd, 0)
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
 
     @property
-    def locked(self):
-        return os.path.isfile(self._file_name)
+    def locked(self) -> bool:
+        if self._fd is not None:
+            return True
+        if not Path(self._file_name).exists():
+            return False
+        fd = os.open(self._file_name, os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        else:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            return False
+        finally:
+            os.close(fd)
+
+    @property
+    def holder(self) -> str:
+        """
+        Holder information recorded in the lock file, or an empty string.
+        """
+        try:
+            with open(self._file_name, "r") as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return ""
 
     @property
     def lock_file(self):
         return self._file_name
 
+    def __enter__(self):
+        if not self.acquire():
+            msg = f"Lock file {self._file_name} is held by: {self.holder}"
+            raise BlockingIOError(msg)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    @staticmethod
+    def _read(fd: int) -> str:
+        size = os.fstat(fd).st_size
+        return os.pread(fd, size, 0).decode("utf-8", errors="replace")
+
+
+def scoped(lock_file: str, scope: str) -> Lock:
+    """
+    Lock of a single scope (e.g. a sniffer), derived from a base lock file
+    name: sniffer.lock becomes sniffer.<scope>.lock.
+
+    :param lock_file: Base lock file name
+    :param scope: Scope name
+    :return:
+        Lock
+    """
+    path = Path(lock_file)
+    return Lock(str(path.with_name(f"{path.stem}.{scope}{path.suffix}")))
+
 
 def main():
     return 0
@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: metrics
+
+:Synopsis:
+    Process-wide counters, gauges and latency histograms of the sniff
+    pipeline stages (HTTP fetch, EML parse, analysis, registry SQL and local
+    database writes). Analysis processes ship their metrics back to the
+    writer with each result (drain/merge). At the end of a run the metrics
+    are exported as a Prometheus node-exporter textfile and a JSON summary.
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+import json
+import math
+import os
+import threading
+import time
+from typing import Dict, Iterator, Tuple
+
+import daiquiri
+
+logger = daiquiri.getLogger(__name__)
+
+HTTP_REQUESTS = "sniffer_http_request_seconds"
+EML_CACHE = "sniffer_eml_cache_lookups_total"
+EML_PARSE = "sniffer_eml_parse_seconds"
+ANALYZE = "sniffer_analyze_seconds"
+REGISTRY_QUERY = "sniffer_registry_query_seconds"
+REGISTRY_ROWS = "sniffer_registry_rows_total"
+DB_WRITE = "sniffer_db_write_seconds"
+DB_ROWS = "sniffer_db_rows_total"
+PERSIST = "sniffer_persist_seconds"
+PACKAGES = "sniffer_packages_total"
+RESOURCES = "sniffer_resources"
+PACKAGES_SYNCED = "sniffer_packages_synced"
+RATE_LIMIT = "sniffer_rate_limit_requests_per_second"
+RUN_DURATION = "sniffer_run_duration_seconds"
+RUN_TIMESTAMP = "sniffer_run_timestamp_seconds"
+RUN_SUCCESS = "sniffer_run_success"
+
+HELP = {
+    HTTP_REQUESTS: "PASTA+ HTTP request latency by response status.",
+    EML_CACHE: "EML cache lookups by result.",
+    EML_PARSE: "EML parse time by parse mode.",
+    ANALYZE: "Package analysis time by sniffer.",
+    REGISTRY_QUERY: "PASTA+ registry query time.",
+    REGISTRY_ROWS: "Rows returned by PASTA+ registry queries.",
+    DB_WRITE: "Local database bulk insert time by table.",
+    DB_ROWS: "Rows inserted into local databases by table.",
+    PERSIST: "Sniffer result transaction time by sniffer.",
+    PACKAGES: "Packages analyzed by sniffer.",
+    RESOURCES: "Resources persisted by sniffer in the last run.",
+    PACKAGES_SYNCED: "Packages added to the package pool in the last run.",
+    RATE_LIMIT: "PASTA+ request rate of the adaptive limiter by host.",
+    RUN_DURATION: "Duration of the last sniff run.",
+    RUN_TIMESTAMP: "Unix time the last sniff run ended.",
+    RUN_SUCCESS: "1 if the last sniff run succeeded, 0 otherwise.",
+}
+
+# Upper bounds in seconds of the latency histogram buckets
+BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+    30.0, 60.0,
+)
+
+_lock = threading.Lock()
+_counters = dict()
+_gauges = dict()
+# (name, labels) to [bucket counts..., +Inf count, sum, max]
+_histograms = dict()
+
+
+def _key(name: str, labels: dict) -> Tuple:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels):
+    """
+    Add to a counter.
+
+    :param name: Metric name
+    :param value: Increment
+    :param labels: Label values
+    """
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels):
+    """
+    :param name: Metric name
+    :param value: Gauge value
+    :param labels: Label values
+    """
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name: str, seconds: float, **labels):
+    """
+    Record a latency in a histogram.
+
+    :param name: Metric name
+    :param seconds: Observed latency
+    :param labels: Label values
+    """
+    key = _key(name, labels)
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0, 0.0]
+        h[bisect_left(BUCKETS, seconds)] += 1
+        h[-2] += seconds
+        h[-1] = max(h[-1], seconds)
+
+
+@contextmanager
+def timer(name: str, **labels) -> Iterator:
+    """
+    Observe the time spent in a with block, whether or not it raises.
+
+    :param name: Metric name
+    :param labels: Label values
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def drain() -> Dict:
+    """
+    Take the metrics recorded so far, resetting them; used by analysis
+    processes to ship their metrics with each result.
+
+    :return:
+        Picklable snapshot to merge
+    """
+    global _counters, _gauges, _histograms
+    with _lock:
+        snapshot = {
+            "counters": _counters,
+            "gauges": _gauges,
+            "histograms": _histograms,
+        }
+        _counters, _gauges, _histograms = dict(), dict(), dict()
+    return snapshot
+
+
+def merge(snapshot: Dict):
+    """
+    Add a snapshot taken by drain to the metrics of this process.
+
+    :param snapshot: Snapshot
+    """
+    with _lock:
+        for key, value in snapshot["counters"].items():
+            _counters[key] = _counters.get(key, 0) + value
+        _gauges.update(snapshot["gauges"])
+        for key, other in snapshot["histograms"].items():
+            h = _histograms.get(key)
+            if h is None:
+                _histograms[key] = list(other)
+                continue
+            for i in range(len(h) - 1):
+                h[i] += other[i]
+            h[-1] = max(h[-1], other[-1])
+
+
+def reset():
+    drain()
+
+
+def _labels(labels: Tuple, extra: Tuple = ()) -> str:
+    pairs = labels + extra
+    if len(pairs) == 0:
+        return ""
+    values = ",".join(f'{k}="{_escape(str(v))}"' for k, v in pairs)
+    return "{" + values + "}"
+
+
+def _escape(value: str) -> str:
+    return (
+        value.replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("\n", "\\n")
+    )
+
+
+def prometheus() -> str:
+    """
+    :return:
+        Metrics in the Prometheus text exposition format
+    """
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        histograms = {key: list(h) for key, h in _histograms.items()}
+    lines = list()
+    for kind, metrics in (
+        ("counter", counters), ("gauge", gauges), ("histogram", histograms)
+    ):
+        for name in sorted({name for name, labels in metrics}):
+            if name in HELP:
+                lines.append(f"# HELP {name} {HELP[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (n, labels), value in sorted(metrics.items()):
+                if n != name:
+                    continue
+                if kind != "histogram":
+                    lines.append(f"{name}{_labels(labels)} {value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), value[:-2]):
+                    cumulative += count
+                    le = _labels(labels, (("le", bound),))
+                    lines.append(f"{name}_bucket{le} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {value[-2]}")
+                lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def _quantile(h: list, q: float) -> float:
+    # Upper bound of the bucket holding the q quantile, capped by the
+    # largest observation
+    count = sum(h[:-2])
+    if count == 0:
+        return None
+    rank = math.ceil(q * count)
+    cumulative = 0
+    for bound, n in zip(BUCKETS + (h[-1],), h[:-2]):
+        cumulative += n
+        if cumulative >= rank:
+            return min(bound, h[-1])
+    return h[-1]
+
+
+def summary() -> Dict:
+    """
+    :return:
+        JSON-serializable summary of the metrics; histograms are summarized
+        by count, total, mean, max and estimated p50/p95/p99
+    """
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        histograms = {key: list(h) for key, h in _histograms.items()}
+
+    def entries(metrics: Dict, value) -> Dict:
+        result = dict()
+        for (name, labels), v in sorted(metrics.items()):
+            entry = dict(labels)
+            entry.update(value(v))
+            result.setdefault(name, list()).append(entry)
+        return result
+
+    def histogram(h: list) -> Dict:
+        count = sum(h[:-2])
+        return {
+            "count": count,
+            "total": round(h[-2], 6),
+            "mean": round(h[-2] / count, 6) if count else None,
+            "max": round(h[-1], 6),
+            "p50": _quantile(h, 0.5),
+            "p95": _quantile(h, 0.95),
+            "p99": _quantile(h, 0.99),
+        }
+
+    return {
+        "counters": entries(counters, lambda v: {"value": v}),
+        "gauges": entries(gauges, lambda v: {"value": v}),
+        "histograms": entries(histograms, histogram),
+    }
+
+
+def _write(path: str, content: str):
+    # Written to a temporary file and renamed so that readers (the node
+    # exporter) never see a partial file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def write_textfile(path: str):
+    """
+    Export the metrics as a Prometheus node-exporter textfile.
+
+    :param path: Textfile path; should end in .prom
+    """
+    _write(path, prometheus())
+    logger.info(f"Metrics written to {path}")
+
+
+def write_summary(path: str, run: Dict):
+    """
+    Write a JSON run summary.
+
+    :param path: Summary file path
+    :param run: Run description (dates, status, counts) included in the
+        summary
+    """
+    content = dict(run)
+    content["metrics"] = summary()
+    _write(path, json.dumps(content, indent=2, default=str) + "\n")
+    logger.info(f"Run summary written to {path}")
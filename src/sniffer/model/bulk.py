@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: bulk
+
+:Synopsis:
+    Batched inserts for the local SQLite databases.
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+from typing import List
+
+import daiquiri
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from sniffer import metrics, tracing
+
+logger = daiquiri.getLogger(__name__)
+
+
+def insert_or_ignore(
+    session: Session, model, rows: List[dict], commit: bool = True
+) -> int:
+    """
+    Insert rows into the table of model in a single transaction using
+    "INSERT ... ON CONFLICT DO NOTHING", so that rows which would violate a
+    uniqueness constraint are skipped instead of aborting the batch.
+
+    :param session: Session bound to the database
+    :param model: Declarative model class of the target table
+    :param rows: List of column name to value dictionaries
+    :param commit: Commit the transaction; False leaves the transaction
+        open so that the insert can be combined with other changes
+    :return:
+        Count of inserted rows
+    """
+    if len(rows) == 0:
+        return 0
+    stmt = sqlite_insert(model).on_conflict_do_nothing()
+    table = model.__tablename__
+    try:
+        with metrics.timer(metrics.DB_WRITE, table=table):
+            with tracing.span("insert", table=table, rows=len(rows)):
+                r = session.execute(stmt, rows)
+                if commit:
+                    session.commit()
+    except IntegrityError as ex:
+        logger.error(ex)
+        session.rollback()
+        raise ex
+    metrics.inc(metrics.DB_ROWS, r.rowcount, table=table)
+    return r.rowcount
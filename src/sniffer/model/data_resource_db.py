@@ -13,6 +13,7 @@
     7/28/20
 """
 from datetime import datetime
+from typing import List
 
 import daiquiri
 from sqlalchemy import (
@@ -33,6 +34,8 @@ from sqlalchemy.orm.query import Query
 from sqlalchemy.sql import not_
 
 from sniffer.config import Config
+from sniffer.model.bulk import insert_or_ignore
+from sniffer.model.engine import create_sqlite_engine
 
 logger = daiquiri.getLogger(__name__)
 Base = declarative_base()
@@ -55,9 +58,7 @@ class DataResource(Base):
 
 class DataResourcePool:
     def __init__(self, db: str):
-        from sqlalchemy import create_engine
-
-        engine = create_engine("sqlite:///" + db)
+        engine = create_sqlite_engine(db)
         Base.metadata.create_all(engine)
         Session = sessionmaker(bind=engine)
         self.session = Session()
@@ -95,3 +96,28 @@ class DataResourcePool:
             self.session.rollback()
             raise ex
         return pk
+
+    def insert_many(self, resources: List[dict]) -> int:
+        """
+        Insert data resources in a single transaction
+
+        :param resources: List of dictionaries keyed by the arguments of
+            insert
+        :return:
+            Count of inserted resources
+        """
+        rows = [
+            {
+                "pid": r["pid"],
+                "owner": r["owner"],
+                "entity_id": r["entity_id"],
+                "entity_name": r["entity_name"],
+                "md5": r["md5"],
+                "sha1": r["sha1"],
+                "size": r["size"],
+                "date_created": r["date_created"],
+                "date_deactivated": r.get("date_deactivated"),
+            }
+            for r in resources
+        ]
+        return insert_or_ignore(self.session, DataResource, rows)
@@ -14,7 +14,7 @@
 """
 from datetime import datetime
 from dateutil import tz
-from typing import Type
+from typing import Iterator, List, Set, Tuple, Type
 
 import daiquiri
 from sqlalchemy import (
@@ -27,6 +27,7 @@ from sqlalchemy import (
     desc,
     asc,
     update,
+    UniqueConstraint,
 )
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
@@ -36,20 +37,50 @@ from sqlalchemy.orm.query import Query
 from sqlalchemy.sql import not_
 
 from sniffer.config import Config
+from sniffer.model.bulk import insert_or_ignore
+from sniffer.model.engine import create_sqlite_engine
+from sniffer.model.migrate import upgrade
 
 logger = daiquiri.getLogger(__name__)
 Base = declarative_base()
 MTN_TZ = tz.gettz("America/Denver")
 
+DATA = "data"
+METADATA = "metadata"
+
+SQL_KIND = (
+    "UPDATE <TABLE> SET kind = CASE "
+    "WHEN rid LIKE '%/data/eml/%' THEN 'data' "
+    "WHEN rid LIKE '%/metadata/eml/%' THEN 'metadata' END "
+    "WHERE kind IS NULL"
+)
+
+
+def days_since(dt: datetime) -> int:
+    dt_then = dt.astimezone(tz=MTN_TZ)
+    dt_now = datetime.now(tz=MTN_TZ)
+    return (dt_now - dt_then).days
+
+
+def resource_kind(rid: str) -> str:
+    if "/data/eml/" in rid:
+        kind = DATA
+    elif "/metadata/eml/" in rid:
+        kind = METADATA
+    else:
+        kind = None
+    return kind
+
 
 class Resource(Base):
     __tablename__ = "resources"
 
     id = Column(Integer(), primary_key=True)
     rid = Column(String(), unique=True)
-    pid = Column(String(), nullable=False)
+    pid = Column(String(), nullable=False, index=True)
     type = Column(Integer(), nullable=False)
     auth = Column(Boolean(), nullable=False)
+    kind = Column(String(), nullable=True, index=True)
 
 
 class Ephemeral(Base):
@@ -66,20 +97,43 @@ class Newest(Base):
     __tablename__ = "newest"
     id = Column(Integer(), primary_key=True)
     rid = Column(String(), unique=True)
-    pid = Column(String(), nullable=False)
+    pid = Column(String(), nullable=False, index=True)
     type = Column(Integer(), nullable=False)
     auth = Column(Boolean(), nullable=False)
+    kind = Column(String(), nullable=True, index=True)
+
+
+class DirtySeries(Base):
+    # Package series with resources persisted since the newest table was
+    # last updated
+    __tablename__ = "dirty_series"
+    __table_args__ = (UniqueConstraint("scope", "identifier"),)
+    id = Column(Integer(), primary_key=True)
+    scope = Column(String(), nullable=False)
+    identifier = Column(String(), nullable=False)
 
 
 class EmbargoDB:
     def __init__(self, db: str):
-        from sqlalchemy import create_engine
-
-        engine = create_engine("sqlite:///" + db)
+        engine = create_sqlite_engine(db)
         Base.metadata.create_all(engine)
+        # Resources of databases predating the kind column are classified
+        # once, when the column is added
+        backfills = {
+            f"{table}.kind": SQL_KIND.replace("<TABLE>", table)
+            for table in (Resource.__tablename__, Newest.__tablename__)
+        }
+        upgrade(engine, Base.metadata, backfills=backfills)
         Session = sessionmaker(bind=engine)
         self.session = Session()
 
+    def _iter(self, q: Query) -> Iterator:
+        # Detach each row once the caller has moved on so that the identity
+        # map does not grow with the number of rows
+        for e in q:
+            yield e
+            self.session.expunge(e)
+
     def delete_all(self):
         try:
             e = self.session.query(Resource).delete()
@@ -98,13 +152,19 @@ class EmbargoDB:
             logger.error(ex)
         return e
 
+    def iter_all(self, batch_size: int = 1000) -> Iterator:
+        q = (
+            self.session.query(Resource)
+            .order_by(Resource.pid)
+            .yield_per(batch_size)
+        )
+        yield from self._iter(q)
+
     def get_all_data(self):
         try:
             e = (
                 self.session.query(Resource)
-                .filter(
-                    Resource.rid.like("%/data/eml/%"),
-                )
+                .filter(Resource.kind == DATA)
                 .order_by(Resource.pid)
                 .all()
             )
@@ -116,7 +176,7 @@ class EmbargoDB:
         try:
              e = (
                 self.session.query(Resource)
-                .filter(Resource.rid.like("%/metadata/eml/%"))
+                .filter(Resource.kind == METADATA)
                 .order_by(Resource.pid)
                 .all()
             )
@@ -162,6 +222,23 @@ class EmbargoDB:
             logger.error(ex)
         return e
 
+    def iter_by_pid(self, pid: str, batch_size: int = 1000) -> Iterator:
+        q = (
+            self.session.query(Resource)
+            .filter(Resource.pid == pid)
+            .yield_per(batch_size)
+        )
+        yield from self._iter(q)
+
+    def get_all_rids(self) -> Set:
+        rids = set()
+        try:
+            for rid in self.session.query(Resource.rid):
+                rids.add(rid[0])
+        except NoResultFound as ex:
+            logger.error(ex)
+        return rids
+
     def get_by_rid(self, rid: str) -> Query:
         try:
             e = (
@@ -185,7 +262,9 @@ class EmbargoDB:
         return e
 
     def insert(self, rid: str, pid: str, type: int, auth: bool) -> int:
-        e = Resource(rid=rid, pid=pid, type=type, auth=auth)
+        e = Resource(
+            rid=rid, pid=pid, type=type, auth=auth, kind=resource_kind(rid)
+        )
         try:
             self.session.add(e)
             self.session.commit()
@@ -196,6 +275,47 @@ class EmbargoDB:
             raise ex
         return pk
 
+    def insert_many(self, resources: List[Tuple], commit: bool = True) -> int:
+        """
+        Insert embargoed resources in a single transaction; resources that
+        already exist are ignored.
+
+        :param resources: List of (rid, pid, type, auth) tuples
+        :param commit: Commit the transaction
+        :return:
+            Count of inserted resources
+        """
+        rows = [
+            {
+                "rid": rid,
+                "pid": pid,
+                "type": type,
+                "auth": auth,
+                "kind": resource_kind(rid),
+            }
+            for rid, pid, type, auth in resources
+        ]
+        return insert_or_ignore(self.session, Resource, rows, commit=commit)
+
+    def delete_pids(self, pids: List[str], commit: bool = True) -> int:
+        """
+        Delete the embargoed resources of packages, so that packages that
+        are sniffed again are classified afresh.
+
+        :param pids: List of package identifiers
+        :param commit: Commit the transaction
+        :return:
+            Count of deleted resources
+        """
+        c = (
+            self.session.query(Resource)
+            .filter(Resource.pid.in_(pids))
+            .delete(synchronize_session=False)
+        )
+        if commit:
+            self.session.commit()
+        return c
+
     def delete_all_ephemeral(self):
         try:
             e = self.session.query(Ephemeral).delete()
@@ -215,9 +335,7 @@ class EmbargoDB:
         return e
 
     def insert_ephemeral(self, rid: str, pid: str, dt: datetime) -> int:
-        dt_then = dt.astimezone(tz=MTN_TZ)
-        dt_now = datetime.now(tz=MTN_TZ)
-        days = (dt_now - dt_then).days
+        days = days_since(dt)
         e = Ephemeral(rid=rid, pid=pid, date_ephemeral=dt, days_ephemeral=days)
         try:
             self.session.add(e)
@@ -229,6 +347,26 @@ class EmbargoDB:
             raise ex
         return pk
 
+    def insert_ephemeral_many(self, ephemerals: List[Tuple]) -> int:
+        """
+        Insert ephemeral resources in a single transaction; resources that
+        already exist are ignored.
+
+        :param ephemerals: List of (rid, pid, dt) tuples
+        :return:
+            Count of inserted resources
+        """
+        rows = [
+            {
+                "rid": rid,
+                "pid": pid,
+                "date_ephemeral": dt,
+                "days_ephemeral": days_since(dt),
+            }
+            for rid, pid, dt in ephemerals
+        ]
+        return insert_or_ignore(self.session, Ephemeral, rows)
+
     def delete_all_newest(self):
         try:
             e = self.session.query(Newest).delete()
@@ -247,13 +385,19 @@ class EmbargoDB:
             logger.error(ex)
         return e
 
+    def iter_all_newest(self, batch_size: int = 1000) -> Iterator:
+        q = (
+            self.session.query(Newest)
+            .order_by(Newest.pid)
+            .yield_per(batch_size)
+        )
+        yield from self._iter(q)
+
     def get_all_newest_data(self):
         try:
             e = (
                 self.session.query(Newest)
-                .filter(
-                    Newest.rid.like("%/data/eml/%"),
-                )
+                .filter(Newest.kind == DATA)
                 .order_by(Newest.pid)
                 .all()
             )
@@ -265,7 +409,7 @@ class EmbargoDB:
         try:
              e = (
                 self.session.query(Newest)
-                .filter(Newest.rid.like("%/metadata/eml/%"))
+                .filter(Newest.kind == METADATA)
                 .order_by(Newest.pid)
                 .all()
             )
@@ -282,7 +426,9 @@ class EmbargoDB:
         return c
 
     def insert_newest(self, rid: str, pid: str, type: int, auth: bool) -> int:
-        e = Newest(rid=rid, pid=pid, type=type, auth=auth)
+        e = Newest(
+            rid=rid, pid=pid, type=type, auth=auth, kind=resource_kind(rid)
+        )
         try:
             self.session.add(e)
             self.session.commit()
@@ -292,3 +438,104 @@ class EmbargoDB:
             self.session.rollback()
             raise ex
         return pk
+
+    def insert_newest_many(self, resources: List[Tuple]) -> int:
+        """
+        Insert newest embargoed resources in a single transaction; resources
+        that already exist are ignored.
+
+        :param resources: List of (rid, pid, type, auth) tuples
+        :return:
+            Count of inserted resources
+        """
+        rows = [
+            {
+                "rid": rid,
+                "pid": pid,
+                "type": type,
+                "auth": auth,
+                "kind": resource_kind(rid),
+            }
+            for rid, pid, type, auth in resources
+        ]
+        return insert_or_ignore(self.session, Newest, rows)
+
+    def insert_dirty_series(self, series: Set, commit: bool = True) -> int:
+        """
+        Mark package series whose newest embargoed resources must be
+        recomputed; series that are already marked are ignored.
+
+        :param series: Set of (scope, identifier) tuples
+        :param commit: Commit the transaction
+        :return:
+            Count of newly marked series
+        """
+        rows = [
+            {"scope": scope, "identifier": identifier}
+            for scope, identifier in series
+        ]
+        return insert_or_ignore(self.session, DirtySeries, rows, commit=commit)
+
+    def get_dirty_series(self) -> Set:
+        series = set()
+        try:
+            for scope, identifier in self.session.query(
+                DirtySeries.scope, DirtySeries.identifier
+            ):
+                series.add((scope, identifier))
+        except NoResultFound as ex:
+            logger.error(ex)
+        return series
+
+    def update_newest(self, newest: Set, series: Set = None) -> int:
+        """
+        Replace the newest embargoed resources of the given package series
+        with the embargoed resources of their newest revisions in a single
+        transaction, which also clears the series' dirty marks. If series is
+        None, the whole newest table is rebuilt.
+
+        :param newest: Package identifiers of newest revisions
+        :param series: Set of (scope, identifier) tuples of package series
+        :return:
+            Count of inserted resources
+        """
+        rows = list()
+        try:
+            if series is None:
+                self.session.query(Newest).delete()
+                self.session.query(DirtySeries).delete()
+            else:
+                for scope, identifier in series:
+                    # All revisions of a series share the "scope.identifier."
+                    # prefix, which is matched as an (indexed) range
+                    prefix = f"{scope}.{identifier}."
+                    self.session.query(Newest).filter(
+                        Newest.pid >= prefix,
+                        Newest.pid < prefix[:-1] + "/",
+                    ).delete(synchronize_session=False)
+                    self.session.query(DirtySeries).filter(
+                        DirtySeries.scope == scope,
+                        DirtySeries.identifier == identifier,
+                    ).delete(synchronize_session=False)
+            newest = sorted(newest)
+            for i in range(0, len(newest), 500):
+                resources = self.session.query(Resource).filter(
+                    Resource.pid.in_(newest[i:i + 500])
+                )
+                for resource in resources:
+                    rows.append(
+                        {
+                            "rid": resource.rid,
+                            "pid": resource.pid,
+                            "type": resource.type,
+                            "auth": resource.auth,
+                            "kind": resource.kind,
+                        }
+                    )
+            insert_or_ignore(self.session, Newest, rows, commit=False)
+            self.session.commit()
+        except IntegrityError as ex:
+            logger.error(ex)
+            self.session.rollback()
+            raise ex
+        return len(rows)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: engine
+
+:Synopsis:
+    Engine factory for the local SQLite databases.
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+import daiquiri
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+
+from sniffer.config import Config
+
+logger = daiquiri.getLogger(__name__)
+
+
+def create_sqlite_engine(
+    db: str, pragmas: dict = None, connect_args: dict = None
+) -> Engine:
+    """
+    Create an engine for a local SQLite database that applies a pragma
+    profile to every new connection. The default profile (SQLITE_PRAGMAS)
+    enables write-ahead logging so that readers do not block the writer.
+
+    :param db: Path to the SQLite database file
+    :param pragmas: Pragma name to value mapping
+    :param connect_args: Additional sqlite3.connect arguments
+    :return:
+        SQLAlchemy engine
+    """
+    if pragmas is None:
+        pragmas = Config.SQLITE_PRAGMAS
+    if connect_args is None:
+        connect_args = dict()
+    engine = create_engine("sqlite:///" + db, connect_args=connect_args)
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return engine
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: migrate
+
+:Synopsis:
+    Bring existing local SQLite databases up to date with the declared
+    schema.
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+from typing import Dict, List
+
+import daiquiri
+from sqlalchemy import MetaData, inspect, text
+from sqlalchemy.engine import Engine
+
+logger = daiquiri.getLogger(__name__)
+
+
+def upgrade(
+    engine: Engine, metadata: MetaData, backfills: Dict[str, str] = None
+) -> List[str]:
+    """
+    Add columns and indexes that are declared in metadata but missing from
+    the tables of an existing database. Safe to run on every start up since
+    only missing objects are created.
+
+    :param engine: Engine bound to the database
+    :param metadata: Declarative metadata describing the schema
+    :param backfills: "table.column" to SQL statement filling the column of
+        existing rows; run in the same transaction, only when the column is
+        added
+    :return:
+        List of added columns as "table.column" strings
+    """
+    if backfills is None:
+        backfills = dict()
+    added = list()
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            columns = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in columns:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.execute(
+                        text(
+                            f"ALTER TABLE {table.name} ADD COLUMN "
+                            f"{column.name} {column_type}"
+                        )
+                    )
+                    name = f"{table.name}.{column.name}"
+                    added.append(name)
+                    msg = f"Added column {name}"
+                    logger.info(msg)
+                    if name in backfills:
+                        connection.execute(text(backfills[name]))
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+    return added
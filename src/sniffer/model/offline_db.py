@@ -13,6 +13,7 @@
     7/28/20
 """
 from datetime import datetime
+from typing import Iterator, List, Tuple
 
 import daiquiri
 from sqlalchemy import (
@@ -33,6 +34,9 @@ from sqlalchemy.orm.query import Query
 from sqlalchemy.sql import not_
 
 from sniffer.config import Config
+from sniffer.model.bulk import insert_or_ignore
+from sniffer.model.engine import create_sqlite_engine
+from sniffer.model.migrate import upgrade
 
 logger = daiquiri.getLogger(__name__)
 Base = declarative_base()
@@ -42,17 +46,16 @@ class OfflineResource(Base):
     __tablename__ = "offline_resources"
 
     id = Column(Integer(), primary_key=True)
-    pid = Column(String(), nullable=False)
+    pid = Column(String(), nullable=False, index=True)
     object_name = Column(String(), nullable=False)
     medium = Column(String(), nullable=False)
 
 
 class OfflineDB:
     def __init__(self, db: str):
-        from sqlalchemy import create_engine
-
-        engine = create_engine("sqlite:///" + db)
+        engine = create_sqlite_engine(db)
         Base.metadata.create_all(engine)
+        upgrade(engine, Base.metadata)
         Session = sessionmaker(bind=engine)
         self.session = Session()
 
@@ -67,6 +70,16 @@ class OfflineDB:
             logger.error(ex)
         return o
 
+    def iter_all(self, batch_size: int = 1000) -> Iterator:
+        q = (
+            self.session.query(OfflineResource)
+            .order_by(OfflineResource.pid)
+            .yield_per(batch_size)
+        )
+        for o in q:
+            yield o
+            self.session.expunge(o)
+
     def get_by_id(self, id: int) -> Query:
         o = None
         try:
@@ -102,3 +115,39 @@ class OfflineDB:
             self.session.rollback()
             raise ex
         return pk
+
+    def insert_many(self, resources: List[Tuple], commit: bool = True) -> int:
+        """
+        Insert offline resources in a single transaction
+
+        :param resources: List of (pid, object_name, medium) tuples
+        :param commit: Commit the transaction
+        :return:
+            Count of inserted resources
+        """
+        rows = [
+            {"pid": pid, "object_name": object_name, "medium": medium}
+            for pid, object_name, medium in resources
+        ]
+        return insert_or_ignore(
+            self.session, OfflineResource, rows, commit=commit
+        )
+
+    def delete_pids(self, pids: List[str], commit: bool = True) -> int:
+        """
+        Delete the offline resources of packages, so that packages that are
+        sniffed again replace rather than duplicate their resources.
+
+        :param pids: List of package identifiers
+        :param commit: Commit the transaction
+        :return:
+            Count of deleted resources
+        """
+        c = (
+            self.session.query(OfflineResource)
+            .filter(OfflineResource.pid.in_(pids))
+            .delete(synchronize_session=False)
+        )
+        if commit:
+            self.session.commit()
+        return c
@@ -13,12 +13,16 @@
     7/28/20
 """
 from datetime import datetime
+from typing import Iterator, List, Tuple
 
 import daiquiri
 from sqlalchemy import (
     Column,
     String,
     DateTime,
+    Index,
+    and_,
+    or_,
 )
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
@@ -26,6 +30,10 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.orm.query import Query
 
+from sniffer.model.bulk import insert_or_ignore
+from sniffer.model.engine import create_sqlite_engine
+from sniffer.model.migrate import upgrade
+
 logger = daiquiri.getLogger(__name__)
 Base = declarative_base()
 
@@ -38,13 +46,16 @@ class Package(Base):
     date_deactivated = Column(DateTime(), nullable=True)
     doi = Column(String(), nullable=True)
 
+    __table_args__ = (
+        Index("ix_packages_date_created_pid", "date_created", "pid"),
+    )
+
 
 class PackageDB:
     def __init__(self, db: str):
-        from sqlalchemy import create_engine
-
-        engine = create_engine("sqlite:///" + db)
+        engine = create_sqlite_engine(db)
         Base.metadata.create_all(engine)
+        upgrade(engine, Base.metadata)
         Session = sessionmaker(bind=engine)
         self.session = Session()
 
@@ -67,6 +78,45 @@ class PackageDB:
             logger.error(ex)
         return p
 
+    def iter_all(
+        self,
+        from_date: datetime = None,
+        batch_size: int = 1000,
+        from_pid: str = None,
+    ) -> Iterator:
+        """
+        Iterate over packages in (date created, pid) order, loading
+        batch_size rows at a time and detaching each row from the session
+        once the caller has moved on to the next, so memory use does not
+        grow with the number of packages.
+
+        :param from_date: Only include packages created after this date
+        :param batch_size: Number of rows loaded per batch
+        :param from_pid: With from_date, also include packages created on
+            from_date whose pid sorts after from_pid (keyset cursor)
+        :return:
+            Iterator of packages
+        """
+        q = self.session.query(Package)
+        if from_date is not None and from_pid is not None:
+            q = q.filter(
+                or_(
+                    Package.date_created > from_date,
+                    and_(
+                        Package.date_created == from_date,
+                        Package.pid > from_pid,
+                    ),
+                )
+            )
+        elif from_date is not None:
+            q = q.filter(Package.date_created > from_date)
+        q = q.order_by(
+            Package.date_created.asc(), Package.pid.asc()
+        ).yield_per(batch_size)
+        for p in q:
+            yield p
+            self.session.expunge(p)
+
     def get_count(self) -> int:
         c = 0
         try:
@@ -89,6 +139,28 @@ class PackageDB:
             logger.error(ex)
         return d
 
+    def get_most_recent_keyset(self) -> Tuple:
+        """
+        Return the (date_created, pid) keyset of the most recently created
+        package, or None if there are no packages. Pids are ordered by byte
+        (BINARY), as is the registry query resuming from the keyset.
+        """
+        k = None
+        try:
+            p = (
+                self.session.query(Package.date_created, Package.pid)
+                .order_by(
+                    Package.date_created.desc(),
+                    Package.pid.collate("BINARY").desc(),
+                )
+                .first()
+            )
+            if p is not None:
+                k = (p.date_created, p.pid)
+        except NoResultFound as ex:
+            logger.error(ex)
+        return k
+
     def get(self, pid: str) -> Query:
         p = None
         try:
@@ -120,3 +192,24 @@ class PackageDB:
             raise ex
 
         return pk
+
+    def insert_many(self, packages: List[Tuple]) -> int:
+        """
+        Insert packages in a single transaction; packages that already exist
+        are ignored.
+
+        :param packages: List of (pid, date_created, date_deactivated, doi)
+            tuples
+        :return:
+            Count of inserted packages
+        """
+        rows = [
+            {
+                "pid": pid,
+                "date_created": date_created,
+                "date_deactivated": date_deactivated,
+                "doi": doi,
+            }
+            for pid, date_created, date_deactivated, doi in packages
+        ]
+        return insert_or_ignore(self.session, Package, rows)
@@ -12,37 +12,128 @@
 :Created:
     5/12/20
 """
+import threading
+import time
+from typing import Callable, Iterator
 import urllib
 
 import daiquiri
-from sqlalchemy import create_engine
-from sqlalchemy.engine import ResultProxy
+from sqlalchemy import bindparam, create_engine, text
+from sqlalchemy.engine import Engine, ResultProxy
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm.exc import NoResultFound
 
 from sniffer.config import Config
+from sniffer import metrics
 
 
 logger = daiquiri.getLogger(__name__)
 
+_engine = None
+_engine_factory = None
+_engine_lock = threading.Lock()
 
-def query(sql: str):
+
+def get_engine() -> Engine:
+    """
+    Return the shared PASTA+ database engine, creating it on first use. The
+    engine maintains a pool of connections that is reused across queries.
+    It is created by the installed engine factory, if any (see
+    set_engine_factory), else from the DB_* settings.
+
+    :return:
+        SQLAlchemy engine
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None and _engine_factory is not None:
+            _engine = _engine_factory()
+        elif _engine is None:
+            db = (
+                Config.DB_DRIVER
+                + "://"
+                + Config.DB_USER
+                + ":"
+                + urllib.parse.quote_plus(Config.DB_PW)
+                + "@"
+                + Config.DB_HOST
+                + "/"
+                + Config.DB_DB
+            )
+            _engine = create_engine(
+                db,
+                pool_size=Config.DB_POOL_SIZE,
+                max_overflow=Config.DB_MAX_OVERFLOW,
+                pool_pre_ping=Config.DB_POOL_PRE_PING,
+                pool_recycle=Config.DB_POOL_RECYCLE,
+            )
+    return _engine
+
+
+def set_engine_factory(factory: Callable[[], Engine] = None):
+    """
+    Install a factory of the shared PASTA+ database engine in place of the
+    DB_* settings, e.g. the SQLite fake of the emulator (see
+    sniffer.emulator.emulate.configure). The current engine is disposed so
+    that the factory takes effect.
+
+    :param factory: Callable returning an engine; None restores the engine
+        of the DB_* settings
+    """
+    global _engine_factory
+    dispose()
+    with _engine_lock:
+        _engine_factory = factory
+
+
+def dispose():
+    """
+    Close all pooled connections of the shared PASTA+ database engine
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+
+
+def _statement(sql: str, params: dict):
+    # List, tuple and set values are bound as expanding parameters so that
+    # they can be used with "IN :name"
+    stmt = text(sql)
+    expanding = [
+        bindparam(name, expanding=True)
+        for name, value in params.items()
+        if isinstance(value, (list, tuple, set))
+    ]
+    if len(expanding) > 0:
+        stmt = stmt.bindparams(*expanding)
+        params = {
+            name: list(value) if isinstance(value, set) else value
+            for name, value in params.items()
+        }
+    return stmt, params
+
+
+def query(sql: str, params: dict = None):
+    """
+    Execute a query against the PASTA+ database.
+
+    :param sql: SQL statement with optional named (:name) bind parameters
+    :param params: Bind parameter values; list, tuple and set values may be
+        used with "IN :name"
+    :return:
+        List of result rows
+    """
     rs = None
-    db = (
-        Config.DB_DRIVER
-        + "://"
-        + Config.DB_USER
-        + ":"
-        + urllib.parse.quote_plus(Config.DB_PW)
-        + "@"
-        + Config.DB_HOST
-        + "/"
-        + Config.DB_DB
-    )
-    engine = create_engine(db)
+    if params is None:
+        params = dict()
+    stmt, params = _statement(sql, params)
     try:
-        with engine.connect() as connection:
-            rs = connection.execute(sql).fetchall()
+        with metrics.timer(metrics.REGISTRY_QUERY):
+            with get_engine().connect() as connection:
+                rs = connection.execute(stmt, params).fetchall()
+        metrics.inc(metrics.REGISTRY_ROWS, len(rs))
     except NoResultFound as e:
         logger.warning(e)
         rs = list()
@@ -50,3 +141,43 @@ def query(sql: str):
         logger.error(e)
         raise e
     return rs
+
+
+def stream(sql: str, params: dict = None, batch_size: int = 1000) -> Iterator:
+    """
+    Execute a query against the PASTA+ database using a server-side cursor,
+    yielding result rows in batches so that memory use is bounded by the
+    batch size rather than the size of the result.
+
+    :param sql: SQL statement with optional named (:name) bind parameters
+    :param params: Bind parameter values
+    :param batch_size: Number of rows fetched from the server per batch
+    :return:
+        Iterator of lists of result rows
+    """
+    if params is None:
+        params = dict()
+    stmt, params = _statement(sql, params)
+    # Only the time spent in the database is observed, not the time the
+    # caller spends on each batch
+    elapsed = 0.0
+    try:
+        with get_engine().connect() as connection:
+            start = time.perf_counter()
+            rs = connection.execution_options(
+                stream_results=True, max_row_buffer=batch_size
+            ).execute(stmt, params)
+            partitions = rs.partitions(batch_size)
+            while True:
+                partition = next(partitions, None)
+                elapsed += time.perf_counter() - start
+                if partition is None:
+                    break
+                metrics.inc(metrics.REGISTRY_ROWS, len(partition))
+                yield partition
+                start = time.perf_counter()
+    except Exception as e:
+        logger.error(e)
+        raise e
+    finally:
+        metrics.observe(metrics.REGISTRY_QUERY, elapsed)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: state_db
+
+:Synopsis:
+    Sniffer checkpoint store: a (date_created, pid) keyset cursor per
+    sniffer, kept in a sniffer_state table. The table may live in a sniffer's
+    own database, sharing its session, so that the cursor is committed in
+    the same transaction as the sniffer's results.
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+from datetime import datetime
+from typing import Tuple
+
+import daiquiri
+from sqlalchemy import Column, DateTime, String
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import Session, sessionmaker
+
+from sniffer.model.engine import create_sqlite_engine
+
+logger = daiquiri.getLogger(__name__)
+Base = declarative_base()
+
+
+class State(Base):
+    __tablename__ = "sniffer_state"
+
+    name = Column(String(), primary_key=True)
+    date_created = Column(DateTime(), nullable=False)
+    pid = Column(String(), nullable=False)
+    date_updated = Column(DateTime(), nullable=False)
+
+
+class StateDB:
+    def __init__(self, db: str = None, session: Session = None):
+        """
+        :param db: Path of a SQLite database holding the state table
+        :param session: Session of an existing database to add the state
+            table to; used instead of db
+        """
+        if session is None:
+            engine = create_sqlite_engine(db)
+            Session = sessionmaker(bind=engine)
+            session = Session()
+        Base.metadata.create_all(session.get_bind())
+        self.session = session
+
+    def get(self, name: str) -> Tuple:
+        """
+        :param name: Checkpoint name
+        :return:
+            (date_created, pid) cursor or None if the checkpoint is not set
+        """
+        s = self.session.get(State, name)
+        return None if s is None else (s.date_created, s.pid)
+
+    def set(
+        self, name: str, date_created: datetime, pid: str, commit: bool = True
+    ):
+        """
+        Move a checkpoint to the (date_created, pid) cursor.
+
+        :param name: Checkpoint name
+        :param date_created: Date created of the last processed package
+        :param pid: Identifier of the last processed package
+        :param commit: Commit the transaction; False leaves it open so that
+            the cursor commits together with the results it covers
+        """
+        self.session.merge(
+            State(
+                name=name,
+                date_created=date_created,
+                pid=pid,
+                date_updated=datetime.now(),
+            )
+        )
+        if commit:
+            self.commit()
+
+    def commit(self):
+        try:
+            self.session.commit()
+        except SQLAlchemyError as ex:
+            logger.error(ex)
+            self.session.rollback()
+            raise ex
+
+    def rollback(self):
+        self.session.rollback()
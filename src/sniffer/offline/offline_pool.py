@@ -12,22 +12,23 @@
 :Created:
     7/28/20
 """
+from typing import List, Union
+
 import daiquiri
 from lxml import etree
-import requests
 
+from sniffer.analyzer import Analyzer, Sniffer
 from sniffer.config import Config
-import sniffer.last_date as last_date
+from sniffer import eml as eml_parser
 from sniffer.model.offline_db import OfflineDB
-from sniffer.package.package_pool import PackagePool
+from sniffer.model.state_db import StateDB
 
 
 logger = daiquiri.getLogger(__name__)
 
 
-def offline_parse(eml: str):
+def offline_resources(tree: etree._Element) -> List:
     resources = list()
-    tree = etree.fromstring(eml.encode("utf-8"))
     phys = tree.findall("./dataset//physical")
     for phy in phys:
         distributions = phy.findall(".//distribution")
@@ -40,53 +41,69 @@ def offline_parse(eml: str):
     return resources
 
 
-class OfflinePool:
-    def __init__(self):
+def offline_parse(eml: Union[bytes, str]) -> List:
+    return offline_resources(eml_parser.skeleton(eml))
+
+
+class OfflineSniffer(Sniffer):
+    name = "offline"
+    checkpoint = "offline"
+    streaming = True
+
+    def open(self):
         db_path = Config.PATH + Config.OFFLINE_DB
         self._o_db = OfflineDB(db_path)
-        self._package_pool = PackagePool()
-
-        dn = Config.DN
-        pw = Config.PASSWORD
-        r = requests.get(Config.PASTA_URL, auth=(dn, pw))
-        r.raise_for_status()
-        token = r.cookies["auth-token"]
-        self._cookies = {"auth-token": token}
-
-    def add_new_offline_resources(self) -> int:
-        offline_date_path = Config.PATH + Config.OFFLINE_DATE
-        from_date = last_date.read(offline_date_path)
-        packages = self._package_pool.get_all_packages(from_date=from_date)
-        count = 0
-        for package in packages:
-            pid = package.pid.strip()
-            scope, identifier, revision = pid.split(".")
-            if scope not in (
-                "ecotrends",
-                "lter-landsat",
-                "lter-landsat-ledaps",
-            ):
-                metadata_url = (
-                    Config.METADATA_URL.replace("<SCOPE>", scope)
-                    .replace("<IDENTIFIER>", identifier)
-                    .replace("<REVISION>", revision)
+
+    def open_state(self) -> StateDB:
+        return StateDB(session=self._o_db.session)
+
+    def analyze(self, pid: str, tree: etree._Element) -> List:
+        if tree is None:
+            return None
+        return offline_resources(tree)
+
+    def persist(self, results: List) -> int:
+        batch = list()
+        for pid, resources in results:
+            if resources is None:
+                logger.warning(f"Ignoring {pid}: metadata is not accessible")
+                continue
+            for resource in resources:
+                batch.append((pid, resource[0], resource[1]))
+                msg = (
+                    f"Adding offline resource: {pid}, "
+                    f"{resource[0]}, {resource[1]}"
                 )
-                r = requests.get(metadata_url, cookies=self._cookies)
-                if r.status_code == requests.codes.ok:
-                    logger.info(f"Parsing {pid}")
-                    resources = offline_parse(r.text)
-                    for resource in resources:
-                        self._o_db.insert(pid, resource[0], resource[1])
-                        msg = (
-                                f"Adding offline resource: {pid}, "
-                                f"{resource[0]}, {resource[1]}"
-                        )
-                        logger.info(msg)
-                        count += 1
-                else:
-                    logger.warn(
-                        f"Ignoring {pid}: status code is {r.status_code}"
-                    )
-                last_date.write(offline_date_path, package.date_created)
-
-        return count
+                logger.info(msg)
+        self._o_db.delete_pids([pid for pid, r in results], commit=False)
+        self._o_db.insert_many(batch, commit=False)
+        return len(batch)
+
+
+class OfflinePool:
+    def __init__(self):
+        self._sniffer = OfflineSniffer()
+
+    def add_new_offline_resources(
+        self,
+        workers: int = None,
+        processes: int = None,
+        backend: str = "threads",
+    ) -> int:
+        """
+        Add offline data resources to the Offline Database. Package metadata
+        is fetched concurrently by a bounded pool of worker threads, while
+        results and the offline checkpoint are written in (date created,
+        pid) order, one transaction per WRITE_BATCH packages.
+
+        :param workers: Number of concurrent metadata fetches
+        :param processes: Number of metadata analysis processes
+        :param backend: Metadata fetch backend, "threads" or "async"
+        :return:
+            Count of offline resources
+        """
+        analyzer = Analyzer([self._sniffer])
+        counts = analyzer.run(
+            workers=workers, processes=processes, backend=backend
+        )
+        return counts[self._sniffer.name]
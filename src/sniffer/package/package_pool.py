@@ -13,9 +13,9 @@
     5/23/20
 """
 from datetime import datetime
+import time
 
 import daiquiri
-from sqlalchemy.exc import IntegrityError
 
 from sniffer.config import Config
 from sniffer.model.package_db import PackageDB
@@ -23,13 +23,17 @@ from sniffer.model import pasta_data_package_manager_db
 
 logger = daiquiri.getLogger(__name__)
 
+# package_id is compared and ordered in the "C" (byte order) collation, the
+# order of pids in the package database that the keyset resumes from
 SQL_PACKAGES = ("SELECT datapackagemanager.resource_registry.package_id, "
                 "datapackagemanager.resource_registry.date_created, "
                 "datapackagemanager.resource_registry.date_deactivated, "
                 "datapackagemanager.resource_registry.doi "
                 "FROM datapackagemanager.resource_registry WHERE "
-                "resource_type='dataPackage' AND date_created > '<DATE>' "
-                "ORDER BY date_created ASC")
+                "resource_type='dataPackage' AND (date_created > :date OR "
+                "(date_created = :date AND "
+                "package_id COLLATE \"C\" > :pid)) "
+                "ORDER BY date_created ASC, package_id COLLATE \"C\" ASC")
 
 
 class PackagePool:
@@ -38,34 +42,68 @@ class PackagePool:
         self._p_db = PackageDB(db_path)
 
     def add_new_packages(self, limit: int = None) -> int:
-        d = self._p_db.get_most_recent_create_date()
-        if d is None:
-            iso = Config.START_DATE.isoformat()
-        else:
-            iso = d.isoformat()
-
+        date_created, pid = self._keyset()
         if limit is not None:
-            sql = SQL_PACKAGES.replace("<DATE>", iso) + " LIMIT " + str(limit)
+            sql = SQL_PACKAGES + " LIMIT :limit"
+            params = {"date": date_created, "pid": pid, "limit": limit}
         else:
-            sql = SQL_PACKAGES.replace("<DATE>", iso)
+            sql = SQL_PACKAGES
+            params = {"date": date_created, "pid": pid}
 
-        packages = pasta_data_package_manager_db.query(sql)
+        packages = pasta_data_package_manager_db.query(sql, params)
+        count = len(packages)
+        inserted = self._p_db.insert_many(packages)
+        logger.debug(f"Inserting packages: {inserted}")
+        if inserted < count:
+            msg = f"Ignoring {count - inserted} existing package(s)"
+            logger.warning(msg)
+
+        return count
+
+    def sync_packages(self, batch_size: int = 1000) -> int:
+        """
+        Add all new PASTA+ data packages to the Package Database in a single
+        pass. Packages are streamed from the resource registry with a
+        server-side cursor ordered by the (date_created, package_id) keyset
+        and written one batch per transaction, so memory use is bounded by
+        the batch size.
+
+        :param batch_size: Number of packages fetched and written per batch
+        :return:
+            Count of packages acquired
+        """
+        date_created, pid = self._keyset()
+        params = {"date": date_created, "pid": pid}
         count = 0
-        for package in packages:
-            count += 1
-            try:
-                self._p_db.insert(package[0], package[1], package[2],
-                                  package[3])
-                logger.debug(f"Inserting package: {package[0]}")
-            except IntegrityError as e:
-                msg = f"Ignoring package '{package[0]}"
+        start = time.perf_counter()
+        batches = pasta_data_package_manager_db.stream(
+            SQL_PACKAGES, params, batch_size=batch_size
+        )
+        for packages in batches:
+            inserted = self._p_db.insert_many(packages)
+            ignored = len(packages) - inserted
+            if ignored > 0:
+                msg = f"Ignoring {ignored} existing package(s)"
                 logger.warning(msg)
+            count += len(packages)
+            rate = count / (time.perf_counter() - start)
+            msg = f"Packages acquired: {count} ({rate:.1f} packages/s)"
+            logger.info(msg)
 
         return count
 
+    def _keyset(self) -> tuple:
+        keyset = self._p_db.get_most_recent_keyset()
+        if keyset is None:
+            keyset = (Config.START_DATE, "")
+        return keyset
+
     def get_all_packages(self, from_date: datetime = None):
         return self._p_db.get_all(from_date=from_date)
 
+    def iter_packages(self, from_date: datetime = None, from_pid: str = None):
+        return self._p_db.iter_all(from_date=from_date, from_pid=from_pid)
+
     @property
     def count(self):
         return self._p_db.get_count()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: pasta_async
+
+:Synopsis:
+    Asyncio PASTA+ client (httpx) for high fan-out metadata fetches, and an
+    executor that runs its coroutines on a background event loop so that it
+    can replace the fetch thread pool of the analyzer.
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+import asyncio
+from concurrent.futures import Executor, Future
+import threading
+import time
+from typing import Callable
+from urllib.parse import urlsplit
+
+import daiquiri
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from sniffer.config import Config
+from sniffer import metrics, tracing
+from sniffer.pasta_client import RETRY_STATUS
+from sniffer import rate_limit
+
+logger = daiquiri.getLogger(__name__)
+
+
+class AsyncPastaClient:
+    def __init__(self, concurrency: int):
+        """
+        Must be created within the event loop that uses it.
+
+        :param concurrency: Maximum number of requests in flight
+        """
+        connect, read = Config.HTTP_TIMEOUT
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=concurrency,
+                max_keepalive_connections=concurrency,
+            ),
+            timeout=httpx.Timeout(read, connect=connect),
+        )
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._token = None
+        self._token_time = None
+        self._token_lock = asyncio.Lock()
+
+    async def get(self, url: str, headers: dict = None):
+        """
+        GET a PASTA+ resource as the configured user, reusing the auth-token
+        cookie. Requests are paced by the host's shared rate limiter, and
+        429/5xx responses and transport errors are retried with exponential
+        backoff.
+
+        :param url: Resource URL
+        :param headers: Additional request headers
+        :return:
+            httpx.Response with its body read
+        """
+        headers = dict() if headers is None else dict(headers)
+        auth = None
+        token = await self.token()
+        if token is None:
+            auth = (Config.DN, Config.PASSWORD)
+        else:
+            headers["Cookie"] = f"auth-token={token}"
+        limiter = rate_limit.get_limiter(urlsplit(url).netloc)
+        for attempt in range(Config.HTTP_RETRIES + 1):
+            last = attempt == Config.HTTP_RETRIES
+            async with self._semaphore:
+                await limiter.acquire_async()
+                start = time.monotonic()
+                try:
+                    r = await self._get(url, headers, auth)
+                except httpx.TransportError as e:
+                    latency = time.monotonic() - start
+                    limiter.release(None, latency)
+                    metrics.observe(
+                        metrics.HTTP_REQUESTS, latency, status="error"
+                    )
+                    if last:
+                        raise ConnectionError(f"Error accessing {url}: {e}")
+                    r = None
+                else:
+                    latency = time.monotonic() - start
+                    limiter.release(
+                        r.status_code, latency, r.headers.get("Retry-After")
+                    )
+                    metrics.observe(
+                        metrics.HTTP_REQUESTS, latency, status=r.status_code
+                    )
+            if r is not None and (r.status_code not in RETRY_STATUS or last):
+                tracing.annotate(attempts=attempt + 1)
+                return r
+            logger.debug(f"Retrying {url}")
+            if r is None or r.status_code not in rate_limit.THROTTLE_STATUS:
+                # Throttling responses are backed off by the limiter
+                await asyncio.sleep(Config.HTTP_BACKOFF * 2 ** attempt)
+
+    async def token(self) -> str:
+        async with self._token_lock:
+            now = time.monotonic()
+            if (
+                self._token_time is None
+                or now - self._token_time > Config.PASTA_TOKEN_TTL
+            ):
+                self._token = await self._login()
+                self._token_time = now
+            return self._token
+
+    async def close(self):
+        await self._client.aclose()
+
+    async def _get(self, url: str, headers: dict, auth):
+        # Stream the body so the connection is released as soon as it has
+        # been read
+        async with self._client.stream(
+            "GET", url, headers=headers, auth=auth
+        ) as r:
+            await r.aread()
+        return r
+
+    async def _login(self) -> str:
+        try:
+            r = await self._client.get(
+                Config.PASTA_URL, auth=(Config.DN, Config.PASSWORD)
+            )
+        except httpx.HTTPError as e:
+            logger.warning(f"PASTA+ login failed: {e}")
+            return None
+        token = r.cookies.get("auth-token")
+        if token is None:
+            msg = (
+                "PASTA+ login returned no auth-token - response code: "
+                f"{r.status_code}; using basic authentication"
+            )
+            logger.warning(msg)
+        return token
+
+
+class AsyncFetcher(Executor):
+    """
+    Executor running coroutine functions on an event loop in a background
+    thread; submit returns a concurrent.futures.Future, so the fetcher can
+    be used with pipeline.ordered_map in place of a thread pool.
+    """
+
+    def __init__(self, concurrency: int = None):
+        """
+        :param concurrency: Maximum number of requests in flight; defaults to
+            ASYNC_CONCURRENCY
+        """
+        if httpx is None:
+            msg = "The async fetch backend requires httpx"
+            logger.error(msg)
+            raise ImportError(msg)
+        if concurrency is None:
+            concurrency = Config.ASYNC_CONCURRENCY
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="pasta-async", daemon=True
+        )
+        self._thread.start()
+        self.client = self._run(self._create_client(concurrency))
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        return asyncio.run_coroutine_threadsafe(
+            fn(*args, **kwargs), self._loop
+        )
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        if self._loop.is_closed():
+            return
+        self._run(self.client.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    @staticmethod
+    async def _create_client(concurrency: int):
+        return AsyncPastaClient(concurrency)
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: pasta_client
+
+:Synopsis:
+    Shared PASTA+ HTTP client: a pooled requests session that reuses TCP/TLS
+    connections and the PASTA+ auth-token cookie, and retries transient
+    failures with exponential backoff.
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+import threading
+import time
+from urllib.parse import urlsplit
+
+import daiquiri
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from sniffer.config import Config
+from sniffer import metrics, rate_limit, tracing
+
+logger = daiquiri.getLogger(__name__)
+
+RETRY_STATUS = (
+    requests.codes.too_many_requests,
+    requests.codes.internal_server_error,
+    requests.codes.bad_gateway,
+    requests.codes.service_unavailable,
+    requests.codes.gateway_timeout,
+)
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class PastaClient:
+    def __init__(self, pool_size: int = None):
+        """
+        :param pool_size: Number of pooled connections to PASTA+; defaults
+            to FETCH_WORKERS
+        """
+        self._session = requests.Session()
+        self._pool_size = 0
+        self.resize(Config.FETCH_WORKERS if pool_size is None else pool_size)
+        self._token = None
+        self._token_time = None
+        self._token_lock = threading.Lock()
+
+    def resize(self, pool_size: int):
+        """
+        Grow the connection pool to at least pool_size connections.
+
+        :param pool_size: Number of concurrent requests expected
+        """
+        if pool_size <= self._pool_size:
+            return
+        # Connection and read errors are retried by urllib3; retryable
+        # responses are retried by get so the rate limiter sees them
+        retry = Retry(
+            total=Config.HTTP_RETRIES,
+            backoff_factor=Config.HTTP_BACKOFF,
+            status=0,
+            allowed_methods=("GET", "HEAD"),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, max_retries=retry
+        )
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._pool_size = pool_size
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """
+        GET a PASTA+ resource as the configured user. The auth-token cookie
+        is obtained once and reused until it is older than PASTA_TOKEN_TTL;
+        Basic authentication is only used when no token can be obtained.
+        Requests are paced by the host's shared rate limiter and 429/5xx
+        responses are retried up to HTTP_RETRIES times.
+
+        :param url: Resource URL
+        :param kwargs: Keyword arguments passed to requests.Session.get
+        :return:
+            Response
+        """
+        kwargs.setdefault("timeout", Config.HTTP_TIMEOUT)
+        token = self.token()
+        if token is None:
+            kwargs.setdefault("auth", (Config.DN, Config.PASSWORD))
+        else:
+            kwargs.setdefault("cookies", {"auth-token": token})
+        limiter = rate_limit.get_limiter(urlsplit(url).netloc)
+        for attempt in range(Config.HTTP_RETRIES + 1):
+            limiter.acquire()
+            start = time.monotonic()
+            try:
+                r = self._session.get(url, **kwargs)
+            except requests.RequestException:
+                latency = time.monotonic() - start
+                limiter.release(None, latency)
+                metrics.observe(metrics.HTTP_REQUESTS, latency, status="error")
+                raise
+            latency = time.monotonic() - start
+            limiter.release(
+                r.status_code, latency, r.headers.get("Retry-After")
+            )
+            metrics.observe(
+                metrics.HTTP_REQUESTS, latency, status=r.status_code
+            )
+            if (
+                r.status_code not in RETRY_STATUS
+                or attempt == Config.HTTP_RETRIES
+            ):
+                break
+            logger.debug(f"Retrying {url} - response code: {r.status_code}")
+            if r.status_code not in rate_limit.THROTTLE_STATUS:
+                # Throttling responses are backed off by the limiter
+                time.sleep(Config.HTTP_BACKOFF * 2 ** attempt)
+        tracing.annotate(attempts=attempt + 1)
+        return r
+
+    def token(self) -> str:
+        with self._token_lock:
+            now = time.monotonic()
+            if (
+                self._token_time is None
+                or now - self._token_time > Config.PASTA_TOKEN_TTL
+            ):
+                self._token = self._login()
+                self._token_time = now
+            return self._token
+
+    def close(self):
+        self._session.close()
+
+    def _login(self) -> str:
+        try:
+            r = self._session.get(
+                Config.PASTA_URL,
+                auth=(Config.DN, Config.PASSWORD),
+                timeout=Config.HTTP_TIMEOUT,
+            )
+        except requests.RequestException as e:
+            logger.warning(f"PASTA+ login failed: {e}")
+            return None
+        token = r.cookies.get("auth-token")
+        if token is None:
+            msg = (
+                "PASTA+ login returned no auth-token - response code: "
+                f"{r.status_code}; using basic authentication"
+            )
+            logger.warning(msg)
+        return token
+
+
+def get_client() -> PastaClient:
+    """
+    Return the shared PASTA+ client, creating it on first use.
+
+    :return:
+        PastaClient
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = PastaClient()
+    return _client
+
+
+def close():
+    """
+    Close the shared PASTA+ client and its pooled connections.
+    """
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: pipeline
+
+:Synopsis:
+    Helpers for running I/O bound work concurrently while preserving the
+    order in which results are consumed.
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+from collections import deque
+from concurrent.futures import Executor
+from typing import Callable, Iterable, Iterator
+
+
+def ordered_map(
+    executor: Executor, fn: Callable, items: Iterable, window: int
+) -> Iterator:
+    """
+    Apply fn to each item using executor, yielding (item, result) pairs in
+    the same order as items. At most window calls are in flight at any time,
+    so memory stays bounded regardless of the number of items.
+
+    :param executor: Executor used to run fn
+    :param fn: Callable applied to each item
+    :param items: Iterable of items
+    :param window: Maximum number of outstanding calls
+    :return:
+        Iterator of (item, result) tuples in submission order
+    """
+    window = max(1, window)
+    pending = deque()
+    for item in items:
+        pending.append((item, executor.submit(fn, item)))
+        if len(pending) >= window:
+            item, future = pending.popleft()
+            yield item, future.result()
+    while pending:
+        item, future = pending.popleft()
+        yield item, future.result()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: profiling
+
+:Synopsis:
+    Opt-in profiling of sniff runs: the whole run or selected stages are
+    profiled with cProfile or a sampling profiler, with tracemalloc
+    snapshots taken around them. Analysis processes are profiled by an
+    initializer of their pool. Each profile is written as pstats (.prof) or
+    as folded stacks (.folded, the input of flamegraph.pl and speedscope).
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+import atexit
+from collections import Counter
+from contextlib import contextmanager
+import cProfile
+from datetime import datetime
+import io
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from typing import Iterator, Tuple
+
+import daiquiri
+
+from sniffer.config import Config
+
+logger = daiquiri.getLogger(__name__)
+
+PROFILERS = ("cprofile", "sampling")
+# "analyze" covers every selected sniffer, which share a single pass
+STAGES = ("run", "sync", "analyze")
+# Frames kept by tracemalloc per allocation
+TRACEMALLOC_FRAMES = 25
+# Entries listed in profile summaries and memory reports
+TOP = 50
+
+_settings = None
+# Profiler of the stage being profiled; stages nested in it are not
+# profiled again
+_current = None
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of all threads of this process at a fixed interval
+    and counts identical stacks, giving a low-overhead statistical profile
+    that, unlike cProfile, covers threads other than the profiled one.
+    """
+
+    def __init__(self, interval: float = None):
+        """
+        :param interval: Sampling interval in seconds; defaults to
+            PROFILE_INTERVAL
+        """
+        if interval is None:
+            interval = Config.PROFILE_INTERVAL
+        self._interval = interval
+        self._stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def enable(self):
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def disable(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def samples(self) -> int:
+        return sum(self._stacks.values())
+
+    def folded(self) -> str:
+        """
+        :return:
+            Folded stacks: one "thread;frame;...;frame count" line per
+            distinct stack, outermost frame first
+        """
+        return "".join(
+            f"{stack} {count}\n"
+            for stack, count in sorted(self._stacks.items())
+        )
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self._interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                frames = list()
+                while frame is not None:
+                    code = frame.f_code
+                    file_name = os.path.basename(code.co_filename)
+                    frames.append(
+                        f"{code.co_name} ({file_name}:{code.co_firstlineno})"
+                    )
+                    frame = frame.f_back
+                frames.append(names.get(ident, str(ident)))
+                self._stacks[";".join(reversed(frames))] += 1
+
+
+def configure(
+    profiler: str, stages: Tuple, directory: str, memory: bool = False
+):
+    """
+    Enable profiling of the named stages of this process.
+
+    :param profiler: "cprofile" or "sampling"
+    :param stages: Names of profiled stages; "run" profiles the whole run,
+        in which the other stages are not profiled separately
+    :param directory: Directory profiles are written to
+    :param memory: Take tracemalloc snapshots around profiled stages
+    """
+    global _settings
+    if profiler not in PROFILERS:
+        raise ValueError(f"Unknown profiler: {profiler}")
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if len(unknown) > 0:
+        raise ValueError(f"Unknown profile stages: {', '.join(unknown)}")
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    _settings = {
+        "profiler": profiler,
+        "stages": tuple(stages),
+        "prefix": os.path.join(directory, f"sniffer-{stamp}"),
+        "memory": memory,
+    }
+
+
+def disable():
+    global _settings
+    _settings = None
+
+
+def enabled(name: str) -> bool:
+    return _settings is not None and name in _settings["stages"]
+
+
+@contextmanager
+def stage(name: str) -> Iterator:
+    """
+    Profile a with block as the named stage if profiling of the stage is
+    enabled.
+
+    :param name: Stage name
+    """
+    global _current
+    if not enabled(name) or _current is not None:
+        yield
+        return
+    prefix = f"{_settings['prefix']}-{name}"
+    memory = _settings["memory"] and not tracemalloc.is_tracing()
+    if memory:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        before = tracemalloc.take_snapshot()
+    profiler = _create(_settings["profiler"])
+    _current = profiler
+    logger.info(f"Profiling {name} with {_settings['profiler']}")
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _current = None
+        _write(profiler, prefix)
+        if memory:
+            after = tracemalloc.take_snapshot()
+            size, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            _write_memory(before, after, peak, prefix + "-memory.txt")
+
+
+def initializer() -> Tuple:
+    """
+    Initializer of the analysis process pool and its arguments, profiling
+    each analysis process when the analyze stage (or the whole run) is
+    profiled.
+
+    :return:
+        (initializer, initargs) tuple; (None, ()) if not profiling
+    """
+    if not (enabled("analyze") or enabled("run")):
+        return None, ()
+    return _init_worker, (_settings, Config.PROFILE_INTERVAL)
+
+
+def _init_worker(settings: dict, interval: float):
+    # Runs in a spawned analysis process; the profile is written when the
+    # process exits
+    Config.PROFILE_INTERVAL = interval
+    prefix = f"{settings['prefix']}-analyze-worker-{os.getpid()}"
+    profiler = _create(settings["profiler"])
+    profiler.enable()
+
+    def write():
+        profiler.disable()
+        _write(profiler, prefix)
+
+    atexit.register(write)
+
+
+def _create(profiler: str):
+    if profiler == "sampling":
+        return SamplingProfiler()
+    return cProfile.Profile()
+
+
+def _write(profiler, prefix: str):
+    if isinstance(profiler, SamplingProfiler):
+        path = prefix + ".folded"
+        with open(path, "w") as f:
+            f.write(profiler.folded())
+        logger.info(f"Profile ({profiler.samples} samples) written to {path}")
+        return
+    path = prefix + ".prof"
+    profiler.dump_stats(path)
+    # A readable summary next to the pstats file
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP)
+    with open(prefix + ".txt", "w") as f:
+        f.write(out.getvalue())
+    logger.info(f"Profile written to {path}")
+
+
+def _write_memory(before, after, peak: int, path: str):
+    # Allocations of the profilers themselves are left out
+    filters = [
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, tracemalloc.__file__),
+    ]
+    before = before.filter_traces(filters)
+    after = after.filter_traces(filters)
+    lines = [f"Peak traced memory: {peak / 2 ** 20:.1f} MiB", ""]
+    lines.append(f"Top {TOP} allocation sites by growth:")
+    for stat in after.compare_to(before, "lineno")[:TOP]:
+        lines.append(str(stat))
+    lines.append("")
+    lines.append(f"Top {TOP} allocation sites at the end:")
+    for stat in after.statistics("lineno")[:TOP]:
+        lines.append(str(stat))
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    logger.info(f"Memory profile written to {path}")
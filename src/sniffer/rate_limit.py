@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: rate_limit
+
+:Synopsis:
+    Adaptive token-bucket rate limiter shared by all PASTA+ fetch paths. The
+    request rate grows additively while the server responds quickly, shrinks
+    multiplicatively when latency rises or the server answers 429/503, and
+    pauses all requests for an exponentially growing backoff period after
+    each throttling response.
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+import asyncio
+import threading
+import time
+from typing import Dict
+
+import daiquiri
+import requests
+
+from sniffer.config import Config
+
+logger = daiquiri.getLogger(__name__)
+
+THROTTLE_STATUS = (
+    requests.codes.too_many_requests,
+    requests.codes.service_unavailable,
+)
+
+# Longest wait between checks for a free concurrency slot
+POLL = 0.05
+# Longest backoff period in seconds
+MAX_BACKOFF = 60.0
+
+_limiters = dict()
+_limiters_lock = threading.Lock()
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        max_rate: float = None,
+        min_rate: float = None,
+        concurrency: int = None,
+        target_latency: float = None,
+    ):
+        """
+        :param max_rate: Ceiling of requests per second; defaults to
+            RATE_MAX
+        :param min_rate: Floor of requests per second; defaults to RATE_MIN
+        :param concurrency: Ceiling of requests in flight; defaults to
+            RATE_CONCURRENCY
+        :param target_latency: Response time in seconds above which the
+            rate is reduced; defaults to RATE_TARGET_LATENCY
+        """
+        self.max_rate = Config.RATE_MAX if max_rate is None else max_rate
+        self.min_rate = Config.RATE_MIN if min_rate is None else min_rate
+        self.concurrency = (
+            Config.RATE_CONCURRENCY if concurrency is None else concurrency
+        )
+        self.target_latency = (
+            Config.RATE_TARGET_LATENCY
+            if target_latency is None
+            else target_latency
+        )
+        self._lock = threading.Lock()
+        self._rate = self.max_rate
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._in_flight = 0
+        self._waiting = 0
+        self._backoff_until = 0.0
+        self._throttles = 0
+        self._latency = None
+        self._requests = 0
+        self._throttled = 0
+
+    def acquire(self):
+        """
+        Block until a request may be sent.
+        """
+        with self._lock:
+            self._waiting += 1
+        try:
+            while (wait := self._try_acquire()) > 0:
+                time.sleep(wait)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    async def acquire_async(self):
+        """
+        Wait, without blocking the event loop, until a request may be sent.
+        """
+        with self._lock:
+            self._waiting += 1
+        try:
+            while (wait := self._try_acquire()) > 0:
+                await asyncio.sleep(wait)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    def release(
+        self, status_code: int, latency: float, retry_after: str = None
+    ):
+        """
+        Record the outcome of a request acquired with acquire and adapt the
+        rate to it.
+
+        :param status_code: Response status code or None if the request
+            failed without a response
+        :param latency: Response time in seconds
+        :param retry_after: Retry-After response header
+        """
+        with self._lock:
+            self._in_flight -= 1
+            self._requests += 1
+            if self._latency is None:
+                self._latency = latency
+            else:
+                self._latency = 0.8 * self._latency + 0.2 * latency
+            now = time.monotonic()
+            if status_code in THROTTLE_STATUS:
+                self._throttled += 1
+                self._throttles += 1
+                self._rate = max(self.min_rate, self._rate / 2)
+                if retry_after is not None and retry_after.isdigit():
+                    backoff = float(retry_after)
+                else:
+                    backoff = Config.HTTP_BACKOFF * 2 ** (self._throttles - 1)
+                backoff = min(backoff, MAX_BACKOFF)
+                self._backoff_until = max(self._backoff_until, now + backoff)
+                msg = (
+                    f"PASTA+ throttled ({status_code}); backing off "
+                    f"{backoff:.1f}s at {self._rate:.1f} requests/s"
+                )
+                logger.warning(msg)
+            elif status_code is None or latency > self.target_latency:
+                self._rate = max(self.min_rate, self._rate * 0.9)
+            else:
+                self._throttles = 0
+                self._rate = min(self.max_rate, self._rate + 1.0 / self._rate)
+
+    def stats(self) -> Dict:
+        """
+        :return:
+            Dictionary of the current rate (requests/s), requests in flight
+            and waiting, remaining backoff (s), smoothed latency (s), and the
+            counts of completed and throttled requests
+        """
+        with self._lock:
+            backoff = max(0.0, self._backoff_until - time.monotonic())
+            return {
+                "rate": round(self._rate, 2),
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+                "backoff": round(backoff, 2),
+                "latency": (
+                    None if self._latency is None else round(self._latency, 3)
+                ),
+                "requests": self._requests,
+                "throttled": self._throttled,
+            }
+
+    def _try_acquire(self) -> float:
+        # Take a token and a concurrency slot, or return the time to wait
+        with self._lock:
+            now = time.monotonic()
+            if now < self._backoff_until:
+                return self._backoff_until - now
+            self._tokens = min(
+                1.0, self._tokens + (now - self._updated) * self._rate
+            )
+            self._updated = now
+            if self._in_flight >= self.concurrency:
+                return POLL
+            if self._tokens < 1.0:
+                return (1.0 - self._tokens) / self._rate
+            self._tokens -= 1.0
+            self._in_flight += 1
+            return 0.0
+
+
+def get_limiter(host: str) -> RateLimiter:
+    """
+    Return the rate limiter shared by all requests to host, creating it on
+    first use.
+
+    :param host: Network location of the server
+    :return:
+        RateLimiter
+    """
+    with _limiters_lock:
+        if host not in _limiters:
+            _limiters[host] = RateLimiter()
+        return _limiters[host]
+
+
+def stats() -> Dict:
+    """
+    :return:
+        Dictionary of host to rate limiter stats
+    """
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {host: limiter.stats() for host, limiter in limiters.items()}
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: registry
+
+:Synopsis:
+    Discovery of sniffer plugins. Sniffers are registered as entry points in
+    the "sniffer.sniffers" group, for example in pyproject.toml:
+
+        [project.entry-points."sniffer.sniffers"]
+        doi = "my_package.doi:DOISniffer"
+
+    where DOISniffer is a subclass of sniffer.analyzer.Sniffer.
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+from importlib.metadata import EntryPoint, entry_points
+from typing import Dict, List
+
+import daiquiri
+
+from sniffer.analyzer import Sniffer
+
+logger = daiquiri.getLogger(__name__)
+
+GROUP = "sniffer.sniffers"
+
+# Sniffers bundled with this package; available even when the package is
+# not installed and its entry points are therefore not registered
+BUILTIN = (
+    EntryPoint(
+        "offline", "sniffer.offline.offline_pool:OfflineSniffer", GROUP
+    ),
+    EntryPoint(
+        "embargo", "sniffer.embargo.embargo_pool:EmbargoSniffer", GROUP
+    ),
+)
+
+
+def available() -> Dict[str, EntryPoint]:
+    """
+    Return the registered sniffer entry points by sniffer name.
+    """
+    sniffers = {entry_point.name: entry_point for entry_point in BUILTIN}
+    for entry_point in entry_points(group=GROUP):
+        sniffers[entry_point.name] = entry_point
+    return sniffers
+
+
+def load(names: List[str]) -> List[Sniffer]:
+    """
+    Instantiate the named sniffers.
+
+    :param names: Sniffer names
+    :return:
+        List of sniffer instances in the order of names
+    """
+    sniffers = list()
+    registered = available()
+    for name in names:
+        if name not in registered:
+            msg = (
+                f"Unknown sniffer '{name}'; available sniffers are: "
+                f"{', '.join(sorted(registered))}"
+            )
+            raise ValueError(msg)
+        cls = registered[name].load()
+        if not (isinstance(cls, type) and issubclass(cls, Sniffer)):
+            raise TypeError(f"Sniffer '{name}' is not a Sniffer subclass")
+        if cls.name != name:
+            msg = f"Sniffer '{name}' is registered as '{cls.name}'"
+            raise ValueError(msg)
+        sniffers.append(cls())
+    return sniffers
@@ -12,17 +12,20 @@
 :Created:
     7/24/20
 """
+from datetime import datetime
 import logging
 import os
+import time
 
 import click
 import daiquiri
 
+from sniffer.analyzer import BACKENDS, Analyzer
 from sniffer.config import Config
-from sniffer.lock import Lock
-from sniffer.embargo.embargo_pool import EmbargoPool
-from sniffer.offline.offline_pool import OfflinePool
+from sniffer import lock, metrics, profiling, rate_limit
+from sniffer.model import pasta_data_package_manager_db
 from sniffer.package.package_pool import PackagePool
+from sniffer import pasta_client, registry
 
 
 cwd = os.path.dirname(os.path.realpath(__file__))
@@ -32,42 +35,244 @@ daiquiri.setup(
 )
 logger = daiquiri.getLogger(__name__)
 
-help_limit = "Query limit to PASTA+ resource registry."
+help_limit = (
+    "Number of packages streamed from the PASTA+ resource registry and "
+    "written to the package pool per transaction (default: 1000)."
+)
 help_offline = "Sniff for offline data resources."
 help_embargo = "Sniff for embargoed resources."
+help_sniffer = (
+    "Run the named sniffer (repeatable); available sniffers: "
+    f"{', '.join(sorted(registry.available()))}."
+)
+help_workers = (
+    "Number of concurrent PASTA+ metadata requests (default: "
+    f"{Config.FETCH_WORKERS} threads, {Config.ASYNC_CONCURRENCY} async)."
+)
+help_processes = "Number of processes used to analyze package metadata."
+help_backend = "PASTA+ metadata fetch backend; async requires httpx."
+help_rewind = "Move the checkpoints of the selected sniffers back to DATE."
+help_dry_run = "Analyze packages without writing results or checkpoints."
+help_profile = (
+    "Profile the named stage (repeatable): run (the whole run), sync "
+    "(package pool synchronization) or analyze (the analysis of all "
+    "selected sniffers, including analysis processes). Profiles are "
+    "written next to the log."
+)
+help_profiler = (
+    "Profiler: cprofile (.prof and .txt summary) or sampling (all threads, "
+    "folded stacks for flamegraphs)."
+)
+help_profile_memory = "Take tracemalloc snapshots around profiled stages."
+help_trace = (
+    "Append a trace of each package (fetch, parse and analysis spans) to "
+    "FILE as JSON lines; overrides TRACE_FILE."
+)
 CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
 
 
-@click.command(context_settings=CONTEXT_SETTINGS)
-@click.option("-l", "--limit", default=100, help=help_limit)
-@click.option("-o", "--offline", default=False, is_flag=True, help=help_offline)
-@click.option("-e", "--embargo", default=False, is_flag=True, help=help_embargo)
-def main(limit: int, offline: bool, embargo: bool):
-    lock = Lock(Config.LOCK_FILE)
-    if lock.locked:
-        logger.error("Lock file {} exists, exiting...".format(lock.lock_file))
-        return 1
-    else:
-        lock.acquire()
-        logger.info("Lock file {} acquired".format(lock.lock_file))
+def _acquire(scope_lock: lock.Lock) -> bool:
+    if scope_lock.acquire():
+        logger.info(f"Lock file {scope_lock.lock_file} acquired")
+        return True
+    msg = f"Lock file {scope_lock.lock_file} is held by: {scope_lock.holder}"
+    logger.error(msg)
+    return False
+
+
+def _release(locks):
+    for scope_lock in locks:
+        scope_lock.release()
+        logger.info(f"Lock file {scope_lock.lock_file} released")
+
+
+def _export(run: dict):
+    # Write the run's metrics; a failure to write them must not fail the run
+    metrics.set_gauge(metrics.RUN_DURATION, run["duration"])
+    metrics.set_gauge(metrics.RUN_TIMESTAMP, time.time())
+    metrics.set_gauge(metrics.RUN_SUCCESS, int(run["status"] == "success"))
+    if run["packages_synced"] is not None:
+        metrics.set_gauge(metrics.PACKAGES_SYNCED, run["packages_synced"])
+    if not run["dry_run"]:
+        for name, count in run["resources"].items():
+            metrics.set_gauge(metrics.RESOURCES, count, sniffer=name)
+    for host, stats in rate_limit.stats().items():
+        metrics.set_gauge(metrics.RATE_LIMIT, stats["rate"], host=host)
+    run["rate_limiters"] = rate_limit.stats()
+    try:
+        if Config.METRICS_TEXTFILE is not None:
+            path = os.path.join(Config.PATH, Config.METRICS_TEXTFILE)
+            metrics.write_textfile(path)
+        if Config.RUN_SUMMARY is not None:
+            path = os.path.join(Config.PATH, Config.RUN_SUMMARY)
+            metrics.write_summary(path, run)
+    except OSError as e:
+        logger.error(f"Failed to write run metrics: {e}")
+
 
+def _sniff(
+    run: dict,
+    sync: bool,
+    selected: list,
+    limit: int,
+    workers: int,
+    processes: int,
+    backend: str,
+    rewind: datetime,
+    dry_run: bool,
+):
     package_pool = PackagePool()
-    c = package_pool.add_new_packages(limit=limit)
-    logger.info(f"Packages acquired: {c}, Pool count: {package_pool.count}")
-    while c > 0:
-        c = package_pool.add_new_packages(limit=limit)
-        logger.info(f"Packages acquired: {c}, Pool count: {package_pool.count}")
+    if sync:
+        with profiling.stage("sync"):
+            c = package_pool.sync_packages(batch_size=limit)
+        run["packages_synced"] = c
+        msg = f"Packages acquired: {c}, Pool count: {package_pool.count}"
+        logger.info(msg)
+    elif dry_run:
+        logger.info("Dry run: package pool is not synchronized")
+    else:
+        logger.info("Package pool is being synchronized by another run")
 
-    if offline:
-        offline_pool = OfflinePool()
-        offline_pool.add_new_offline_resources()
+    # Selected sniffers share a single fetch and parse of each package
+    if len(selected) > 0:
+        analyzer = Analyzer(selected)
+        with profiling.stage("analyze"):
+            counts = analyzer.run(
+                workers=workers,
+                processes=processes,
+                backend=backend,
+                rewind=rewind,
+                dry_run=dry_run,
+            )
+        for name, count in counts.items():
+            logger.info(f"Resources found by {name} sniffer: {count}")
+        run["resources"] = counts
 
+
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.option("-l", "--limit", default=1000, help=help_limit)
+@click.option("-o", "--offline", default=False, is_flag=True, help=help_offline)
+@click.option("-e", "--embargo", default=False, is_flag=True, help=help_embargo)
+@click.option("-s", "--sniffer", "names", multiple=True, help=help_sniffer)
+@click.option("-w", "--workers", type=int, default=None, help=help_workers)
+@click.option(
+    "-p", "--processes", default=Config.PARSE_WORKERS, help=help_processes
+)
+@click.option(
+    "-b",
+    "--backend",
+    type=click.Choice(BACKENDS),
+    default="threads",
+    help=help_backend,
+)
+@click.option(
+    "-r",
+    "--rewind",
+    type=click.DateTime(),
+    default=None,
+    metavar="DATE",
+    help=help_rewind,
+)
+@click.option("-n", "--dry-run", default=False, is_flag=True, help=help_dry_run)
+@click.option(
+    "--profile",
+    "profile_stages",
+    multiple=True,
+    type=click.Choice(profiling.STAGES),
+    help=help_profile,
+)
+@click.option(
+    "--profiler",
+    type=click.Choice(profiling.PROFILERS),
+    default="cprofile",
+    help=help_profiler,
+)
+@click.option(
+    "--profile-memory", default=False, is_flag=True, help=help_profile_memory
+)
+@click.option("--trace", "trace_file", default=None, help=help_trace)
+def main(
+    limit: int,
+    offline: bool,
+    embargo: bool,
+    names: tuple,
+    workers: int,
+    processes: int,
+    backend: str,
+    rewind: datetime,
+    dry_run: bool,
+    profile_stages: tuple,
+    profiler: str,
+    profile_memory: bool,
+    trace_file: str,
+):
+    if trace_file is not None:
+        Config.TRACE_FILE = trace_file
+    if len(profile_stages) > 0:
+        profiling.configure(
+            profiler, profile_stages, cwd, memory=profile_memory
+        )
+    names = list(names)
+    if offline:
+        names.append("offline")
     if embargo:
-        embargo_pool = EmbargoPool()
-        embargo_pool.add_new_embargoed_resources()
+        names.append("embargo")
+    try:
+        sniffers = registry.load(list(dict.fromkeys(names)))
+    except (ValueError, TypeError) as e:
+        logger.error(e)
+        return 1
+
+    # Package pool synchronization and each sniffer checkpoint have their
+    # own lock, so runs of independent sniffers can overlap
+    locks = dict()
+    package_lock = lock.scoped(Config.LOCK_FILE, "package")
+    sync = not dry_run and _acquire(package_lock)
+    if sync:
+        locks["package"] = package_lock
+    selected = list()
+    for sniffer in sniffers:
+        scope = sniffer.checkpoint
+        if scope not in locks:
+            sniffer_lock = lock.scoped(Config.LOCK_FILE, scope)
+            if not _acquire(sniffer_lock):
+                continue
+            locks[scope] = sniffer_lock
+        selected.append(sniffer)
+    if len(sniffers) > 0 and len(selected) == 0:
+        _release(locks.values())
+        return 1
 
-    lock.release()
-    logger.info("Lock file {} released".format(lock.lock_file))
+    start = time.perf_counter()
+    run = {
+        "start": datetime.now(),
+        "status": "failure",
+        "dry_run": dry_run,
+        "sniffers": [sniffer.name for sniffer in selected],
+        "packages_synced": None,
+        "resources": dict(),
+    }
+    try:
+        with profiling.stage("run"):
+            _sniff(
+                run,
+                sync,
+                selected,
+                limit,
+                workers,
+                processes,
+                backend,
+                rewind,
+                dry_run,
+            )
+        run["status"] = "success"
+    finally:
+        run["end"] = datetime.now()
+        run["duration"] = time.perf_counter() - start
+        _export(run)
+        pasta_data_package_manager_db.dispose()
+        pasta_client.close()
+        _release(locks.values())
 
     return 0
 
@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: tracing
+
+:Synopsis:
+    OpenTelemetry-style tracing of the sniff pipeline: a trace per package,
+    with child spans for its metadata fetch, parse and analysis, and a trace
+    per persisted batch linked to the traces of its packages. Contexts are
+    passed explicitly to fetch threads and analysis processes, which ship
+    their finished spans back to the writer with each result (drain/merge).
+    The writer appends finished spans to TRACE_FILE as JSON lines.
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+from collections import namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterator, List
+
+import daiquiri
+
+from sniffer.config import Config
+
+logger = daiquiri.getLogger(__name__)
+
+# Identifies a span across threads and processes; picklable
+Context = namedtuple("Context", ["trace_id", "span_id"])
+
+# Span (or remote Context) that new spans of this thread or task are
+# children of
+_current = ContextVar("sniffer_span", default=None)
+
+_lock = threading.Lock()
+# Finished spans of this process not yet exported or drained
+_finished = list()
+
+
+class Span:
+    def __init__(
+        self,
+        name: str,
+        trace_id: str = None,
+        parent_id: str = None,
+        links: List[Context] = (),
+        **attributes,
+    ):
+        """
+        Start a span.
+
+        :param name: Span name
+        :param trace_id: Trace of the span; a new trace if None
+        :param parent_id: Span identifier of the parent span; None for the
+            root span of a trace
+        :param links: Contexts of related spans of other traces
+        :param attributes: Span attributes
+        """
+        self.name = name
+        self.context = Context(
+            trace_id or os.urandom(16).hex(), os.urandom(8).hex()
+        )
+        self.parent_id = parent_id
+        self.links = list(links)
+        self.attributes = attributes
+        self.status = "ok"
+        self._start_time = time.time()
+        self._start = time.perf_counter()
+        self._ended = False
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self, error: BaseException = None):
+        """
+        End the span and queue it for export; ending a span again has no
+        effect.
+
+        :param error: Exception that ended the span, if any
+        """
+        if self._ended:
+            return
+        self._ended = True
+        duration = time.perf_counter() - self._start
+        if error is not None:
+            self.status = "error"
+            self.attributes["error"] = f"{type(error).__name__}: {error}"
+        span = {
+            "trace_id": self.context.trace_id,
+            "span_id": self.context.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self._start_time,
+            "duration": duration,
+            "status": self.status,
+            "attributes": self.attributes,
+            "links": [link._asdict() for link in self.links],
+            "process": os.getpid(),
+            "thread": threading.current_thread().name,
+        }
+        with _lock:
+            _finished.append(span)
+
+
+def enabled() -> bool:
+    return Config.TRACE_FILE is not None
+
+
+def start_trace(name: str, links: List[Context] = (), **attributes) -> Span:
+    """
+    Start the root span of a new trace; it must be ended explicitly.
+
+    :param name: Span name
+    :param links: Contexts of related spans of other traces
+    :param attributes: Span attributes
+    :return:
+        Span, or None if tracing is disabled
+    """
+    if not enabled():
+        return None
+    return Span(name, links=links, **attributes)
+
+
+def context(span: Span = None) -> Context:
+    """
+    :param span: Span; the current span if None
+    :return:
+        Context of the span to pass to another thread or process, or None
+        if there is no span
+    """
+    if span is None:
+        span = _current.get()
+    if isinstance(span, Span):
+        return span.context
+    return span
+
+
+@contextmanager
+def use(parent) -> Iterator:
+    """
+    Make a span or context the parent of the spans started in a with block;
+    used to continue a trace in a fetch thread or an analysis process.
+
+    :param parent: Span, Context or None
+    """
+    token = _current.set(parent)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator:
+    """
+    Trace a with block as a child of the current span; nothing is recorded
+    outside of a trace.
+
+    :param name: Span name
+    :param attributes: Span attributes
+    :return:
+        Span, or None outside of a trace
+    """
+    parent = context()
+    if parent is None:
+        yield None
+        return
+    s = Span(name, parent.trace_id, parent.span_id, **attributes)
+    with _active(s):
+        yield s
+
+
+@contextmanager
+def trace(name: str, links: List[Context] = (), **attributes) -> Iterator:
+    """
+    Trace a with block as the root span of a new trace.
+
+    :param name: Span name
+    :param links: Contexts of related spans of other traces
+    :param attributes: Span attributes
+    :return:
+        Span, or None if tracing is disabled
+    """
+    s = start_trace(name, links=links, **attributes)
+    if s is None:
+        yield None
+        return
+    with _active(s):
+        yield s
+
+
+@contextmanager
+def _active(s: Span) -> Iterator:
+    # Make s the current span until the end of the with block, then end it
+    token = _current.set(s)
+    try:
+        yield
+    except BaseException as e:
+        s.end(error=e)
+        raise
+    finally:
+        _current.reset(token)
+        s.end()
+
+
+def annotate(**attributes):
+    """
+    Set attributes of the current span, if any.
+
+    :param attributes: Span attributes
+    """
+    s = _current.get()
+    if isinstance(s, Span):
+        s.set(**attributes)
+
+
+def drain() -> List[Dict]:
+    """
+    Take the finished spans of this process; used by analysis processes to
+    ship their spans with each result.
+
+    :return:
+        List of finished spans
+    """
+    global _finished
+    with _lock:
+        spans, _finished = _finished, list()
+    return spans
+
+
+def merge(spans: List[Dict]):
+    """
+    Add spans taken by drain in another process to the spans to export.
+
+    :param spans: Finished spans
+    """
+    with _lock:
+        _finished.extend(spans)
+
+
+def reset():
+    drain()
+
+
+def flush() -> int:
+    """
+    Append the finished spans of this process to TRACE_FILE (relative to
+    PATH unless absolute) as JSON lines.
+
+    :return:
+        Count of exported spans
+    """
+    spans = drain()
+    if not enabled() or len(spans) == 0:
+        return 0
+    path = os.path.join(Config.PATH, Config.TRACE_FILE)
+    lines = "".join(json.dumps(s, default=str) + "\n" for s in spans)
+    try:
+        with open(path, "a") as f:
+            f.write(lines)
+    except OSError as e:
+        logger.error(f"Failed to export spans to {path}: {e}")
+    return len(spans)
+
+
+def slowest(path: str, name: str = "package", top: int = 10) -> List[Dict]:
+    """
+    Find the slowest spans of a name in an exported trace file, e.g. the
+    slowest packages; their traces can then be looked up by trace_id.
+
+    :param path: Trace file
+    :param name: Span name
+    :param top: Number of spans returned
+    :return:
+        List of spans, slowest first
+    """
+    with open(path) as f:
+        spans = [s for s in map(json.loads, f) if s["name"] == name]
+    spans.sort(key=lambda s: s["duration"], reverse=True)
+    return spans[:top]
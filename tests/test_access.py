@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: test_access
+
+:Synopsis:
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+from lxml import etree
+
+from sniffer.embargo import access
+from sniffer.embargo.access import AccessRules
+
+
+def element(rules: str) -> etree._Element:
+    return etree.fromstring(f"<access>{rules}</access>")
+
+
+def test_evaluate_none():
+    assert access.evaluate(None) is access.NO_ACCESS
+
+
+def test_deny_public_read():
+    rules = access.evaluate(
+        element(
+            "<deny><principal>public</principal>"
+            "<permission> read </permission></deny>"
+        )
+    )
+    assert rules == AccessRules(deny_public_read=True)
+
+
+def test_allow_authenticated():
+    rules = access.evaluate(
+        element(
+            "<allow><principal>uid=x</principal>"
+            "<permission>all</permission></allow>"
+            "<allow><principal>authenticated</principal>"
+            "<permission>read</permission></allow>"
+        )
+    )
+    assert rules == AccessRules(allow_authenticated=True)
+
+
+def test_over_privileged():
+    rules = access.evaluate(
+        element(
+            "<allow><principal>public</principal>"
+            "<permission>write</permission></allow>"
+        )
+    )
+    assert rules == AccessRules(allow_public=True, over_privileged=True)
+
+
+def test_memoized():
+    block = (
+        "<allow><principal>public</principal>"
+        "<permission>read</permission></allow>"
+    )
+    assert access.evaluate(element(block)) is access.evaluate(element(block))
@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: test_analyzer
+
+:Synopsis:
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+from datetime import datetime, timedelta
+import json
+from pathlib import Path
+
+import pytest
+
+from sniffer.config import Config
+import sniffer.analyzer as analyzer
+from sniffer.analyzer import Analyzer, Sniffer
+import sniffer.last_date as last_date
+from sniffer import metrics, tracing
+from sniffer.model.package_db import PackageDB
+from sniffer.model.state_db import StateDB
+
+TEST_EML = '<eml:eml xmlns:eml="https://eml.ecoinformatics.org/eml-2.2.0" ' \
+           'packageId="<PID>"/>'
+Config.PATH = Config.TEST_PATH
+p_db_path = Config.PATH + Config.PACKAGE_DB
+offline_date_path = Config.PATH + Config.OFFLINE_DATE
+embargo_date_path = Config.PATH + Config.EMBARGO_DATE
+state_db_path = Config.PATH + Config.STATE_DB
+trace_path = Config.PATH + "traces.jsonl"
+
+
+class PackageIdSniffer(Sniffer):
+    name = "package_id"
+    checkpoint = "offline"
+
+    def open(self):
+        self.persisted = list()
+
+    def analyze(self, pid, tree):
+        return None if tree is None else tree.get("packageId")
+
+    def persist(self, results):
+        self.persisted += results
+        return len(results)
+
+
+class OtherSniffer(PackageIdSniffer):
+    name = "other"
+    checkpoint = "embargo"
+
+
+def fetch(pid):
+    if pid == "edi.3.1":
+        return 401, ""
+    return 200, TEST_EML.replace("<PID>", pid)
+
+
+@pytest.fixture()
+def p_db():
+    p_db = PackageDB(p_db_path)
+    packages = [
+        (f"edi.{i}.1", datetime(2020, 1, 1) + timedelta(days=i), None, None)
+        for i in range(1, 6)
+    ]
+    packages.append(("ecotrends.1.1", datetime(2020, 2, 1), None, None))
+    p_db.insert_many(packages)
+    return p_db
+
+
+@pytest.fixture()
+def clean_up():
+    yield
+    for suffix in ("", "-wal", "-shm"):
+        Path(p_db_path + suffix).unlink(missing_ok=True)
+        Path(state_db_path + suffix).unlink(missing_ok=True)
+    Path(offline_date_path).unlink(missing_ok=True)
+    Path(embargo_date_path).unlink(missing_ok=True)
+    Path(trace_path).unlink(missing_ok=True)
+
+
+def test_single_pass(p_db, clean_up, monkeypatch):
+    monkeypatch.setattr(analyzer, "fetch", fetch)
+    last_date.write(embargo_date_path, datetime(2020, 1, 4))
+    package_id = PackageIdSniffer()
+    other = OtherSniffer()
+    counts = Analyzer([package_id, other]).run(workers=2, processes=1)
+    assert counts == {"package_id": 5, "other": 2}
+    assert package_id.persisted == [
+        ("edi.1.1", "edi.1.1"),
+        ("edi.2.1", "edi.2.1"),
+        ("edi.3.1", None),
+        ("edi.4.1", "edi.4.1"),
+        ("edi.5.1", "edi.5.1"),
+    ]
+    assert other.persisted == [("edi.4.1", "edi.4.1"), ("edi.5.1", "edi.5.1")]
+    state = StateDB(state_db_path)
+    assert state.get("offline") == (datetime(2020, 1, 6), "edi.5.1")
+    assert state.get("embargo") == (datetime(2020, 1, 6), "edi.5.1")
+
+
+def test_metrics(p_db, clean_up, monkeypatch):
+    monkeypatch.setattr(analyzer, "fetch", fetch)
+    metrics.reset()
+    Analyzer([PackageIdSniffer()]).run(workers=2, processes=1)
+    summary = metrics.summary()
+    metrics.reset()
+    # Recorded in the analysis process and merged with each result
+    parse = summary["histograms"][metrics.EML_PARSE]
+    assert parse == [dict(parse[0], mode="tree", count=4)]
+    analyze = summary["histograms"][metrics.ANALYZE]
+    assert analyze == [dict(analyze[0], sniffer="package_id", count=5)]
+    packages = summary["counters"][metrics.PACKAGES]
+    assert packages == [{"sniffer": "package_id", "value": 5}]
+    persist = summary["histograms"][metrics.PERSIST]
+    assert persist[0]["count"] == 1
+
+
+def test_tracing(p_db, clean_up, monkeypatch):
+    monkeypatch.setattr(analyzer, "fetch", fetch)
+    monkeypatch.setattr(Config, "TRACE_FILE", "traces.jsonl")
+    tracing.reset()
+    Analyzer([PackageIdSniffer()]).run(workers=2, processes=1)
+    with open(trace_path) as f:
+        spans = [json.loads(line) for line in f]
+    packages = {
+        s["attributes"]["pid"]: s for s in spans if s["name"] == "package"
+    }
+    assert sorted(packages) == [f"edi.{i}.1" for i in range(1, 6)]
+    # Spans of fetch threads and analysis processes join the package trace
+    trace_id = packages["edi.1.1"]["trace_id"]
+    trace = [s for s in spans if s["trace_id"] == trace_id]
+    assert sorted(s["name"] for s in trace) == [
+        "analyze", "package", "parse", "pasta_metadata"
+    ]
+    root = packages["edi.1.1"]["span_id"]
+    assert all(s["parent_id"] == root for s in trace if s["name"] != "package")
+    assert len({s["process"] for s in trace}) == 2
+    fetched = [s for s in trace if s["name"] == "pasta_metadata"][0]
+    assert fetched["attributes"]["status_code"] == 200
+    # The batch is traced on its own and linked to its packages
+    persist = [s for s in spans if s["name"] == "persist"]
+    assert len(persist) == 1
+    assert {link["trace_id"] for link in persist[0]["links"]} == {
+        s["trace_id"] for s in packages.values()
+    }
+
+
+def test_missing_package(p_db, clean_up, monkeypatch):
+    # A package deleted from PASTA+ (404) is skipped and the checkpoint
+    # moves past it
+    def fetch_missing(pid):
+        if pid == "edi.2.1":
+            return 404, ""
+        return fetch(pid)
+
+    monkeypatch.setattr(analyzer, "fetch", fetch_missing)
+    package_id = PackageIdSniffer()
+    counts = Analyzer([package_id]).run(workers=2, processes=1)
+    assert counts == {"package_id": 4}
+    assert [pid for pid, result in package_id.persisted] == [
+        "edi.1.1",
+        "edi.3.1",
+        "edi.4.1",
+        "edi.5.1",
+    ]
+    state = StateDB(state_db_path)
+    assert state.get("offline") == (datetime(2020, 1, 6), "edi.5.1")
+
+
+def test_transient_error(p_db, clean_up, monkeypatch):
+    # A 5xx still failing after retries aborts the run before the package
+    def fetch_unavailable(pid):
+        if pid == "edi.3.1":
+            return 503, ""
+        return fetch(pid)
+
+    monkeypatch.setattr(analyzer, "fetch", fetch_unavailable)
+    with pytest.raises(ConnectionError):
+        Analyzer([PackageIdSniffer()]).run(workers=1, processes=1)
+    cursor = StateDB(state_db_path).get("offline")
+    assert cursor is None or cursor < (datetime(2020, 1, 4), "edi.3.1")
+
+
+def test_resume(p_db, clean_up, monkeypatch):
+    monkeypatch.setattr(analyzer, "fetch", fetch)
+    # Packages sharing a date created are split by the pid of the cursor
+    p_db.insert_many([("edi.6.1", datetime(2020, 1, 4), None, None)])
+    StateDB(state_db_path).set("offline", datetime(2020, 1, 4), "edi.3.1")
+    package_id = PackageIdSniffer()
+    counts = Analyzer([package_id]).run(workers=2, processes=1)
+    assert counts == {"package_id": 3}
+    assert [pid for pid, result in package_id.persisted] == [
+        "edi.6.1",
+        "edi.4.1",
+        "edi.5.1",
+    ]
+
+
+def test_rewind(p_db, clean_up, monkeypatch):
+    monkeypatch.setattr(analyzer, "fetch", fetch)
+    StateDB(state_db_path).set("offline", datetime(2020, 1, 6), "edi.5.1")
+    package_id = PackageIdSniffer()
+    counts = Analyzer([package_id]).run(
+        workers=2, processes=1, rewind=datetime(2020, 1, 4)
+    )
+    assert counts == {"package_id": 3}
+    state = StateDB(state_db_path)
+    assert state.get("offline") == (datetime(2020, 1, 6), "edi.5.1")
+
+
+def test_dry_run(p_db, clean_up, monkeypatch):
+    monkeypatch.setattr(analyzer, "fetch", fetch)
+    package_id = PackageIdSniffer()
+    counts = Analyzer([package_id]).run(
+        workers=2, processes=1, rewind=datetime(2020, 1, 3), dry_run=True
+    )
+    assert counts == {"package_id": 4}
+    assert package_id.persisted == []
+    assert StateDB(state_db_path).get("offline") is None
+
+
+def test_duplicate_sniffers():
+    with pytest.raises(ValueError):
+        Analyzer([PackageIdSniffer(), PackageIdSniffer()])
+
+
+def test_async_backend(p_db, clean_up, monkeypatch):
+    pytest.importorskip("httpx")
+
+    async def fetch_async(client, pid, url, raw=False):
+        return fetch(pid)
+
+    monkeypatch.setattr(analyzer.eml_cache, "fetch_async", fetch_async)
+    package_id = PackageIdSniffer()
+    counts = Analyzer([package_id]).run(
+        workers=4, processes=1, backend="async"
+    )
+    assert counts == {"package_id": 5}
+    assert [pid for pid, result in package_id.persisted] == [
+        f"edi.{i}.1" for i in range(1, 6)
+    ]
+
+
+def test_unknown_backend(clean_up):
+    with pytest.raises(ValueError):
+        Analyzer([PackageIdSniffer()]).run(backend="gevent")
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: test_benchmark
+
+:Synopsis:
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+from pathlib import Path
+import shutil
+
+import pytest
+
+from sniffer.config import Config
+from sniffer import benchmark
+
+Config.PATH = Config.TEST_PATH
+work = Config.PATH + "benchmark"
+
+
+@pytest.fixture()
+def clean_up():
+    yield
+    shutil.rmtree(work, ignore_errors=True)
+
+
+def test_run(clean_up):
+    report = benchmark.run(
+        ["registry", "offline_parse", "embargo_insert"],
+        entities=[1, 10],
+        packages=[50],
+        rows=[20],
+        work=work,
+        min_time=0.01,
+    )
+    results = report["results"]
+    assert [r["stage"] for r in results] == [
+        "registry", "offline_parse", "offline_parse", "embargo_insert"
+    ]
+    assert results[0]["packages"] == 50
+    assert (Path(work) / "registry-50.sqlite").exists()
+    assert results[0]["ops"] == 50
+    assert [r["entities"] for r in results[1:3]] == [1, 10]
+    assert results[3]["ops"] == 20
+    for r in results:
+        assert r["ops_per_sec"] > 0
+        assert r["peak_rss"] > 0
+
+
+def test_unknown_stage(clean_up):
+    with pytest.raises(ValueError):
+        benchmark.run(["nope"], [1], [1], [1], work)
+
+
+def test_compare():
+    base = {
+        "results": [
+            {"stage": "offline_parse", "entities": 1, "ops_per_sec": 100.0},
+            {"stage": "registry", "packages": 10, "ops_per_sec": 50.0},
+        ]
+    }
+    head = {
+        "results": [
+            {"stage": "offline_parse", "entities": 1, "ops_per_sec": 50.0},
+            {"stage": "offline_parse", "entities": 10, "ops_per_sec": 5.0},
+        ]
+    }
+    assert benchmark.compare(base, head) == [
+        ("offline_parse", 1, 100.0, 50.0, 0.5)
+    ]
@@ -72,7 +72,8 @@ def e_db():
 @pytest.fixture()
 def clean_up():
     yield
-    Path(db_path).unlink(missing_ok=True)
+    for suffix in ("", "-wal", "-shm"):
+        Path(db_path + suffix).unlink(missing_ok=True)
 
 
 def test_embargo_db_connection(e_db, clean_up):
@@ -275,3 +276,152 @@ def test_delete_all(e_db, clean_up):
     e_db.delete_all()
     count = e_db.get_count()
     assert count == 0
+
+
+def test_insert_ephemeral_many(e_db, clean_up):
+    ephemerals = [
+        (
+            TEST_EMBARGO_DATA_RESOURCE[0][0],
+            TEST_EMBARGO_DATA_RESOURCE[0][1],
+            datetime.fromisoformat(TEST_EMBARGO_DATA_RESOURCE[0][2]),
+        ),
+        (
+            TEST_EMBARGO_DATA_RESOURCE[1][0],
+            TEST_EMBARGO_DATA_RESOURCE[1][1],
+            datetime.fromisoformat(TEST_EMBARGO_DATA_RESOURCE[1][2]),
+        ),
+    ]
+    c = e_db.insert_ephemeral_many(ephemerals)
+    assert c == 2
+    c = e_db.insert_ephemeral_many(ephemerals)
+    assert c == 0
+    resources = e_db.get_all_ephemeral()
+    assert len(resources) == 2
+    for resource in resources:
+        assert resource.days_ephemeral > 0
+
+
+def test_get_all_rids(e_db, clean_up):
+    for resource in TEST_EMBARGO_METADATA_RESOURCE:
+        e_db.insert(
+            rid=resource[0],
+            pid=resource[1],
+            type=resource[2],
+            auth=resource[3],
+        )
+    rids = e_db.get_all_rids()
+    assert rids == {resource[0] for resource in TEST_EMBARGO_METADATA_RESOURCE}
+
+
+def test_insert_many(e_db, clean_up):
+    resources = [
+        resource[:2] + resource[-2:]
+        for resource in TEST_EMBARGO_DATA_RESOURCE
+    ]
+    c = e_db.insert_many(resources)
+    assert c == 3
+    c = e_db.insert_many(resources)
+    assert c == 0
+
+    c = e_db.insert_newest_many(resources[:2])
+    assert c == 2
+    assert e_db.get_newest_count() == 2
+
+
+def test_migrate_existing_database(clean_up):
+    import sqlite3
+
+    connection = sqlite3.connect(db_path)
+    connection.execute(
+        "CREATE TABLE resources (id INTEGER NOT NULL, rid VARCHAR, "
+        "pid VARCHAR NOT NULL, type INTEGER NOT NULL, auth BOOLEAN NOT NULL, "
+        "PRIMARY KEY (id), UNIQUE (rid))"
+    )
+    connection.execute(
+        "INSERT INTO resources (rid, pid, type, auth) VALUES (?, ?, ?, ?)",
+        TEST_EMBARGO_METADATA_RESOURCE[0],
+    )
+    connection.execute(
+        "INSERT INTO resources (rid, pid, type, auth) VALUES (?, ?, ?, ?)",
+        TEST_EMBARGO_DATA_RESOURCE[2],
+    )
+    connection.commit()
+    connection.close()
+
+    for _ in range(2):
+        e_db = EmbargoDB(db_path)
+        resources = e_db.get_all_metadata()
+        assert [r.rid for r in resources] == [
+            TEST_EMBARGO_METADATA_RESOURCE[0][0]
+        ]
+        resources = e_db.get_all_data()
+        assert [r.rid for r in resources] == [TEST_EMBARGO_DATA_RESOURCE[2][0]]
+        e_db.session.close()
+
+    connection = sqlite3.connect(db_path)
+    indexes = {
+        row[0]
+        for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type='index'"
+        )
+    }
+    connection.close()
+    assert "ix_resources_pid" in indexes
+    assert "ix_resources_kind" in indexes
+
+    # Existing resources are classified only when the column is added
+    connection = sqlite3.connect(db_path)
+    connection.execute("UPDATE resources SET kind = NULL")
+    connection.commit()
+    connection.close()
+    e_db = EmbargoDB(db_path)
+    assert e_db.get_all_metadata() == []
+
+
+def test_iter_resources(e_db, clean_up):
+    resources = [
+        resource[:2] + resource[-2:]
+        for resource in TEST_EMBARGO_DATA_RESOURCE
+    ]
+    e_db.insert_many(resources)
+    e_db.insert_newest_many(resources)
+    e_db.session.expunge_all()
+
+    rids = [resource.rid for resource in e_db.iter_all(batch_size=2)]
+    assert len(rids) == 3
+    rids = [resource.rid for resource in e_db.iter_by_pid("edi.512.1")]
+    assert len(rids) == 2
+    rids = [resource.rid for resource in e_db.iter_all_newest()]
+    assert len(rids) == 3
+    assert len(e_db.session.identity_map) == 0
+
+
+def test_update_newest(e_db, clean_up):
+    resources = [
+        resource[:2] + resource[-2:]
+        for resource in TEST_EMBARGO_DATA_RESOURCE
+    ]
+    e_db.insert_many(resources)
+
+    c = e_db.update_newest({"edi.512.1", "knb-lter-fce.1210.4"})
+    assert c == 3
+    assert e_db.get_newest_count() == 3
+
+    # A newer, unembargoed revision of edi.512 replaces its newest resources
+    c = e_db.update_newest({"edi.512.2"}, series={("edi", "512")})
+    assert c == 0
+    newest = [resource.pid for resource in e_db.get_all_newest()]
+    assert newest == ["knb-lter-fce.1210.4"]
+
+
+def test_dirty_series(e_db, clean_up):
+    series = {("edi", "512"), ("knb-lter-fce", "1210")}
+    assert e_db.insert_dirty_series(series) == 2
+    assert e_db.insert_dirty_series({("edi", "512")}) == 0
+    assert e_db.get_dirty_series() == series
+
+    # Updating the newest resources of a series clears its mark
+    e_db.update_newest(set(), series={("edi", "512")})
+    assert e_db.get_dirty_series() == {("knb-lter-fce", "1210")}
+    e_db.update_newest(set())
+    assert e_db.get_dirty_series() == set()
@@ -15,6 +15,7 @@
 from datetime import datetime
 from pathlib import Path
 
+from lxml import etree
 import pytest
 import requests
 
@@ -118,6 +119,49 @@ TEST_EMBARGO_DATA_RESOURCE = (
         True
     ],
 )
+TEST_EML = """<?xml version="1.0" encoding="UTF-8"?>
+<eml:eml xmlns:eml="https://eml.ecoinformatics.org/eml-2.2.0"
+    packageId="edi.1.1" system="https://pasta.edirepository.org">
+  <access authSystem="https://pasta.edirepository.org/authentication"
+      order="allowFirst">
+    <allow><principal>public</principal><permission>read</permission></allow>
+  </access>
+  <dataset>
+    <dataTable>
+      <physical>
+        <objectName>explicit.csv</objectName>
+        <distribution>
+          <online><url>https://pasta.lternet.edu/package/data/eml/edi/1/1/a</url></online>
+          <access authSystem="https://pasta.edirepository.org/authentication"
+              order="allowFirst">
+            <deny><principal>public</principal><permission>read</permission></deny>
+          </access>
+        </distribution>
+      </physical>
+    </dataTable>
+    <dataTable>
+      <physical>
+        <objectName>implicit.csv</objectName>
+        <distribution>
+          <online><url>https://pasta.lternet.edu/package/data/eml/edi/1/1/b</url></online>
+          <access authSystem="https://pasta.edirepository.org/authentication"
+              order="allowFirst">
+            <allow><principal>authenticated</principal><permission>read</permission></allow>
+          </access>
+        </distribution>
+      </physical>
+    </dataTable>
+    <dataTable>
+      <physical>
+        <objectName>public.csv</objectName>
+        <distribution>
+          <online><url>https://pasta.lternet.edu/package/data/eml/edi/1/1/c</url></online>
+        </distribution>
+      </physical>
+    </dataTable>
+  </dataset>
+</eml:eml>
+"""
 Config.PATH = Config.TEST_PATH
 e_db_path = Config.PATH + Config.EMBARGO_DB
 p_db_path = Config.PATH + Config.PACKAGE_DB
@@ -142,8 +186,9 @@ def p_db():
 @pytest.fixture()
 def clean_up():
     yield
-    Path(e_db_path).unlink(missing_ok=True)
-    Path(p_db_path).unlink(missing_ok=True)
+    for suffix in ("", "-wal", "-shm"):
+        Path(e_db_path + suffix).unlink(missing_ok=True)
+        Path(p_db_path + suffix).unlink(missing_ok=True)
     Path(embargo_date_path).unlink(missing_ok=True)
 
 
@@ -242,3 +287,45 @@ def test_newest_pids(embargo_pool):
     pids = ep.newest_pids()
     assert len(pids) != 0
 
+
+def test_analyze():
+    tree = etree.fromstring(TEST_EML.encode("utf-8"))
+    resources = ep.EmbargoSniffer().analyze("edi.1.1", tree)
+    assert resources == [
+        (
+            "https://pasta.lternet.edu/package/data/eml/edi/1/1/a",
+            "edi.1.1",
+            Config.EXPLICIT,
+            False,
+        ),
+        (
+            "https://pasta.lternet.edu/package/data/eml/edi/1/1/b",
+            "edi.1.1",
+            Config.IMPLICIT,
+            True,
+        ),
+    ]
+
+    assert ep.EmbargoSniffer().analyze("edi.1.1", None) is None
+
+
+def test_analyze_skeleton():
+    tree = etree.fromstring(TEST_EML.encode("utf-8"))
+    package = ep.Package("edi.1.1", metadata=TEST_EML)
+    assert package.embargoed_resources == ep.Package(
+        "edi.1.1", tree=tree
+    ).embargoed_resources
+    assert package.count_embargoed_resources == 2
+
+
+def test_analyze_package_embargo():
+    eml = TEST_EML.replace(
+        "<allow><principal>public</principal><permission>read</permission>"
+        "</allow>",
+        "<deny><principal>public</principal><permission>read</permission>"
+        "</deny>",
+        1,
+    )
+    resources = ep.Package("edi.1.1", metadata=eml).embargoed_resources
+    assert [r[2] for r in resources] == [Config.EXPLICIT] * 4
+    assert resources[0][0].endswith("/metadata/eml/edi/1/1")
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: test_eml
+
+:Synopsis:
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+from lxml import etree
+
+from sniffer import eml
+from sniffer.offline.offline_pool import offline_resources
+
+TEST_EML = """<?xml version="1.0" encoding="UTF-8"?>
+<eml:eml xmlns:eml="https://eml.ecoinformatics.org/eml-2.2.0"
+    packageId="edi.1.1" system="https://pasta.edirepository.org">
+  <access authSystem="https://pasta.edirepository.org/authentication"
+      order="allowFirst">
+    <allow><principal>public</principal><permission>read</permission></allow>
+  </access>
+  <dataset>
+    <title>Test</title>
+    <dataTable>
+      <entityName>online</entityName>
+      <physical>
+        <objectName>online.csv</objectName>
+        <size>100</size>
+        <distribution>
+          <online><url>https://pasta.lternet.edu/package/data/eml/edi/1/1/a</url></online>
+          <access authSystem="https://pasta.edirepository.org/authentication"
+              order="allowFirst">
+            <deny><principal>public</principal><permission>read</permission></deny>
+          </access>
+        </distribution>
+      </physical>
+      <attributeList><attribute><attributeName>x</attributeName></attribute></attributeList>
+    </dataTable>
+    <otherEntity>
+      <physical>
+        <objectName>tape.bin</objectName>
+        <distribution><offline><mediumName>tape</mediumName></offline></distribution>
+      </physical>
+    </otherEntity>
+  </dataset>
+  <additionalMetadata><metadata><physical><objectName>ignored</objectName>
+    <distribution><offline><mediumName>disk</mediumName></offline></distribution>
+  </physical></metadata></additionalMetadata>
+</eml:eml>
+"""
+
+
+def test_skeleton():
+    skeleton = eml.skeleton(TEST_EML.encode("utf-8"))
+    assert skeleton.get("packageId") == "edi.1.1"
+    assert skeleton.find("./access/allow/principal").text == "public"
+    physicals = skeleton.findall("./dataset//physical")
+    assert [p.find("./objectName").text for p in physicals] == [
+        "online.csv",
+        "tape.bin",
+    ]
+    assert skeleton.find(".//size") is None
+    assert skeleton.find(".//attributeList") is None
+    assert skeleton.find(".//title") is None
+    url = physicals[0].find("./distribution/online/url").text
+    assert url.endswith("/edi/1/1/a")
+    deny = physicals[0].find("./distribution/access/deny/principal").text
+    assert deny == "public"
+
+
+def test_skeleton_matches_tree():
+    tree = etree.fromstring(TEST_EML.encode("utf-8"))
+    skeleton = eml.skeleton(TEST_EML)
+    assert offline_resources(skeleton) == offline_resources(tree)
+    assert offline_resources(skeleton) == [["tape.bin", "tape"]]
+
+
+def test_skeleton_without_access():
+    skeleton = eml.skeleton(
+        b'<eml:eml xmlns:eml="https://eml.ecoinformatics.org/eml-2.2.0" '
+        b'packageId="edi.2.1"/>'
+    )
+    assert skeleton.get("packageId") == "edi.2.1"
+    assert skeleton.find("./access") is None
+    assert skeleton.findall("./dataset//physical") == []
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: test_eml_cache
+
+:Synopsis:
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import shutil
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from sniffer.config import Config
+from sniffer import eml_cache
+from sniffer.eml_cache import EMLCache
+
+TEST_EML = b'<?xml version="1.0"?><eml:eml packageId="edi.1.1"/>'
+Config.PATH = Config.TEST_PATH
+cache_path = Config.PATH + "cache/eml/"
+
+
+@pytest.fixture()
+def cache():
+    return EMLCache(cache_path, max_bytes=3 * len(TEST_EML) + 6)
+
+
+@pytest.fixture()
+def clean_up():
+    yield
+    shutil.rmtree(cache_path, ignore_errors=True)
+
+
+def test_put_lookup(cache, clean_up):
+    content, entry = cache.lookup("edi.1.1")
+    assert content is None and entry is None
+
+    cache.put("edi.1.1", TEST_EML, encoding="utf-8", etag='"abc"')
+    content, entry = cache.lookup("edi.1.1")
+    assert content == TEST_EML
+    assert entry.etag == '"abc"'
+    assert not cache.is_stale(entry)
+
+
+def test_uncompressed(clean_up):
+    cache = EMLCache(cache_path, compress=False)
+    cache.put("edi.1.1", TEST_EML)
+    content, entry = cache.lookup("edi.1.1")
+    assert content == TEST_EML
+
+
+def test_content_addressed(cache, clean_up):
+    cache.put("edi.1.1", TEST_EML)
+    cache.put("edi.1.2", TEST_EML)
+    cache.delete("edi.1.1")
+    content, entry = cache.lookup("edi.1.2")
+    assert content == TEST_EML
+
+
+def test_lru_eviction(cache, clean_up):
+    for revision in range(1, 4):
+        cache.put(f"edi.1.{revision}", TEST_EML + bytes(revision))
+    cache.lookup("edi.1.1")
+    cache.put("edi.1.4", TEST_EML + bytes(4))
+    assert cache.size <= 3 * len(TEST_EML) + 6
+    assert cache.lookup("edi.1.2") == (None, None)
+    assert cache.lookup("edi.1.1")[0] is not None
+
+
+def test_revalidation(clean_up):
+    cache = EMLCache(cache_path, revalidate_after=60)
+    cache.put("edi.1.1", TEST_EML)
+    content, entry = cache.lookup("edi.1.1")
+    assert not cache.is_stale(entry)
+    entry.date_validated = datetime.now() - timedelta(minutes=2)
+    assert cache.is_stale(entry)
+    cache.touch("edi.1.1")
+    content, entry = cache.lookup("edi.1.1")
+    assert not cache.is_stale(entry)
+
+
+def test_threaded_lookup(clean_up):
+    # The cache is shared by the fetch threads; a miss in one thread leaves
+    # the session's connection open for the others
+    cache = EMLCache(cache_path, max_bytes=4 * len(TEST_EML))
+    assert cache.lookup("edi.1.0") == (None, None)
+
+    def lookup(revision: int) -> bytes:
+        pid = f"edi.1.{revision % 8}"
+        content, entry = cache.lookup(pid)
+        if content is None:
+            content = TEST_EML + bytes(revision % 8)
+            cache.put(pid, content)
+        return content
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        contents = list(executor.map(lookup, range(64)))
+    assert contents == [TEST_EML + bytes(r % 8) for r in range(64)]
+    assert cache.size <= 4 * len(TEST_EML)
+
+
+def test_fetch_async(clean_up, monkeypatch):
+    # Lookups and updates of the cache run off the event loop thread
+    cache = EMLCache(cache_path)
+    monkeypatch.setattr(eml_cache, "_cache", cache)
+    threads = list()
+    for name in ("lookup", "put"):
+        method = getattr(cache, name)
+
+        def record(*args, method=method, **kwargs):
+            threads.append(threading.current_thread())
+            return method(*args, **kwargs)
+
+        monkeypatch.setattr(cache, name, record)
+
+    class Client:
+        requests = 0
+
+        async def get(self, url, headers=None):
+            self.requests += 1
+            return SimpleNamespace(
+                status_code=200,
+                content=TEST_EML,
+                text=TEST_EML.decode(),
+                encoding="utf-8",
+                headers={"ETag": "etag"},
+            )
+
+    async def fetch_twice(client):
+        loop = threading.current_thread()
+        for _ in range(2):
+            r = await eml_cache.fetch_async(client, "edi.1.1", "url", raw=True)
+            assert r == (200, TEST_EML)
+        return loop
+
+    client = Client()
+    loop = asyncio.run(fetch_twice(client))
+    assert client.requests == 1
+    assert len(threads) == 3
+    assert loop not in threads
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: test_emulator
+
+:Synopsis:
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+from pathlib import Path
+
+import pytest
+import requests
+
+from sniffer.config import Config
+from sniffer.analyzer import Analyzer
+from sniffer.embargo.embargo_pool import EmbargoSniffer, newest_pids
+from sniffer import eml_cache
+from sniffer.emulator import pasta_db
+from sniffer.emulator.emulate import configure
+from sniffer.emulator.server import EmulatorServer
+from sniffer.model.embargo_db import EmbargoDB
+from sniffer.model.offline_db import OfflineDB
+from sniffer.model import pasta_data_package_manager_db
+from sniffer.offline.offline_pool import OfflineSniffer
+from sniffer.package.package_pool import PackagePool
+from sniffer import pasta_client
+
+Config.PATH = Config.TEST_PATH
+emulator_db_path = Config.PATH + "emulator.sqlite"
+p_db_path = Config.PATH + Config.PACKAGE_DB
+offline_db_path = Config.PATH + Config.OFFLINE_DB
+embargo_db_path = Config.PATH + Config.EMBARGO_DB
+PACKAGES = 50
+
+
+@pytest.fixture()
+def emulator_db():
+    Path(Config.PATH).mkdir(parents=True, exist_ok=True)
+    pasta_db.generate(
+        emulator_db_path,
+        packages=PACKAGES,
+        embargo_rate=0.3,
+        offline_rate=0.2,
+        inaccessible_rate=0.05,
+        base_url="https://pasta.emulator/package/",
+    )
+    return emulator_db_path
+
+
+@pytest.fixture()
+def server(emulator_db):
+    with EmulatorServer(emulator_db) as server:
+        yield server
+
+
+@pytest.fixture()
+def configured(server, monkeypatch):
+    monkeypatch.setattr(Config, "EML_CACHE", None)
+    monkeypatch.setattr(eml_cache, "_cache", None)
+    settings = {
+        name: getattr(Config, name)
+        for name in ("PASTA_URL", "METADATA_URL", "RESOURCE_URL")
+    }
+    configure(server.url, emulator_db_path)
+    yield server
+    for name, value in settings.items():
+        setattr(Config, name, value)
+    pasta_data_package_manager_db.set_engine_factory(None)
+    pasta_client.close()
+
+
+@pytest.fixture()
+def clean_up():
+    yield
+    for path in (emulator_db_path, p_db_path, offline_db_path, embargo_db_path):
+        for suffix in ("", "-wal", "-shm"):
+            Path(path + suffix).unlink(missing_ok=True)
+
+
+def _metadata_url(server, pid: str) -> str:
+    return server.url + "metadata/eml/" + pid.replace(".", "/")
+
+
+def test_generate(emulator_db, clean_up):
+    connection = pasta_db.connect(emulator_db)
+    packages = connection.execute(
+        "SELECT COUNT(*) FROM resource_registry "
+        "WHERE resource_type='dataPackage'"
+    ).fetchone()[0]
+    documents = connection.execute("SELECT COUNT(*) FROM eml").fetchone()[0]
+    denied = connection.execute(
+        "SELECT COUNT(*) FROM access_matrix WHERE principal='public' "
+        "AND access_type='deny'"
+    ).fetchone()[0]
+    connection.close()
+    assert packages == PACKAGES
+    assert documents == PACKAGES
+    assert denied > 0
+
+
+def test_generate_is_reproducible(emulator_db, clean_up):
+    connection = pasta_db.connect(emulator_db)
+    document, etag, accessible = pasta_db.get_eml(connection, "edi.1.1")
+    connection.close()
+    other = Config.PATH + "emulator_other.sqlite"
+    pasta_db.generate(
+        other,
+        packages=PACKAGES,
+        embargo_rate=0.3,
+        offline_rate=0.2,
+        inaccessible_rate=0.05,
+        base_url="https://pasta.emulator/package/",
+    )
+    connection = pasta_db.connect(other)
+    assert pasta_db.get_eml(connection, "edi.1.1")[1] == etag
+    connection.close()
+    Path(other).unlink()
+
+
+def test_load_eml(emulator_db, tmp_path, clean_up):
+    eml = (
+        '<eml:eml xmlns:eml="https://eml.ecoinformatics.org/eml-2.2.0" '
+        'packageId="edi.1.1"><dataset/></eml:eml>'
+    )
+    (tmp_path / "edi.1.1.xml").write_text(eml)
+    (tmp_path / "no_pid.xml").write_text("<eml/>")
+    assert pasta_db.load_eml(emulator_db, str(tmp_path)) == 1
+    connection = pasta_db.connect(emulator_db)
+    document, etag, accessible = pasta_db.get_eml(connection, "edi.1.1")
+    connection.close()
+    assert document == eml.encode("utf-8")
+    assert accessible
+
+
+def test_login(server, clean_up):
+    r = requests.get(server.url, auth=("uid=test", "test"))
+    assert r.status_code == requests.codes.ok
+    assert "auth-token" in r.cookies
+    r = requests.get(server.url)
+    assert r.status_code == requests.codes.unauthorized
+
+
+def test_metadata(server, clean_up):
+    url = _metadata_url(server, "edi.1.1")
+    assert requests.get(url).status_code == requests.codes.unauthorized
+    r = requests.get(url, auth=("uid=test", "test"))
+    assert r.status_code == requests.codes.ok
+    assert b'packageId="edi.1.1"' in r.content
+    etag = r.headers["ETag"]
+    r = requests.get(
+        url, auth=("uid=test", "test"), headers={"If-None-Match": etag}
+    )
+    assert r.status_code == requests.codes.not_modified
+    r = requests.get(
+        _metadata_url(server, "edi.999.1"), auth=("uid=test", "test")
+    )
+    assert r.status_code == requests.codes.not_found
+
+
+def test_errors(emulator_db, clean_up):
+    with EmulatorServer(emulator_db, error_rate=1.0) as server:
+        r = requests.get(server.url, auth=("uid=test", "test"))
+    assert r.status_code in (
+        requests.codes.internal_server_error,
+        requests.codes.service_unavailable,
+    )
+
+
+def test_database_queries(configured, clean_up):
+    rs = pasta_data_package_manager_db.query(
+        "SELECT package_id FROM datapackagemanager.resource_registry "
+        "WHERE resource_type='dataPackage' AND package_id IN :pids",
+        {"pids": ["edi.1.1", "edi.999.1"]},
+    )
+    assert [row[0] for row in rs] == ["edi.1.1"]
+    newest = newest_pids()
+    assert "edi.1.1" in newest
+    assert not any(pid.startswith("ecotrends.") for pid in newest)
+
+
+def test_pipeline(configured, clean_up):
+    package_pool = PackagePool()
+    assert package_pool.sync_packages(batch_size=20) == PACKAGES
+
+    counts = Analyzer([OfflineSniffer(), EmbargoSniffer()]).run(
+        workers=4, processes=1
+    )
+
+    connection = pasta_db.connect(emulator_db_path)
+    rows = connection.execute(
+        "SELECT package_id, document, accessible FROM eml "
+        "WHERE package_id NOT LIKE 'ecotrends.%'"
+    ).fetchall()
+    connection.close()
+    offline = [pid for pid, document, accessible in rows
+               if accessible and b"<offline>" in document]
+    assert counts["offline"] == len(offline)
+    assert len(OfflineDB(offline_db_path).get_all()) == len(offline)
+    assert counts["embargo"] > 0
+    assert EmbargoDB(embargo_db_path).get_count() == counts["embargo"]
+
+
+def test_interrupted_pipeline(configured, clean_up, monkeypatch):
+    # The newest table is up to date with the first packages; a later run
+    # that fails after persisting some batches leaves their series dirty,
+    # and the run resuming after them recomputes their newest resources
+    monkeypatch.setattr(Config, "WRITE_BATCH", 5)
+    package_pool = PackagePool()
+    package_pool.add_new_packages(limit=20)
+    Analyzer([EmbargoSniffer()]).run(workers=4, processes=1)
+    package_pool.sync_packages(batch_size=20)
+
+    sniffer = EmbargoSniffer()
+    persist = sniffer.persist
+    batches = list()
+
+    def fail_after_three_batches(results):
+        if len(batches) == 3:
+            raise ConnectionError("Connection lost")
+        batches.append(results)
+        return persist(results)
+
+    sniffer.persist = fail_after_three_batches
+    with pytest.raises(ConnectionError):
+        Analyzer([sniffer]).run(workers=4, processes=1)
+    e_db = EmbargoDB(embargo_db_path)
+    assert len(e_db.get_dirty_series()) > 0
+    Analyzer([EmbargoSniffer()]).run(workers=4, processes=1)
+
+    e_db = EmbargoDB(embargo_db_path)
+    embargoed = {pid for (pid,) in e_db.get_distinct_pids()}
+    newest = {resource.pid for resource in e_db.get_all_newest()}
+    assert newest == newest_pids() & embargoed
+    assert e_db.get_dirty_series() == set()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: test_lock
+
+:Synopsis:
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+import os
+from pathlib import Path
+import subprocess
+import sys
+
+import pytest
+
+from sniffer.config import Config
+from sniffer.lock import Lock, scoped
+
+Config.PATH = Config.TEST_PATH
+lock_path = Config.PATH + "test.lock"
+
+
+@pytest.fixture()
+def clean_up():
+    yield
+    Path(lock_path).unlink(missing_ok=True)
+
+
+def test_acquire_release(clean_up):
+    lock = Lock(lock_path)
+    assert not lock.locked
+    assert lock.acquire()
+    assert lock.locked
+    assert f"pid={os.getpid()}" in lock.holder
+    other = Lock(lock_path)
+    assert other.locked
+    assert not other.acquire()
+    lock.release()
+    assert not other.locked
+    assert lock.holder == ""
+    assert other.acquire()
+    other.release()
+
+
+def test_stale_lock(clean_up):
+    # A holder that exited without releasing leaves its record but not the
+    # lock itself
+    with open(lock_path, "w") as f:
+        f.write("pid=1 host=elsewhere acquired=2020-01-01T00:00:00")
+    lock = Lock(lock_path)
+    assert not lock.locked
+    assert lock.acquire()
+    assert "pid=1 " not in lock.holder
+    lock.release()
+
+
+def test_crashed_holder(clean_up):
+    code = (
+        "import os, sys; from sniffer.lock import Lock; "
+        f"Lock({lock_path!r}).acquire(); os._exit(1)"
+    )
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    subprocess.run([sys.executable, "-c", code], env=env)
+    lock = Lock(lock_path)
+    assert lock.holder != ""
+    assert lock.acquire()
+    lock.release()
+
+
+def test_context_manager(clean_up):
+    with Lock(lock_path) as lock:
+        assert lock.locked
+        with pytest.raises(BlockingIOError):
+            with Lock(lock_path):
+                pass
+    assert not Lock(lock_path).locked
+
+
+def test_scoped():
+    lock = scoped("/var/run/sniffer.lock", "embargo")
+    assert lock.lock_file == "/var/run/sniffer.embargo.lock"
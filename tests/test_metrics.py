@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: test_metrics
+
+:Synopsis:
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+import json
+from pathlib import Path
+
+import pytest
+
+from sniffer.config import Config
+from sniffer import metrics
+
+Config.PATH = Config.TEST_PATH
+textfile_path = Config.PATH + "test.prom"
+summary_path = Config.PATH + "test_summary.json"
+
+
+@pytest.fixture()
+def clean_up():
+    metrics.reset()
+    yield
+    metrics.reset()
+    Path(textfile_path).unlink(missing_ok=True)
+    Path(summary_path).unlink(missing_ok=True)
+
+
+def test_counter(clean_up):
+    metrics.inc(metrics.PACKAGES, sniffer="offline")
+    metrics.inc(metrics.PACKAGES, 2, sniffer="offline")
+    metrics.inc(metrics.PACKAGES, sniffer="embargo")
+    counters = metrics.summary()["counters"][metrics.PACKAGES]
+    assert counters == [
+        {"sniffer": "embargo", "value": 1},
+        {"sniffer": "offline", "value": 3},
+    ]
+
+
+def test_histogram(clean_up):
+    for seconds in (0.002, 0.002, 0.2, 3.0):
+        metrics.observe(metrics.HTTP_REQUESTS, seconds, status=200)
+    h = metrics.summary()["histograms"][metrics.HTTP_REQUESTS][0]
+    assert h["status"] == "200"
+    assert h["count"] == 4
+    assert h["max"] == 3.0
+    assert h["p50"] == 0.005
+    assert h["p99"] == 3.0
+
+
+def test_timer(clean_up):
+    with pytest.raises(ValueError):
+        with metrics.timer(metrics.EML_PARSE, mode="skeleton"):
+            raise ValueError()
+    h = metrics.summary()["histograms"][metrics.EML_PARSE][0]
+    assert h["count"] == 1
+
+
+def test_drain_merge(clean_up):
+    metrics.inc(metrics.PACKAGES, sniffer="offline")
+    metrics.observe(metrics.ANALYZE, 0.5, sniffer="offline")
+    snapshot = metrics.drain()
+    assert metrics.summary()["counters"] == dict()
+    metrics.observe(metrics.ANALYZE, 2.0, sniffer="offline")
+    metrics.merge(snapshot)
+    metrics.merge(snapshot)
+    summary = metrics.summary()
+    assert summary["counters"][metrics.PACKAGES][0]["value"] == 2
+    h = summary["histograms"][metrics.ANALYZE][0]
+    assert h["count"] == 3
+    assert h["total"] == 3.0
+    assert h["max"] == 2.0
+
+
+def test_prometheus(clean_up):
+    metrics.set_gauge(metrics.RUN_SUCCESS, 1)
+    metrics.observe(metrics.DB_WRITE, 0.02, table='a"b')
+    text = metrics.prometheus()
+    assert "# TYPE sniffer_run_success gauge\nsniffer_run_success 1\n" in text
+    assert "# TYPE sniffer_db_write_seconds histogram" in text
+    assert 'sniffer_db_write_seconds_bucket{table="a\\"b",le="0.01"} 0' in text
+    assert 'sniffer_db_write_seconds_bucket{table="a\\"b",le="0.025"} 1' in text
+    assert 'sniffer_db_write_seconds_bucket{table="a\\"b",le="+Inf"} 1' in text
+    assert 'sniffer_db_write_seconds_count{table="a\\"b"} 1' in text
+
+
+def test_write(clean_up):
+    Path(Config.PATH).mkdir(parents=True, exist_ok=True)
+    metrics.inc(metrics.REGISTRY_ROWS, 10)
+    metrics.write_textfile(textfile_path)
+    assert "sniffer_registry_rows_total 10" in Path(textfile_path).read_text()
+    metrics.write_summary(summary_path, {"status": "success"})
+    with open(summary_path) as f:
+        summary = json.load(f)
+    assert summary["status"] == "success"
+    assert summary["metrics"]["counters"][metrics.REGISTRY_ROWS] == [
+        {"value": 10}
+    ]
@@ -32,7 +32,8 @@ def o_db():
 @pytest.fixture()
 def clean_up():
     yield
-    Path(db_path).unlink(missing_ok=True)
+    for suffix in ("", "-wal", "-shm"):
+        Path(db_path + suffix).unlink(missing_ok=True)
 
 
 def test_pasta_db_connection():
@@ -100,3 +101,27 @@ def test_get_offline_resource_by_pid(o_db, clean_up):
         assert resource.pid == TEST_OFFLINE_RESOURCE_DATA[0]
         assert resource.object_name == TEST_OFFLINE_RESOURCE_DATA[1]
         assert resource.medium == TEST_OFFLINE_RESOURCE_DATA[2]
+
+
+def test_insert_many_offline_resources(o_db, clean_up):
+    c = o_db.insert_many([TEST_OFFLINE_RESOURCE_DATA] * 3)
+    assert c == 3
+
+    resources = o_db.get_by_pid(TEST_OFFLINE_RESOURCE_DATA[0])
+    assert len(resources) == 3
+
+
+def test_iter_all_offline_resources(o_db, clean_up):
+    o_db.insert_many([TEST_OFFLINE_RESOURCE_DATA] * 3)
+    resources = list(o_db.iter_all(batch_size=2))
+    assert len(resources) == 3
+    assert len(o_db.session.identity_map) == 0
+
+
+def test_delete_pids(o_db, clean_up):
+    o_db.insert_many(
+        [TEST_OFFLINE_RESOURCE_DATA] * 2 + [("edi.2.1", "other", "tape")]
+    )
+    c = o_db.delete_pids([TEST_OFFLINE_RESOURCE_DATA[0]])
+    assert c == 2
+    assert [r.pid for r in o_db.get_all()] == ["edi.2.1"]
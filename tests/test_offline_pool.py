@@ -15,10 +15,17 @@
 from datetime import datetime
 from pathlib import Path
 
+from lxml import etree
 import pytest
 
+import sniffer.analyzer as analyzer
 from sniffer.config import Config
-from sniffer.offline.offline_pool import OfflinePool
+from sniffer.offline.offline_pool import (
+    OfflinePool,
+    OfflineSniffer,
+    offline_parse,
+)
+from sniffer.model.offline_db import OfflineDB
 from sniffer.model.package_db import PackageDB
 
 TEST_PACKAGE_DATA = [
@@ -35,6 +42,20 @@ TEST_PACKAGE_DATA = [
         "doi:10.6073/pasta/4e1745ea523325bf35bedc88e7a9b4d0",
     ),
 ]
+OFFLINE_EML = (
+    '<eml:eml xmlns:eml="https://eml.ecoinformatics.org/eml-2.2.0" '
+    'packageId="<PID>"><dataset><dataTable><physical>'
+    "<objectName>tape.csv</objectName><distribution><offline>"
+    "<mediumName>tape</mediumName></offline></distribution>"
+    "</physical></dataTable></dataset></eml:eml>"
+)
+ONLINE_EML = (
+    '<eml:eml xmlns:eml="https://eml.ecoinformatics.org/eml-2.2.0" '
+    'packageId="<PID>"><dataset><dataTable><physical>'
+    "<objectName>data.csv</objectName><distribution><online>"
+    "<url>https://example.org/data.csv</url></online></distribution>"
+    "</physical></dataTable></dataset></eml:eml>"
+)
 Config.PATH = Config.TEST_PATH
 o_db_path = Config.PATH + Config.OFFLINE_DB
 p_db_path = Config.PATH + Config.PACKAGE_DB
@@ -54,8 +75,9 @@ def p_db():
 @pytest.fixture()
 def clean_up():
     yield
-    Path(o_db_path).unlink(missing_ok=True)
-    Path(p_db_path).unlink(missing_ok=True)
+    for suffix in ("", "-wal", "-shm"):
+        Path(o_db_path + suffix).unlink(missing_ok=True)
+        Path(p_db_path + suffix).unlink(missing_ok=True)
     Path(o_date_path).unlink(missing_ok=True)
 
 
@@ -77,3 +99,39 @@ def test_offline_pool(offline_pool, p_db, clean_up):
 
     c = offline_pool.add_new_offline_resources()
     assert c == 1
+
+
+def fetch(pid):
+    # Stands in for PASTA+: only the first test package has an offline
+    # data entity
+    eml = OFFLINE_EML if pid == TEST_PACKAGE_DATA[0][0] else ONLINE_EML
+    return 200, eml.replace("<PID>", pid)
+
+
+def test_offline_pool_workers(offline_pool, p_db, clean_up, monkeypatch):
+    monkeypatch.setattr(analyzer, "fetch", fetch)
+    for package in TEST_PACKAGE_DATA:
+        pk = p_db.insert(package[0], package[1], package[2], package[3])
+        assert pk == package[0]
+
+    c = offline_pool.add_new_offline_resources(workers=4)
+    assert c == 1
+    resources = OfflineDB(o_db_path).get_all()
+    assert [(r.pid, r.object_name, r.medium) for r in resources] == [
+        (TEST_PACKAGE_DATA[0][0], "tape.csv", "tape")
+    ]
+
+
+def test_offline_resources():
+    eml = (
+        '<eml:eml xmlns:eml="https://eml.ecoinformatics.org/eml-2.2.0" '
+        'packageId="edi.1.1"><dataset><dataTable><physical>'
+        "<objectName>tape.csv</objectName><distribution><offline>"
+        "<mediumName>tape</mediumName></offline></distribution>"
+        "</physical></dataTable></dataset></eml:eml>"
+    )
+    tree = etree.fromstring(eml.encode("utf-8"))
+    resources = OfflineSniffer().analyze("edi.1.1", tree)
+    assert resources == [["tape.csv", "tape"]]
+    assert offline_parse(eml) == resources
+    assert OfflineSniffer().analyze("edi.1.1", None) is None
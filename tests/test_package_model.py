@@ -41,7 +41,8 @@ def p_db():
 @pytest.fixture()
 def clean_up():
     yield
-    Path(db_path).unlink(missing_ok=True)
+    for suffix in ("", "-wal", "-shm"):
+        Path(db_path + suffix).unlink(missing_ok=True)
 
 
 def test_pasta_db_connection():
@@ -115,3 +116,50 @@ def test_get_all_packages_from_date(p_db, clean_up):
         assert package.date_created == TEST_PACKAGE_DATA[1]
         assert package.date_deactivated == TEST_PACKAGE_DATA[2]
         assert package.doi == TEST_PACKAGE_DATA[3]
+
+
+def test_insert_many_packages(p_db, clean_up):
+    packages = [
+        TEST_PACKAGE_DATA,
+        ("edi.2.1",) + TEST_PACKAGE_DATA[1:],
+    ]
+    c = p_db.insert_many(packages)
+    assert c == 2
+    c = p_db.insert_many(packages)
+    assert c == 0
+    assert p_db.get_count() == 2
+
+
+def test_get_most_recent_keyset(p_db, clean_up):
+    assert p_db.get_most_recent_keyset() is None
+    packages = [
+        ("edi.2.1",) + TEST_PACKAGE_DATA[1:],
+        TEST_PACKAGE_DATA,
+    ]
+    p_db.insert_many(packages)
+    keyset = p_db.get_most_recent_keyset()
+    assert keyset == (TEST_PACKAGE_DATA[1], "edi.2.1")
+
+
+def test_sqlite_pragmas(p_db, clean_up):
+    connection = p_db.session.connection()
+    journal_mode = connection.exec_driver_sql("PRAGMA journal_mode").scalar()
+    assert journal_mode.upper() == Config.SQLITE_PRAGMAS["journal_mode"]
+    timeout = connection.exec_driver_sql("PRAGMA busy_timeout").scalar()
+    assert timeout == Config.SQLITE_PRAGMAS["busy_timeout"]
+
+
+def test_iter_all_packages(p_db, clean_up):
+    packages = [
+        ("edi.2.1",) + TEST_PACKAGE_DATA[1:],
+        TEST_PACKAGE_DATA,
+        ("edi.3.1", datetime(2020, 1, 1)) + TEST_PACKAGE_DATA[2:],
+    ]
+    p_db.insert_many(packages)
+    pids = [p.pid for p in p_db.iter_all(batch_size=2)]
+    assert len(pids) == 3
+    assert pids[-1] == "edi.3.1"
+    assert len(p_db.session.identity_map) == 0
+
+    pids = [p.pid for p in p_db.iter_all(from_date=datetime(2019, 1, 1))]
+    assert pids == ["edi.3.1"]
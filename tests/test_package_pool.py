@@ -12,31 +12,95 @@
 :Created:
     7/26/20
 """
-from dateutil import tz
+from datetime import datetime, timedelta
 from pathlib import Path
 
 import pytest
+from sqlalchemy import text
 
 from sniffer.config import Config
+from sniffer.emulator import pasta_db
+from sniffer.emulator.emulate import configure
+from sniffer.model import pasta_data_package_manager_db
+from sniffer.model.package_db import PackageDB
 from sniffer.package.package_pool import PackagePool
 
 
-ABQ_TZ = tz.gettz("America/Denver")
 Config.PATH = Config.TEST_PATH
 db_path = Config.PATH + Config.PACKAGE_DB
+emulator_db_path = Config.PATH + "emulator_registry.sqlite"
+PACKAGES = 20
+# Packages sharing a date created whose byte order (knb-lter-and, knba,
+# knbz) differs from the en_US order of the registry (knba, knb-lter-and,
+# knbz)
+SAME_DATE_PIDS = ("knbz.1.1", "knb-lter-and.900.1", "knba.1.1")
 
 
 @pytest.fixture()
-def package_pool():
+def registry():
+    Path(Config.PATH).mkdir(parents=True, exist_ok=True)
+    pasta_db.generate(emulator_db_path, packages=PACKAGES, eml=False)
+    connection = pasta_db.connect(emulator_db_path)
+    newest = datetime.fromisoformat(
+        connection.execute(
+            "SELECT MAX(date_created) FROM resource_registry"
+        ).fetchone()[0]
+    )
+    with connection:
+        for pid in SAME_DATE_PIDS:
+            scope, identifier, revision = pid.split(".")
+            connection.execute(
+                "INSERT INTO resource_registry VALUES "
+                "(?, 'dataPackage', ?, ?, ?, ?, ?, NULL, NULL)",
+                (
+                    f"https://pasta.emulator/package/eml/{scope}/"
+                    f"{identifier}/{revision}",
+                    pid,
+                    scope,
+                    int(identifier),
+                    int(revision),
+                    newest + timedelta(days=1),
+                ),
+            )
+    connection.close()
+    configure(db=emulator_db_path)
+    yield emulator_db_path
+    pasta_data_package_manager_db.set_engine_factory(None)
+
+
+@pytest.fixture()
+def emulated_pool(registry):
+    return PackagePool()
+
+
+@pytest.fixture()
+def pasta():
+    # Tests marked "pg" run against the PASTA+ database of the DB_* settings
+    # and are skipped when it cannot be reached
+    try:
+        with pasta_data_package_manager_db.get_engine().connect() as c:
+            c.execute(text("SELECT 1"))
+    except Exception as e:
+        pasta_data_package_manager_db.dispose()
+        pytest.skip(f"PASTA+ database is not reachable: {e}")
+    yield
+    pasta_data_package_manager_db.dispose()
+
+
+@pytest.fixture()
+def package_pool(pasta):
     return PackagePool()
 
 
 @pytest.fixture()
 def clean_up():
     yield
-    Path(db_path).unlink(missing_ok=True)
+    for path in (db_path, emulator_db_path):
+        for suffix in ("", "-wal", "-shm"):
+            Path(path + suffix).unlink(missing_ok=True)
 
 
+@pytest.mark.pg
 def test_add_new_packages(package_pool, clean_up):
     limit = 5
     c = package_pool.add_new_packages(limit=limit)
@@ -47,3 +111,58 @@ def test_add_new_packages(package_pool, clean_up):
     assert c == limit
     p = package_pool.get_all_packages()
     assert len(p) == limit * 2
+
+
+@pytest.mark.pg
+def test_sync_packages_pg(package_pool, clean_up):
+    # Streams the packages of the last 30 days through the server-side
+    # cursor of the real driver
+    since = datetime.now() - timedelta(days=30)
+    PackageDB(db_path).insert("edi.0.0", since, None, None)
+    c = package_pool.sync_packages(batch_size=10)
+    assert package_pool.count == c + 1
+    packages = package_pool.get_all_packages()
+    keysets = [(p.date_created, p.pid) for p in packages]
+    assert len(set(keysets)) == len(keysets)
+    assert package_pool.sync_packages(batch_size=10) == 0
+
+
+def test_add_new_packages_emulated(emulated_pool, clean_up):
+    limit = 5
+    c = emulated_pool.add_new_packages(limit=limit)
+    assert c == limit
+    p = emulated_pool.get_all_packages()
+    assert len(p) == limit
+    c = emulated_pool.add_new_packages(limit=limit)
+    assert c == limit
+    p = emulated_pool.get_all_packages()
+    assert len(p) == limit * 2
+
+
+def test_sync_packages(emulated_pool, clean_up):
+    total = PACKAGES + len(SAME_DATE_PIDS)
+    limit = 5
+    c = emulated_pool.add_new_packages(limit=limit)
+    assert c == limit
+    c = emulated_pool.sync_packages(batch_size=4)
+    assert c == total - limit
+    assert emulated_pool.count == total
+    c = emulated_pool.sync_packages(batch_size=4)
+    assert c == 0
+
+
+def test_sync_packages_same_date(emulated_pool, clean_up):
+    # The first sync stops between packages sharing a date created; the
+    # second resumes from the byte-ordered keyset without skipping or
+    # fetching any package again
+    total = PACKAGES + len(SAME_DATE_PIDS)
+    c = emulated_pool.add_new_packages(limit=PACKAGES + 2)
+    assert c == PACKAGES + 2
+    pids = {p.pid for p in emulated_pool.get_all_packages()}
+    assert pids & set(SAME_DATE_PIDS) == {"knb-lter-and.900.1", "knba.1.1"}
+    c = emulated_pool.sync_packages(batch_size=1)
+    assert c == 1
+    assert emulated_pool.count == total
+    pids = {p.pid for p in emulated_pool.get_all_packages()}
+    assert set(SAME_DATE_PIDS) <= pids
+    assert emulated_pool.sync_packages() == 0
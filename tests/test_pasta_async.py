@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: test_pasta_async
+
+:Synopsis:
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+import pytest
+
+from sniffer.config import Config
+from sniffer import pasta_async
+from sniffer.pasta_async import AsyncFetcher
+
+URL = "https://pasta.lternet.edu/package/metadata/eml/edi/1/1"
+
+
+def test_requires_httpx(monkeypatch):
+    monkeypatch.setattr(pasta_async, "httpx", None)
+    with pytest.raises(ImportError):
+        AsyncFetcher()
+
+
+def test_fetch(monkeypatch):
+    httpx = pytest.importorskip("httpx")
+    monkeypatch.setattr(Config, "HTTP_BACKOFF", 0)
+    requests = list()
+
+    def handler(request):
+        requests.append(request)
+        if request.url == Config.PASTA_URL:
+            return httpx.Response(
+                200, headers={"Set-Cookie": "auth-token=token"}
+            )
+        if len(requests) == 2:
+            return httpx.Response(503)
+        return httpx.Response(200, content=b"<eml/>")
+
+    async def get(client):
+        client._client = httpx.AsyncClient(
+            transport=httpx.MockTransport(handler)
+        )
+        r = await client.get(URL)
+        return r.status_code, r.content
+
+    with AsyncFetcher(concurrency=4) as fetcher:
+        status_code, content = fetcher.submit(get, fetcher.client).result()
+    assert (status_code, content) == (200, b"<eml/>")
+    assert len(requests) == 3
+    assert requests[-1].headers["Cookie"] == "auth-token=token"
+    assert "Authorization" not in requests[-1].headers
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: test_pasta_client
+
+:Synopsis:
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+import time
+from types import SimpleNamespace
+
+import requests
+
+from sniffer.config import Config
+from sniffer import pasta_client, rate_limit
+from sniffer.pasta_client import PastaClient
+
+
+class Response:
+    def __init__(self, cookies=None, status_code=requests.codes.ok):
+        self.status_code = status_code
+        self.cookies = dict() if cookies is None else cookies
+        self.headers = dict()
+
+
+def test_token_reuse(monkeypatch):
+    client = PastaClient(pool_size=2)
+    calls = list()
+
+    def get(url, **kwargs):
+        calls.append((url, kwargs))
+        return Response({"auth-token": "token"})
+
+    monkeypatch.setattr(client._session, "get", get)
+    client.get("https://pasta.lternet.edu/package/metadata/eml/edi/1/1")
+    client.get("https://pasta.lternet.edu/package/metadata/eml/edi/2/1")
+    logins = [kwargs for url, kwargs in calls if url == Config.PASTA_URL]
+    assert len(logins) == 1
+    assert logins[0]["auth"] == (Config.DN, Config.PASSWORD)
+    for url, kwargs in calls[1:]:
+        assert kwargs["cookies"] == {"auth-token": "token"}
+        assert "auth" not in kwargs
+        assert kwargs["timeout"] == Config.HTTP_TIMEOUT
+
+
+def test_token_refresh(monkeypatch):
+    client = PastaClient()
+    tokens = iter(("first", "second"))
+    monkeypatch.setattr(
+        client._session,
+        "get",
+        lambda url, **kwargs: Response({"auth-token": next(tokens)}),
+    )
+    assert client.token() == "first"
+    assert client.token() == "first"
+    client._token_time -= Config.PASTA_TOKEN_TTL + 1
+    assert client.token() == "second"
+
+
+def test_basic_auth_fallback(monkeypatch):
+    client = PastaClient()
+    calls = list()
+
+    def get(url, **kwargs):
+        calls.append(kwargs)
+        return Response()
+
+    monkeypatch.setattr(client._session, "get", get)
+    client.get("https://pasta.lternet.edu/package/metadata/eml/edi/1/1")
+    assert calls[-1]["auth"] == (Config.DN, Config.PASSWORD)
+    assert "cookies" not in calls[-1]
+
+
+def test_pool(monkeypatch):
+    client = PastaClient(pool_size=2)
+    adapter = client._session.get_adapter("https://pasta.lternet.edu/")
+    assert adapter._pool_maxsize == 2
+    assert adapter.max_retries.total == Config.HTTP_RETRIES
+    client.resize(16)
+    adapter = client._session.get_adapter("https://pasta.lternet.edu/")
+    assert adapter._pool_maxsize == 16
+
+
+def test_retry(monkeypatch):
+    monkeypatch.setattr(Config, "HTTP_BACKOFF", 0)
+    client = PastaClient()
+    status_codes = iter(
+        (
+            requests.codes.ok,
+            requests.codes.too_many_requests,
+            requests.codes.bad_gateway,
+            requests.codes.ok,
+        )
+    )
+    monkeypatch.setattr(
+        client._session,
+        "get",
+        lambda url, **kwargs: Response(status_code=next(status_codes)),
+    )
+    r = client.get("https://pasta.lternet.edu/package/metadata/eml/edi/1/1")
+    assert r.status_code == requests.codes.ok
+    limiter = rate_limit.get_limiter("pasta.lternet.edu")
+    assert limiter.stats()["throttled"] >= 1
+
+
+def test_retries_exhausted(monkeypatch):
+    # No backoff follows the last attempt
+    monkeypatch.setattr(Config, "HTTP_RETRIES", 2)
+    sleeps = list()
+    clock = SimpleNamespace(monotonic=time.monotonic, sleep=sleeps.append)
+    monkeypatch.setattr(pasta_client, "time", clock)
+    client = PastaClient()
+    status_codes = iter(
+        (requests.codes.ok,) + (requests.codes.internal_server_error,) * 3
+    )
+    monkeypatch.setattr(
+        client._session,
+        "get",
+        lambda url, **kwargs: Response(status_code=next(status_codes)),
+    )
+    r = client.get("https://pasta.lternet.edu/package/metadata/eml/edi/1/1")
+    assert r.status_code == requests.codes.internal_server_error
+    assert sleeps == [Config.HTTP_BACKOFF, Config.HTTP_BACKOFF * 2]
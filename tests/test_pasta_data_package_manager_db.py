@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: test_pasta_data_package_manager_db
+
+:Synopsis:
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+
+from sniffer.config import Config
+from sniffer.emulator import pasta_db
+from sniffer.emulator.emulate import configure
+from sniffer.model import pasta_data_package_manager_db
+
+Config.PATH = Config.TEST_PATH
+emulator_db_path = Config.PATH + "emulator_registry.sqlite"
+
+
+@pytest.fixture()
+def dispose():
+    yield
+    pasta_data_package_manager_db.dispose()
+
+
+@pytest.fixture()
+def registry(dispose):
+    # Queries run against the SQLite fake of the PASTA+ database
+    Path(Config.PATH).mkdir(parents=True, exist_ok=True)
+    pasta_db.generate(emulator_db_path, packages=10, eml=False)
+    configure(db=emulator_db_path)
+    yield emulator_db_path
+    pasta_data_package_manager_db.set_engine_factory(None)
+    Path(emulator_db_path).unlink(missing_ok=True)
+
+
+def test_engine_is_reused(dispose):
+    engine = pasta_data_package_manager_db.get_engine()
+    assert engine is pasta_data_package_manager_db.get_engine()
+
+
+def test_engine_dispose(dispose):
+    engine = pasta_data_package_manager_db.get_engine()
+    pasta_data_package_manager_db.dispose()
+    assert engine is not pasta_data_package_manager_db.get_engine()
+
+
+def test_engine_factory(dispose):
+    default = pasta_data_package_manager_db.get_engine()
+    engine = create_engine("sqlite://")
+    pasta_data_package_manager_db.set_engine_factory(lambda: engine)
+    assert pasta_data_package_manager_db.get_engine() is engine
+    pasta_data_package_manager_db.set_engine_factory(None)
+    engine = pasta_data_package_manager_db.get_engine()
+    assert engine is not default
+    assert engine.url == default.url
+
+
+def test_query_bound_parameters(registry):
+    sql = (
+        "SELECT datapackagemanager.resource_registry.resource_id FROM "
+        "datapackagemanager.resource_registry WHERE package_id=:pid "
+        "AND resource_type='dataPackage'"
+    )
+    rs = pasta_data_package_manager_db.query(sql, {"pid": "edi.1.1"})
+    assert len(rs) == 1
+    rs = pasta_data_package_manager_db.query(sql, {"pid": "edi.999.1"})
+    assert len(rs) == 0
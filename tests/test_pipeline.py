@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: test_pipeline
+
+:Synopsis:
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+from concurrent.futures import ThreadPoolExecutor
+import random
+import time
+
+from sniffer.pipeline import ordered_map
+
+
+def _slow_square(n: int) -> int:
+    time.sleep(random.random() / 100)
+    return n * n
+
+
+def test_ordered_map():
+    items = list(range(50))
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(ordered_map(executor, _slow_square, items, window=8))
+    assert [item for item, _ in results] == items
+    assert [result for _, result in results] == [n * n for n in items]
+
+
+def test_ordered_map_empty():
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = list(ordered_map(executor, _slow_square, [], window=2))
+    assert results == []
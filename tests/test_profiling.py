@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: test_profiling
+
+:Synopsis:
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+import glob
+from pathlib import Path
+import pstats
+import threading
+import time
+
+import pytest
+
+from sniffer.config import Config
+from sniffer import profiling
+
+Config.PATH = Config.TEST_PATH
+profile_path = Config.PATH + "profiles/"
+
+
+@pytest.fixture()
+def clean_up():
+    profiling.disable()
+    yield
+    profiling.disable()
+    for path in glob.glob(profile_path + "*"):
+        Path(path).unlink()
+
+
+def _work(seconds: float = 0.05):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(1000))
+
+
+def _profiles(suffix: str) -> list:
+    return sorted(glob.glob(profile_path + "sniffer-*" + suffix))
+
+
+def test_sampling_profiler(clean_up):
+    profiler = profiling.SamplingProfiler(interval=0.001)
+    worker = threading.Thread(target=_work, args=(0.1,), name="worker")
+    profiler.enable()
+    worker.start()
+    worker.join()
+    profiler.disable()
+    assert profiler.samples > 0
+    lines = profiler.folded().splitlines()
+    stacks = [line.rsplit(" ", 1) for line in lines]
+    assert all(int(count) > 0 for stack, count in stacks)
+    assert any(
+        stack.startswith("worker;") and "_work (test_profiling.py" in stack
+        for stack, count in stacks
+    )
+
+
+def test_cprofile_stage(clean_up):
+    profiling.configure("cprofile", ("analyze",), profile_path)
+    with profiling.stage("analyze"):
+        _work()
+    assert len(_profiles("-analyze.prof")) == 1
+    assert len(_profiles("-analyze.txt")) == 1
+    stats = pstats.Stats(_profiles("-analyze.prof")[0])
+    assert any(name == "_work" for file, line, name in stats.stats)
+
+
+def test_sampling_stage_with_memory(clean_up):
+    profiling.configure("sampling", ("sync",), profile_path, memory=True)
+    with profiling.stage("sync"):
+        data = [bytes(1000) for _ in range(1000)]
+        _work()
+    del data
+    assert len(_profiles("-sync.folded")) == 1
+    memory = _profiles("-sync-memory.txt")
+    assert len(memory) == 1
+    report = Path(memory[0]).read_text()
+    assert report.startswith("Peak traced memory:")
+    assert "test_profiling.py" in report
+    assert "profiling.py:" not in report.replace("test_profiling.py:", "")
+
+
+def test_stage_not_profiled(clean_up):
+    with profiling.stage("sync"):
+        _work()
+    profiling.configure("cprofile", ("analyze",), profile_path)
+    with profiling.stage("sync"):
+        _work()
+    assert _profiles("") == []
+
+
+def test_nested_stage(clean_up):
+    profiling.configure("cprofile", ("run", "sync"), profile_path)
+    with profiling.stage("run"):
+        with profiling.stage("sync"):
+            _work()
+    assert len(_profiles("-run.prof")) == 1
+    assert _profiles("-sync.prof") == []
+
+
+def test_configure_errors(clean_up):
+    with pytest.raises(ValueError):
+        profiling.configure("perf", ("run",), profile_path)
+    with pytest.raises(ValueError):
+        profiling.configure("cprofile", ("offline",), profile_path)
+
+
+def test_initializer(clean_up):
+    assert profiling.initializer() == (None, ())
+    profiling.configure("sampling", ("sync",), profile_path)
+    assert profiling.initializer() == (None, ())
+    profiling.configure("sampling", ("analyze",), profile_path)
+    initializer, initargs = profiling.initializer()
+    assert initializer is not None
+    assert initargs[0]["profiler"] == "sampling"
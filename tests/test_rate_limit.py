@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: test_rate_limit
+
+:Synopsis:
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+import asyncio
+import time
+
+from sniffer.config import Config
+from sniffer import rate_limit
+from sniffer.rate_limit import RateLimiter
+
+
+def test_rate():
+    limiter = RateLimiter(max_rate=20, min_rate=1, concurrency=4)
+    start = time.monotonic()
+    for i in range(6):
+        limiter.acquire()
+        limiter.release(200, 0.01)
+    # The first request is free, the next five are paced at 20/s
+    assert time.monotonic() - start >= 0.2
+
+
+def test_throttle(monkeypatch):
+    monkeypatch.setattr(Config, "HTTP_BACKOFF", 0.1)
+    limiter = RateLimiter(max_rate=16, min_rate=1, concurrency=4)
+    limiter.acquire()
+    limiter.release(429, 0.01)
+    stats = limiter.stats()
+    assert stats["rate"] == 8
+    assert stats["throttled"] == 1
+    assert stats["backoff"] > 0
+    limiter.acquire()
+    limiter.release(503, 0.01, retry_after="0")
+    assert limiter.stats()["rate"] == 4
+    limiter.acquire()
+    limiter.release(200, 0.01)
+    assert limiter.stats()["rate"] == 4.25
+
+
+def test_latency():
+    limiter = RateLimiter(max_rate=10, target_latency=0.5)
+    limiter.acquire()
+    limiter.release(200, 2.0)
+    assert limiter.stats()["rate"] == 9
+    assert limiter.stats()["latency"] == 2.0
+
+
+def test_concurrency():
+    limiter = RateLimiter(max_rate=1000, concurrency=1)
+    limiter.acquire()
+    assert limiter.stats()["in_flight"] == 1
+    assert limiter._try_acquire() > 0
+    limiter.release(200, 0.01)
+    time.sleep(0.01)
+    assert limiter._try_acquire() == 0
+
+
+def test_acquire_async():
+    limiter = RateLimiter(max_rate=1000, concurrency=2)
+
+    async def run():
+        await asyncio.gather(*(limiter.acquire_async() for i in range(2)))
+
+    asyncio.run(run())
+    assert limiter.stats()["in_flight"] == 2
+    assert limiter.stats()["waiting"] == 0
+
+
+def test_shared_limiter():
+    limiter = rate_limit.get_limiter("pasta.example.org")
+    assert rate_limit.get_limiter("pasta.example.org") is limiter
+    assert "pasta.example.org" in rate_limit.stats()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: test_registry
+
+:Synopsis:
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+import pytest
+
+from sniffer.embargo.embargo_pool import EmbargoSniffer
+from sniffer.offline.offline_pool import OfflineSniffer
+from sniffer import registry
+
+
+def test_available():
+    sniffers = registry.available()
+    assert "offline" in sniffers
+    assert "embargo" in sniffers
+
+
+def test_load():
+    sniffers = registry.load(["embargo", "offline"])
+    assert isinstance(sniffers[0], EmbargoSniffer)
+    assert isinstance(sniffers[1], OfflineSniffer)
+
+
+def test_load_unknown():
+    with pytest.raises(ValueError):
+        registry.load(["unknown"])
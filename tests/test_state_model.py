@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: test_state_model
+
+:Synopsis:
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from sniffer.config import Config
+from sniffer.model.offline_db import OfflineDB
+from sniffer.model.state_db import StateDB
+
+Config.PATH = Config.TEST_PATH
+db_path = Config.PATH + Config.STATE_DB
+o_db_path = Config.PATH + Config.OFFLINE_DB
+
+
+@pytest.fixture()
+def clean_up():
+    yield
+    for suffix in ("", "-wal", "-shm"):
+        Path(db_path + suffix).unlink(missing_ok=True)
+        Path(o_db_path + suffix).unlink(missing_ok=True)
+
+
+def test_get_set(clean_up):
+    state = StateDB(db_path)
+    assert state.get("offline") is None
+    state.set("offline", datetime(2020, 1, 1), "edi.1.1")
+    state.set("offline", datetime(2020, 1, 2), "edi.2.1")
+    assert StateDB(db_path).get("offline") == (
+        datetime(2020, 1, 2),
+        "edi.2.1",
+    )
+
+
+def test_shared_session(clean_up):
+    o_db = OfflineDB(o_db_path)
+    state = StateDB(session=o_db.session)
+    o_db.insert_many([("edi.1.1", "tape.csv", "tape")], commit=False)
+    state.set("offline", datetime(2020, 1, 1), "edi.1.1", commit=False)
+    state.rollback()
+    assert state.get("offline") is None
+    assert len(o_db.get_all()) == 0
+
+    o_db.insert_many([("edi.1.1", "tape.csv", "tape")], commit=False)
+    state.set("offline", datetime(2020, 1, 1), "edi.1.1", commit=False)
+    state.commit()
+    o_db = OfflineDB(o_db_path)
+    assert StateDB(session=o_db.session).get("offline") == (
+        datetime(2020, 1, 1),
+        "edi.1.1",
+    )
+    assert len(o_db.get_all()) == 1
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:Mod: test_tracing
+
+:Synopsis:
+
+:Author:
+    servilla
+
+:Created:
+    10/18/26
+"""
+from concurrent.futures import ThreadPoolExecutor
+import json
+from pathlib import Path
+import pickle
+
+import pytest
+
+from sniffer.config import Config
+from sniffer import tracing
+
+Config.PATH = Config.TEST_PATH
+trace_path = Config.PATH + "traces.jsonl"
+
+
+@pytest.fixture()
+def clean_up(monkeypatch):
+    monkeypatch.setattr(Config, "TRACE_FILE", "traces.jsonl")
+    tracing.reset()
+    yield
+    tracing.reset()
+    Path(trace_path).unlink(missing_ok=True)
+
+
+def _spans() -> list:
+    with open(trace_path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_trace(clean_up):
+    with tracing.trace("package", pid="edi.1.1") as root:
+        with tracing.span("parse", mode="tree") as parse:
+            tracing.annotate(bytes=10)
+        with tracing.span("analyze"):
+            pass
+    assert tracing.flush() == 3
+    spans = {s["name"]: s for s in _spans()}
+    assert spans["package"]["parent_id"] is None
+    assert spans["package"]["attributes"] == {"pid": "edi.1.1"}
+    for name in ("parse", "analyze"):
+        assert spans[name]["trace_id"] == root.context.trace_id
+        assert spans[name]["parent_id"] == root.context.span_id
+    assert spans["parse"]["span_id"] == parse.context.span_id
+    assert spans["parse"]["attributes"] == {"mode": "tree", "bytes": 10}
+    assert spans["package"]["duration"] >= spans["parse"]["duration"]
+
+
+def test_span_outside_trace(clean_up):
+    with tracing.span("parse") as span:
+        tracing.annotate(bytes=10)
+    assert span is None
+    assert tracing.flush() == 0
+    assert not Path(trace_path).exists()
+
+
+def test_disabled(clean_up, monkeypatch):
+    monkeypatch.setattr(Config, "TRACE_FILE", None)
+    with tracing.trace("package") as root:
+        with tracing.span("parse"):
+            pass
+    assert root is None
+    assert tracing.start_trace("package") is None
+    assert tracing.drain() == []
+
+
+def test_error(clean_up):
+    with pytest.raises(ValueError):
+        with tracing.trace("package"):
+            with tracing.span("parse"):
+                raise ValueError("Bad EML")
+    spans = tracing.drain()
+    assert [s["status"] for s in spans] == ["error", "error"]
+    assert spans[0]["attributes"]["error"] == "ValueError: Bad EML"
+
+
+def test_remote_context(clean_up):
+    root = tracing.start_trace("package")
+    context = pickle.loads(pickle.dumps(tracing.context(root)))
+
+    def fetch():
+        with tracing.use(context), tracing.span("pasta_metadata"):
+            pass
+        return tracing.drain()
+
+    # Spans finished elsewhere are drained there and merged here
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        spans = executor.submit(fetch).result()
+    assert tracing.drain() == []
+    tracing.merge(spans)
+    root.end()
+    root.end()
+    spans = tracing.drain()
+    assert [s["name"] for s in spans] == ["pasta_metadata", "package"]
+    assert spans[0]["parent_id"] == root.context.span_id
+    assert spans[0]["thread"] != spans[1]["thread"]
+
+
+def test_links(clean_up):
+    packages = [tracing.start_trace("package", pid=f"edi.{i}.1")
+                for i in range(3)]
+    with tracing.trace(
+        "persist", links=[p.context for p in packages]
+    ) as persist:
+        pass
+    spans = tracing.drain()
+    assert spans[0]["links"] == [p.context._asdict() for p in packages]
+    assert persist.context.trace_id not in {
+        p.context.trace_id for p in packages
+    }
+
+
+def test_slowest(clean_up):
+    for i in range(3):
+        root = tracing.start_trace("package", pid=f"edi.{i}.1")
+        root.end()
+    tracing.flush()
+    spans = tracing.slowest(trace_path, top=2)
+    assert len(spans) == 2
+    assert spans[0]["duration"] >= spans[1]["duration"]
+    assert tracing.slowest(trace_path, name="persist") == []